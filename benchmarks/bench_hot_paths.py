@@ -0,0 +1,200 @@
+# benchmarks/bench_hot_paths.py
+
+# Copyright (c) Adrian Robinson 2025
+# This software is dual-licensed under the MIT License (for NHS use only)
+# and a Commercial License (for other use).
+# For commercial licensing inquiries, please contact adrian.j.robinson@gmail.com
+
+"""
+Times the load, prune, prompt assembly, response parsing and PDF report paths
+and compares each with the pinned results in `reference_results.json`:
+
+- load: `FrameworkLoader.load_all` and `ConfigLoader.load_all` on the bundled files.
+- prune: `prune_framework_for_llm` for every bundled framework and level.
+- assemble: `assemble_analysis_prompt` for one, three and all frameworks,
+  with a cold and a warm fragment cache.
+- parse: strict `LLMAnalysisResult` validation and the repairing parser used
+  for live responses, with 5, 50 and 500 competencies.
+- pdf: `generate_pdf_report` with 5, 50 and 500 competencies.
+- synthetic: load, prune and cold assembly of generated frameworks with
+  thousands of nodes (see synthetic.py), to show costs that grow faster
+  than the framework.
+
+Each case reports the best-of-five mean time per call. A case more than
+`--tolerance` times slower than its reference is marked SLOWER and makes the
+run exit with status 1. Timings depend on the machine, so pin the reference
+on the machine you compare on. Run from the project root:
+
+python -m benchmarks.bench_hot_paths [--filter prune/] [--memory]
+python -m benchmarks.bench_hot_paths --update-reference
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.portfolio_mapper.data_loader import ConfigLoader, FrameworkLoader
+from src.portfolio_mapper.logic import (
+    assemble_analysis_prompt, framework_fragment_cache, get_next_academic_level, prune_framework_for_llm
+)
+from src.portfolio_mapper.models.config import AcademicLevelKey
+from src.portfolio_mapper.models.framework import FrameworkFile
+from src.portfolio_mapper.models.llm_response import LLMAnalysisResult
+from src.portfolio_mapper.reporting import generate_pdf_report
+from src.portfolio_mapper.response_repair import parse_analysis_response
+
+from .synthetic import SYNTHETIC_SPECS, synthetic_analysis_result, synthetic_frameworks_dir
+from .timing import calls_per_repeat, peak_allocation_bytes, quiet, time_per_call_ms
+
+REFERENCE_PATH = os.path.join(os.path.dirname(__file__), "reference_results.json")
+REFLECTION_PATH = "sample_reflections/student_advanced_practice1.txt"
+COMPETENCY_COUNTS = (5, 50, 500)
+ASSEMBLY_LEVEL = AcademicLevelKey.ADVANCED
+
+Case = Tuple[str, Callable[[], Any]]
+
+def _assemble_call(
+    config_loader: ConfigLoader,
+    frameworks: Dict[str, FrameworkFile],
+    reflection_text: str,
+    cold: bool,
+) -> Callable[[], str]:
+    role = next(iter(config_loader.roles.values()))
+    levels = config_loader.academic_levels
+    next_level_name, next_level_description = get_next_academic_level(ASSEMBLY_LEVEL, levels)
+    prompt_obj = config_loader.prompts["portfolio_analysis_v1"]
+
+    def _call() -> str:
+        if cold:
+            framework_fragment_cache.clear()
+        return assemble_analysis_prompt(
+            role, levels[ASSEMBLY_LEVEL], ASSEMBLY_LEVEL, reflection_text, frameworks, prompt_obj,
+            next_level_name, next_level_description, False, levels,
+        )
+    return _call
+
+def bundled_cases(framework_library: Dict[str, FrameworkFile], config_loader: ConfigLoader, reflection_text: str) -> List[Case]:
+    def _load_config() -> ConfigLoader:
+        loader = ConfigLoader(config_dir='config/')
+        loader.load_all()
+        return loader
+
+    cases: List[Case] = [
+        ("load/frameworks", lambda: FrameworkLoader(frameworks_dir='frameworks/').load_all()),
+        ("load/config", _load_config),
+    ]
+    for code, framework in framework_library.items():
+        for level in AcademicLevelKey:
+            cases.append((f"prune/{code}/{level.value}", lambda fw=framework, level=level: prune_framework_for_llm(fw, level)))
+
+    codes = list(framework_library)
+    for combination in (codes[:1], codes[:3], codes):
+        frameworks = {code: framework_library[code] for code in combination}
+        for cold in (True, False):
+            name = f"assemble/{len(combination)}_frameworks/{'cold' if cold else 'warm'}"
+            cases.append((name, _assemble_call(config_loader, frameworks, reflection_text, cold)))
+
+    for count in COMPETENCY_COUNTS:
+        result = synthetic_analysis_result(framework_library, count)
+        response_text = result.model_dump_json()
+        cases.append((f"parse/strict/{count}", lambda text=response_text: LLMAnalysisResult.model_validate_json(text)))
+        cases.append((f"parse/repair/{count}", lambda text=response_text: parse_analysis_response(text, framework_library)))
+        cases.append((f"pdf/{count}", lambda result=result: generate_pdf_report(result, framework_library, reflection_text)))
+    return cases
+
+def synthetic_cases(config_loader: ConfigLoader, reflection_text: str, stack: contextlib.ExitStack) -> List[Case]:
+    """Generated frameworks, each in its own directory, which `stack` keeps until the run ends."""
+    cases: List[Case] = []
+    for name, spec in SYNTHETIC_SPECS.items():
+        prefix = f"synthetic/{name}_{spec.node_count}_nodes"
+        frameworks_dir = stack.enter_context(synthetic_frameworks_dir({name: spec}))
+        framework = FrameworkLoader(frameworks_dir=frameworks_dir).load_all()[f"Synthetic-{name}"]
+        cases.append((f"{prefix}/load", lambda frameworks_dir=frameworks_dir: FrameworkLoader(frameworks_dir=frameworks_dir).load_all()))
+        cases.append((f"{prefix}/prune", lambda fw=framework: prune_framework_for_llm(fw, ASSEMBLY_LEVEL)))
+        cases.append((f"{prefix}/assemble_cold", _assemble_call(config_loader, {framework.metadata.framework_code: framework}, reflection_text, cold=True)))
+    return cases
+
+def _measure(func: Callable[[], Any]) -> float:
+    """Mean milliseconds per call, best of five repeats of about 50 ms each."""
+    return time_per_call_ms(func, repeats=5, number=calls_per_repeat(func, target_seconds=0.05))
+
+def _load_reference() -> Dict[str, Any]:
+    if not os.path.exists(REFERENCE_PATH):
+        return {"results": {}}
+    with open(REFERENCE_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+def _write_reference(results: Dict[str, float]) -> None:
+    reference = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": {name: round(ms, 4) for name, ms in results.items()},
+    }
+    with open(REFERENCE_PATH, "w", encoding="utf-8") as f:
+        json.dump(reference, f, indent=2)
+        f.write("\n")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Times the load, prune, assemble, parse and report hot paths.")
+    parser.add_argument("--filter", default="", help="Only run cases whose name contains this text.")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="Slowdown against the reference that counts as a regression.")
+    parser.add_argument("--memory", action="store_true", help="Also report the peak memory allocated by one call.")
+    parser.add_argument("--update-reference", action="store_true", help=f"Pin these timings in {os.path.basename(REFERENCE_PATH)}.")
+    args = parser.parse_args(argv)
+
+    with open(REFLECTION_PATH, encoding="utf-8") as f:
+        reflection_text = f.read()
+    with quiet():
+        framework_library = FrameworkLoader(frameworks_dir='frameworks/').load_all()
+        config_loader = ConfigLoader(config_dir='config/')
+        config_loader.load_all()
+
+    reference = _load_reference()
+    print(f"Reference: Python {reference.get('python', '-')} on {reference.get('platform', '-')}")
+    print(f"{'case':<62}{'ms':>10}{'ref ms':>10}{'ratio':>8}" + (f"{'peak KiB':>11}" if args.memory else ""))
+
+    results: Dict[str, float] = {}
+    regressions = []
+    with contextlib.ExitStack() as stack:
+        with quiet():
+            cases = bundled_cases(framework_library, config_loader, reflection_text)
+            cases += synthetic_cases(config_loader, reflection_text, stack)
+        for name, case in cases:
+            if args.filter not in name:
+                continue
+            with quiet():
+                ms = _measure(case)
+                peak = peak_allocation_bytes(case) if args.memory else None
+            results[name] = ms
+            reference_ms = reference["results"].get(name)
+            ratio = ms / reference_ms if reference_ms else None
+            status = ""
+            if ratio is None:
+                status = "  new"
+            elif ratio > args.tolerance:
+                status = "  SLOWER"
+                regressions.append(name)
+            elif ratio < 1 / args.tolerance:
+                status = "  faster"
+            line = f"{name:<62}{ms:>10.3f}"
+            line += f"{reference_ms:>10.3f}{ratio:>7.2f}x" if ratio is not None else f"{'-':>10}{'-':>8}"
+            if args.memory:
+                line += f"{peak / 1024:>11.1f}"
+            print(line + status, flush=True)
+
+    if args.update_reference:
+        if args.filter:
+            results = {**reference["results"], **results}
+        _write_reference(results)
+        print(f"--- Pinned {len(results)} results in {REFERENCE_PATH} ---")
+        return 0
+    if regressions:
+        print(f"--- {len(regressions)} case(s) took more than {args.tolerance}x their reference time ---")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
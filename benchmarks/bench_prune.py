@@ -0,0 +1,84 @@
+# benchmarks/bench_prune.py
+
+# Copyright (c) Adrian Robinson 2025
+# This software is dual-licensed under the MIT License (for NHS use only)
+# and a Commercial License (for other use).
+# For commercial licensing inquiries, please contact adrian.j.robinson@gmail.com
+
+"""
+Compares the single-pass, copy-free framework pruning in `logic.py` with the
+previous implementation, which deep-copied the framework and every node at
+every recursion level. Both implementations are checked for identical output
+before timing. Run from the project root:
+
+python -m benchmarks.bench_prune
+"""
+from typing import Any, Dict, List
+
+from src.portfolio_mapper.data_loader import FrameworkLoader
+from src.portfolio_mapper.logic import _get_all_leaf_nodes, prune_framework_for_llm
+from src.portfolio_mapper.models.config import AcademicLevelKey
+from src.portfolio_mapper.models.framework import FrameworkFile, FrameworkNode
+
+from .timing import peak_allocation_bytes, quiet, time_per_call_ms
+
+# --- Reference: the deep-copy implementation this benchmark measures against ---
+
+def _legacy_recursive_prune_nodes(nodes: List[FrameworkNode], academic_level_key: str) -> List[FrameworkNode]:
+    pruned_nodes = []
+    for node in nodes:
+        node_copy = node.model_copy(deep=True)
+        if node_copy.collapse_children and node_copy.children:
+            descendant_leaf_nodes = _get_all_leaf_nodes(node_copy.children)
+            if node_copy.source_notes is None:
+                node_copy.source_notes = []
+            if descendant_leaf_nodes:
+                node_copy.source_notes.append("This principle is demonstrated by evidence of the following points:")
+                for stmt_id, stmt_text in sorted(descendant_leaf_nodes, key=lambda x: x[0]):
+                    node_copy.source_notes.append(f"- {stmt_text} (ID: {stmt_id})")
+            node_copy.llm_instructions = f"This is a high-level principle. If you match this node, you MUST use its 'display_id' ('{node_copy.display_id}') for the 'competency_id' in your response. In your 'justification_for_level', you should then reference the most relevant supporting competency IDs (e.g., 'ID: 1.1', 'ID: 6.2') to support your reasoning."
+            node_copy.children = None
+            node_copy.collapse_children = False
+        if node_copy.children:
+            node_copy.llm_instructions = "This is a category/domain, not a specific competency. Do not match this node directly. You must find a more specific match within its children."
+            pruned_children = _legacy_recursive_prune_nodes(node_copy.children, academic_level_key)
+            node_copy.children = pruned_children if pruned_children else None
+        pruned_nodes.append(node_copy)
+    return pruned_nodes
+
+def legacy_prune_framework_for_llm(framework: FrameworkFile, academic_level_key: AcademicLevelKey) -> Dict[str, Any]:
+    pruned_fw = framework.model_copy(deep=True)
+    pruned_fw.structure = _legacy_recursive_prune_nodes(pruned_fw.structure, academic_level_key.value)
+    return pruned_fw.model_dump(exclude_none=True, exclude={'metadata': {'content_hash'}})
+
+def main():
+    with quiet():
+        framework_library = FrameworkLoader(frameworks_dir='frameworks/').load_all()
+    level = AcademicLevelKey.ADVANCED
+
+    print(f"{'framework':<32}{'legacy ms':>11}{'new ms':>9}{'speedup':>9}{'legacy peak KiB':>17}{'new peak KiB':>14}")
+    totals = {"legacy_ms": 0.0, "new_ms": 0.0, "legacy_peak": 0, "new_peak": 0}
+    for code, framework in framework_library.items():
+        # The legacy deep copy would also clone the indexes attached at load time, which it never had.
+        bare_framework = framework.model_copy()
+        bare_framework._index = bare_framework._retrieval_index = bare_framework._similarity_matrix = None
+        legacy_call = lambda: legacy_prune_framework_for_llm(bare_framework, level)
+        new_call = lambda: prune_framework_for_llm(framework, level)
+        if legacy_call() != new_call():
+            raise AssertionError(f"Pruned output differs for {code}")
+
+        legacy_ms, new_ms = time_per_call_ms(legacy_call), time_per_call_ms(new_call)
+        legacy_peak, new_peak = peak_allocation_bytes(legacy_call), peak_allocation_bytes(new_call)
+        totals["legacy_ms"] += legacy_ms
+        totals["new_ms"] += new_ms
+        totals["legacy_peak"] += legacy_peak
+        totals["new_peak"] += new_peak
+        print(f"{code:<32}{legacy_ms:>11.2f}{new_ms:>9.2f}{legacy_ms / new_ms:>8.1f}x{legacy_peak / 1024:>17.1f}{new_peak / 1024:>14.1f}")
+
+    print(
+        f"{'TOTAL':<32}{totals['legacy_ms']:>11.2f}{totals['new_ms']:>9.2f}"
+        f"{totals['legacy_ms'] / totals['new_ms']:>8.1f}x{totals['legacy_peak'] / 1024:>17.1f}{totals['new_peak'] / 1024:>14.1f}"
+    )
+
+if __name__ == "__main__":
+    main()
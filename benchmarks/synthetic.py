@@ -0,0 +1,144 @@
+# benchmarks/synthetic.py
+
+# Copyright (c) Adrian Robinson 2025
+# This software is dual-licensed under the MIT License (for NHS use only)
+# and a Commercial License (for other use).
+# For commercial licensing inquiries, please contact adrian.j.robinson@gmail.com
+
+"""
+Generates synthetic frameworks and analysis results for the benchmarks.
+
+The bundled frameworks have at most a few hundred nodes, which hides costs
+that grow faster than the framework. Synthetic frameworks have the same YAML
+shape with thousands of nodes, and half of their domains collapse their whole
+subtree, so one collapsed node embeds hundreds of descendant statements.
+Everything is seeded, so each size is identical from run to run.
+"""
+import contextlib
+import os
+import random
+import tempfile
+from itertools import accumulate
+from typing import Any, Dict, Iterator, List, NamedTuple
+
+import yaml
+
+try:
+    from yaml import CSafeDumper as YamlSafeDumper
+except ImportError:
+    from yaml import SafeDumper as YamlSafeDumper
+
+from src.portfolio_mapper.framework_index import get_framework_index
+from src.portfolio_mapper.models.framework import FrameworkFile
+from src.portfolio_mapper.models.llm_response import AssessedCompetency, LLMAnalysisResult
+
+class SyntheticSpec(NamedTuple):
+    """A framework of `domains` trees, each `depth` levels deep with `branching` children per node."""
+    domains: int
+    branching: int
+    depth: int
+
+    @property
+    def node_count(self) -> int:
+        return self.domains * sum(self.branching ** level for level in range(self.depth))
+
+# Framework code suffix -> shape. 400, 1,700 and 6,240 nodes.
+SYNTHETIC_SPECS: Dict[str, SyntheticSpec] = {
+    "small": SyntheticSpec(domains=10, branching=3, depth=4),
+    "medium": SyntheticSpec(domains=20, branching=4, depth=4),
+    "large": SyntheticSpec(domains=40, branching=5, depth=4),
+}
+
+_NODE_TYPES = ["Domain", "Area", "Capability", "Statement"]
+_SYLLABLES = ["ca", "re", "pa", "ti", "ent", "so", "lu", "mi", "der", "on", "ve", "sta", "pro", "ma", "ni", "al", "cor", "ex"]
+# Pseudo-words drawn with Zipf-like frequencies, so term statistics resemble real text.
+_VOCABULARY = sorted({a + b + c for a in _SYLLABLES for b in _SYLLABLES for c in ("", *_SYLLABLES[:6])})
+random.Random(0).shuffle(_VOCABULARY)
+_CUMULATIVE_WEIGHTS = list(accumulate(1.0 / rank for rank in range(1, len(_VOCABULARY) + 1)))
+
+def _sentence(rng: random.Random, min_words: int, max_words: int) -> str:
+    words = rng.choices(_VOCABULARY, cum_weights=_CUMULATIVE_WEIGHTS, k=rng.randint(min_words, max_words))
+    return " ".join(words).capitalize()
+
+def _node(rng: random.Random, spec: SyntheticSpec, node_id: str, level: int) -> Dict[str, Any]:
+    node: Dict[str, Any] = {
+        "id": node_id,
+        "node_type": _NODE_TYPES[min(level, len(_NODE_TYPES) - 1)],
+        "text": _sentence(rng, 6, 16),
+    }
+    if level + 1 < spec.depth:
+        if rng.random() < 0.25:
+            node["source_notes"] = [_sentence(rng, 20, 40)]
+        node["children"] = [
+            _node(rng, spec, str(i), level + 1) for i in range(1, spec.branching + 1)
+        ]
+    elif rng.random() < 0.33:
+        node["source_examples"] = [_sentence(rng, 8, 20) for _ in range(rng.randint(1, 3))]
+    return node
+
+def synthetic_framework_data(name: str, spec: SyntheticSpec, seed: int = 0) -> Dict[str, Any]:
+    """Returns the YAML content of a synthetic framework, as the loader expects it."""
+    rng = random.Random(f"{name}:{seed}")
+    structure = []
+    for i in range(1, spec.domains + 1):
+        domain = _node(rng, spec, f"d{i}", 0)
+        # Every other domain collapses its whole subtree into the domain node.
+        domain["collapse_children"] = i % 2 == 1
+        structure.append(domain)
+    return {
+        "metadata": {
+            "organisation": "Synthetic",
+            "title": f"Synthetic framework ({spec.node_count} nodes)",
+            "date": "2025",
+            "abbreviation": f"SYN-{name}",
+            "version": "1",
+            "dependencies": [],
+        },
+        "structure": structure,
+    }
+
+@contextlib.contextmanager
+def synthetic_frameworks_dir(specs: Dict[str, SyntheticSpec] = SYNTHETIC_SPECS, seed: int = 0) -> Iterator[str]:
+    """
+    Writes one YAML file per spec to a temporary frameworks directory and
+    yields its path. Loaded, the framework codes are "Synthetic-<name>".
+    """
+    with tempfile.TemporaryDirectory(prefix="synthetic_frameworks_") as directory:
+        os.makedirs(os.path.join(directory, "Synthetic"))
+        for name, spec in specs.items():
+            with open(os.path.join(directory, "Synthetic", f"{name}.yaml"), "w", encoding="utf-8") as f:
+                yaml.dump(synthetic_framework_data(name, spec, seed), f, Dumper=YamlSafeDumper, sort_keys=False)
+        yield directory
+
+def synthetic_analysis_result(
+    frameworks: Dict[str, FrameworkFile],
+    competency_count: int,
+    seed: int = 0,
+) -> LLMAnalysisResult:
+    """
+    Returns an analysis result with `competency_count` competencies, taken in
+    turn from the frameworks' matchable nodes and with realistic text lengths.
+    """
+    rng = random.Random(seed)
+    matchable = [
+        (code, node)
+        for code, framework in frameworks.items()
+        for node in get_framework_index(framework).nodes
+        if not node.children or node.collapse_children
+    ]
+    competencies: List[AssessedCompetency] = []
+    for i in range(competency_count):
+        code, node = matchable[i % len(matchable)]
+        competencies.append(AssessedCompetency(
+            framework_code=code,
+            competency_id=node.display_id or node.id,
+            competency_text=node.text,
+            match_strength=rng.randint(1, 5),
+            achieved_level=rng.choice(["Graduate", "Advanced", "Masters"]),
+            justification_for_level=" ".join(_sentence(rng, 12, 24) + "." for _ in range(rng.randint(2, 4))),
+            emerging_evidence_for_next_level=_sentence(rng, 12, 24) + "." if rng.random() < 0.6 else None,
+        ))
+    return LLMAnalysisResult(
+        overall_summary=" ".join(_sentence(rng, 12, 24) + "." for _ in range(5)),
+        assessed_competencies=competencies,
+    )
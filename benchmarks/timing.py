@@ -0,0 +1,49 @@
+# benchmarks/timing.py
+
+# Copyright (c) Adrian Robinson 2025
+# This software is dual-licensed under the MIT License (for NHS use only)
+# and a Commercial License (for other use).
+# For commercial licensing inquiries, please contact adrian.j.robinson@gmail.com
+
+"""
+Measurement helpers shared by the benchmarks.
+"""
+import contextlib
+import io
+import time
+import tracemalloc
+from typing import Any, Callable, Iterator
+
+def time_per_call_ms(func: Callable[[], Any], repeats: int = 5, number: int = 5) -> float:
+    """Best-of-`repeats` mean wall time per call, in milliseconds."""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best * 1000
+
+def calls_per_repeat(func: Callable[[], Any], target_seconds: float = 0.2) -> int:
+    """
+    Returns how many calls make one timed repeat last about `target_seconds`,
+    so that fast paths are not lost in timer noise and slow ones stay bearable.
+    """
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    return max(1, min(1000, int(target_seconds / elapsed) if elapsed > 0 else 1000))
+
+def peak_allocation_bytes(func: Callable[[], Any]) -> int:
+    """Returns the peak traced memory allocated during one call."""
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+@contextlib.contextmanager
+def quiet() -> Iterator[None]:
+    """Silences the loaders' and prompt assembly's progress output while measuring."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
@@ -5,35 +5,228 @@
 # and a Commercial License (for other use).
 # For commercial licensing inquiries, please contact adrian.j.robinson@gmail.com
 
-import streamlit as st
-from typing import Dict, Any
+"""
+This module records privacy-preserving usage events in the Supabase `events`
+table. Events are queued and written by a background thread in multi-row
+INSERTs, so a slow or unavailable database never delays the UI. While the
+database is unreachable, events are appended to a local spool file and
+replayed once it is back.
+"""
+import atexit
 import json
-from sqlalchemy import text
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import streamlit as st
+from sqlalchemy import column, insert, table
+from sqlalchemy.engine import Engine
+
+ANALYTICS_BATCH_SIZE = 50
+ANALYTICS_FLUSH_INTERVAL_SECONDS = 5.0
+ANALYTICS_MAX_QUEUE_SIZE = 10_000
+ANALYTICS_RETRY_INTERVAL_SECONDS = 30.0
+ANALYTICS_SPOOL_PATH = ".cache/analytics_spool.jsonl"
+
+events_table = table("events", column("event_name"), column("properties"), column("created_at"))
+
+_STOP = object()
+
+class AnalyticsWriter:
+    """
+    Writes queued events to the database from a background thread. A batch is
+    flushed when it reaches `batch_size` events or when its oldest event is
+    `flush_interval_seconds` old. If a write fails, the batch is spooled to
+    `spool_path` and the database is left alone for `retry_interval_seconds`;
+    the spool is replayed before the next batch that can be written.
+    """
+    def __init__(
+        self,
+        engine: Engine,
+        spool_path: str = ANALYTICS_SPOOL_PATH,
+        batch_size: int = ANALYTICS_BATCH_SIZE,
+        flush_interval_seconds: float = ANALYTICS_FLUSH_INTERVAL_SECONDS,
+        max_queue_size: int = ANALYTICS_MAX_QUEUE_SIZE,
+        retry_interval_seconds: float = ANALYTICS_RETRY_INTERVAL_SECONDS,
+    ):
+        self.engine = engine
+        self.spool_path = Path(spool_path)
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.retry_interval_seconds = retry_interval_seconds
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue_size)
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self._counters = {"enqueued": 0, "dropped": 0, "written": 0, "spooled": 0, "replayed": 0, "failed_writes": 0}
+        self._thread = threading.Thread(target=self._run, name="analytics-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += amount
+
+    def enqueue(self, event_name: str, properties: Dict[str, Any]) -> None:
+        """Queues an event without blocking. If the queue is full, the event is dropped."""
+        event = {
+            "event_name": event_name,
+            "properties": json.dumps(properties),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+        try:
+            self._queue.put_nowait(event)
+            self._count("enqueued")
+        except queue.Full:
+            self._count("dropped")
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Flushes the queued events and stops the writer thread."""
+        if not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        pending: List[Dict[str, Any]] = []
+        flush_at = 0.0
+        while True:
+            timeout = max(0.0, flush_at - time.monotonic()) if pending else None
+            try:
+                event = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                event = None
+            if event is _STOP:
+                self._safe_flush(pending)
+                return
+            if event is not None:
+                if not pending:
+                    flush_at = time.monotonic() + self.flush_interval_seconds
+                pending.append(event)
+            if pending and (len(pending) >= self.batch_size or time.monotonic() >= flush_at):
+                self._safe_flush(pending)
+                pending = []
+
+    def _safe_flush(self, events: List[Dict[str, Any]]) -> None:
+        # The writer thread must outlive any single failure, e.g. an unreadable spool file.
+        try:
+            self._flush(events)
+        except Exception as e:
+            self._count("dropped", len(events))
+            print(f"Analytics Error: Failed to flush {len(events)} events. Reason: {e}", flush=True)
+
+    def _flush(self, events: List[Dict[str, Any]]) -> None:
+        """Writes the batch, replaying any spooled events first; spools it if the database is unavailable."""
+        if not events:
+            return
+        if time.monotonic() < self._retry_at or not self._replay_spool():
+            self._spool(events)
+            return
+        try:
+            self._insert(events)
+            self._count("written", len(events))
+        except Exception as e:
+            self._write_failed(e)
+            self._spool(events)
+
+    def _insert(self, events: List[Dict[str, Any]]) -> None:
+        rows = [{**event, "created_at": datetime.fromisoformat(event["created_at"])} for event in events]
+        with self.engine.begin() as conn:
+            conn.execute(insert(events_table).values(rows))
+
+    def _write_failed(self, e: Exception) -> None:
+        self._count("failed_writes")
+        self._retry_at = time.monotonic() + self.retry_interval_seconds
+        print(f"Analytics Error: Failed to write events; spooling to '{self.spool_path}'. Reason: {e}", flush=True)
+
+    def _spool(self, events: List[Dict[str, Any]]) -> None:
+        try:
+            self.spool_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.spool_path, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(event) + "\n" for event in events)
+            self._count("spooled", len(events))
+        except OSError as e:
+            self._count("dropped", len(events))
+            print(f"Analytics Error: Failed to spool {len(events)} events. Reason: {e}", flush=True)
+
+    def _replay_spool(self) -> bool:
+        """
+        Writes spooled events to the database in batches. Returns False if the
+        database is unavailable; the events not yet written stay spooled.
+        """
+        replaying_path = self.spool_path.with_suffix(self.spool_path.suffix + ".replaying")
+        # Left behind if the process stopped mid-replay; finish it first.
+        if not replaying_path.exists():
+            if not self.spool_path.exists():
+                return True
+            os.replace(self.spool_path, replaying_path)
+
+        events = []
+        with open(replaying_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue  # A line cut short by a crash mid-write.
+
+        for start in range(0, len(events), self.batch_size):
+            batch = events[start:start + self.batch_size]
+            try:
+                self._insert(batch)
+            except Exception as e:
+                self._write_failed(e)
+                self._spool(events[start:])
+                replaying_path.unlink()
+                return False
+            self._count("replayed", len(batch))
+        replaying_path.unlink()
+        print(f"--- Analytics: replayed {len(events)} spooled events ---", flush=True)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns a snapshot of the writer's counters, suitable for logging or scraping."""
+        with self._lock:
+            stats = dict(self._counters)
+        return {"name": "analytics_writer", "queued": self._queue.qsize(), **stats}
+
+@st.cache_resource
+def get_analytics_writer() -> Optional[AnalyticsWriter]:
+    """
+    Creates and caches the background event writer, shared by all sessions.
+    Returns None if the database connection is not configured.
+    """
+    try:
+        # Initialize connection to Supabase. This only builds the engine; nothing is sent yet.
+        engine = st.connection("db", type="sql").engine
+    except Exception as e:
+        print(f"Analytics Error: Database connection is not configured; events will not be tracked. Reason: {e}", flush=True)
+        return None
+    return AnalyticsWriter(engine)
 
 def track_event(event_name: str, properties: Dict[str, Any] = None):
     """
-    Tracks an event by inserting it into a Supabase database.
+    Queues an event for the Supabase database and returns immediately.
     This is privacy-preserving and does not log user reflection text.
     """
     try:
-        # Initialize connection to Supabase.
-        conn = st.connection("db", type="sql")
+        writer = get_analytics_writer()
+        if writer is None:
+            return
 
         # Create a copy to avoid modifying the original dict passed to the function
         event_properties = properties.copy() if properties else {}
-        
+
         # Automatically add session_id if it exists in the state
         if "session_id" in st.session_state:
             event_properties["session_id"] = st.session_state.session_id
-        
-        # Use a session to execute the query
-        with conn.session as s:
-            s.execute(
-                text('INSERT INTO events (event_name, properties) VALUES (:event_name, :properties);'),
-                params=dict(event_name=event_name, properties=json.dumps(event_properties))
-            )
-            s.commit()
+
+        writer.enqueue(event_name, event_properties)
     except Exception as e:
         # Fail silently to not disrupt the user experience.
-        # In a production environment, we might log this error elsewhere.
-        print(f"Analytics Error: Failed to track event '{event_name}'. Reason: {e}")
\ No newline at end of file
+        print(f"Analytics Error: Failed to track event '{event_name}'. Reason: {e}")
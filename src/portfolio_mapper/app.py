@@ -11,19 +11,32 @@ This file is responsible for orchestrating the user interface and application fl
 """
 from collections import defaultdict
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import random
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 # --- Local Imports ---
-from .data_loader import ConfigLoader, FrameworkLoader
-from .logic import assemble_analysis_prompt, assemble_safety_prompt
-from .llm_functions import call_gemini_for_analysis, call_gemini_for_safety_check
+from .data_loader import ConfigLoader
+from .snapshot import load_library
+from .context_cache import PromptContext
+from .logic import (
+    assemble_analysis_prompt_parts, assemble_safety_prompt,
+    group_frameworks_for_fan_out, merge_analysis_results, merge_safety_results, split_into_safety_chunks
+)
+from .llm_functions import call_gemini_for_analysis, call_gemini_for_safety_check, get_safety_verdict_cache
+from .pii_screen import apply_local_pii_screen
+from .similarity import attach_plausibility_scores, order_frameworks_by_similarity
 from .analytics import track_event
 from .state_manager import initialize_session_state, invalidate_results, clear_state
 from .ui_components import (
     render_sidebar, render_main_inputs, render_safety_warnings,
-    render_results, render_footer, UserSelections
+    render_results, render_live_competencies, render_footer, UserSelections
 )
 from .models.config import AcademicLevelKey
+from .models.framework import FrameworkFile
+from .models.llm_response import AssessedCompetency, LLMAnalysisResult
+from .models.safety import SafetyAnalysis
 
 # set humour level to 100%
 LOADING_MESSAGES = [
@@ -50,22 +63,171 @@ LOADING_MESSAGES = [
 
 @st.cache_resource
 def load_data():
-    """Loads all framework and config files and caches them."""
+    """
+    Loads all framework and config files and caches them. A compiled snapshot
+    is used when it matches the source files; otherwise the YAML is parsed.
+    """
     try:
-        framework_loader = FrameworkLoader(frameworks_dir='frameworks/')
-        framework_library = framework_loader.load_all()
-        config_loader = ConfigLoader(config_dir='config/')
-        config_loader.load_all()
-        return framework_library, config_loader
+        return load_library(frameworks_dir='frameworks/', config_dir='config/')
     except Exception as e:
         st.error(f"A critical error occurred during application startup: {e}")
         st.info("Please check the console logs for more details. The application cannot continue.")
         return None, None
 
+def _run_concurrently(*calls: Callable[[], Any]) -> List[Any]:
+    """
+    Runs the given callables on worker threads and returns their results in
+    order. Each thread is attached to the current script run context so that
+    Streamlit calls made inside them (errors, cached resources) still work.
+    """
+    ctx = get_script_run_ctx()
+    results: List[Any] = [None] * len(calls)
+    errors: List[BaseException] = []
+
+    def _runner(position: int, call: Callable[[], Any]):
+        try:
+            results[position] = call()
+        except BaseException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=_runner, args=(i, call)) for i, call in enumerate(calls)]
+    for thread in threads:
+        add_script_run_ctx(thread, ctx)
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return results
+
+def _selected_frameworks(user_selections: UserSelections) -> Dict[str, FrameworkFile]:
+    return {
+        code: user_selections.available_frameworks[code] 
+        for code in user_selections.all_required_codes if code in user_selections.available_frameworks
+    }
+
+def _build_analysis_prompt(
+    config_loader: ConfigLoader,
+    user_selections: UserSelections,
+    selected_frameworks_dict: Dict[str, FrameworkFile],
+) -> Tuple[str, Optional[PromptContext]]:
+    """
+    Assembles the main analysis prompt for the given frameworks and the current
+    reflection, with the context under which its static prefix can be cached.
+    Shortlisted prompts have no shared prefix, so their context is None.
+    """
+    prompt_obj = config_loader.prompts["portfolio_analysis_v1"]
+
+    # Convert the string key from selections into the expected Enum
+    level_key_enum = AcademicLevelKey(user_selections.selected_level_key)
+
+    static_prefix, dynamic_suffix = assemble_analysis_prompt_parts(
+        user_selections.role_obj, user_selections.level_obj, level_key_enum,
+        st.session_state.reflection_text, selected_frameworks_dict, prompt_obj, 
+        user_selections.next_level_name, user_selections.next_level_description, 
+        config_loader.llm_config.app.debug_mode, config_loader.academic_levels,
+        token_budget=config_loader.llm_config.app.prompt_token_budget,
+        shortlist_top_k=config_loader.llm_config.app.shortlist_top_k,
+    )
+    if config_loader.llm_config.app.shortlist_top_k is not None:
+        return static_prefix + dynamic_suffix, None
+    context_key = (user_selections.role_obj.display_name, level_key_enum.value, tuple(selected_frameworks_dict))
+    return static_prefix + dynamic_suffix, PromptContext(context_key, static_prefix)
+
+def _run_analysis(
+    config_loader: ConfigLoader,
+    user_selections: UserSelections,
+    on_competency: Optional[Callable[[AssessedCompetency], None]] = None,
+) -> Optional[LLMAnalysisResult]:
+    """
+    Runs the main analysis, either as a single call or, when analysis_fan_out
+    is above 1, as concurrent calls over token-balanced groups of frameworks.
+    A failed group does not lose the results of the others.
+    """
+    selected_frameworks_dict = _selected_frameworks(user_selections)
+    if config_loader.llm_config.app.order_frameworks_by_similarity:
+        selected_frameworks_dict = order_frameworks_by_similarity(selected_frameworks_dict, st.session_state.reflection_text)
+    st.session_state.analysis_failed_frameworks = []
+    fan_out = config_loader.llm_config.app.analysis_fan_out
+    if fan_out <= 1 or len(selected_frameworks_dict) <= 1:
+        final_prompt, context = _build_analysis_prompt(config_loader, user_selections, selected_frameworks_dict)
+        return call_gemini_for_analysis(
+            final_prompt, config_loader, on_competency=on_competency, context=context, frameworks=selected_frameworks_dict
+        )
+
+    level_key_enum = AcademicLevelKey(user_selections.selected_level_key)
+    groups = group_frameworks_for_fan_out(selected_frameworks_dict, level_key_enum, fan_out)
+    prompts = [_build_analysis_prompt(config_loader, user_selections, group) for group in groups]
+
+    group_callback = None
+    if on_competency:
+        # Competencies now arrive from several worker threads; render them one at a time.
+        render_lock = threading.Lock()
+        def group_callback(competency: AssessedCompetency):
+            with render_lock:
+                on_competency(competency)
+
+    print(f"--- Fanning out analysis over {len(groups)} framework groups ---", flush=True)
+    results = _run_concurrently(*[
+        lambda prompt=prompt, context=context, group=group: call_gemini_for_analysis(
+            prompt, config_loader, on_competency=group_callback, context=context, frameworks=group
+        )
+        for group, (prompt, context) in zip(groups, prompts)
+    ])
+
+    partial_results = [(group, result) for group, result in zip(groups, results) if result is not None]
+    if not partial_results:
+        return None
+    # Kept in session state so the results page can say which frameworks are missing.
+    st.session_state.analysis_failed_frameworks = [
+        fw.metadata.abbreviation for group, result in zip(groups, results) if result is None for fw in group.values()
+    ]
+    return merge_analysis_results(partial_results)
+
+def _run_safety_check(config_loader: ConfigLoader) -> Optional[SafetyAnalysis]:
+    """
+    Runs the safety check on the current reflection. With safety_chunk_min_chars
+    set, each chunk of paragraphs is checked separately and concurrently, and
+    chunks checked before (in any session) are served from the verdict cache,
+    so an edit only re-sends the chunks it touched.
+    """
+    safety_prompt_obj = config_loader.prompts["safety_check_v1"]
+    min_chars = config_loader.llm_config.app.safety_chunk_min_chars
+    if min_chars is None:
+        safety_prompt = assemble_safety_prompt(st.session_state.reflection_text, safety_prompt_obj)
+        return call_gemini_for_safety_check(safety_prompt, config_loader)
+
+    chunks = split_into_safety_chunks(st.session_state.reflection_text, min_chars)
+    prompts = [assemble_safety_prompt(chunk, safety_prompt_obj) for chunk in chunks]
+    results = _run_concurrently(*[
+        lambda prompt=prompt: call_gemini_for_safety_check(prompt, config_loader) for prompt in prompts
+    ])
+    if config_loader.llm_config.app.debug_mode:
+        print(f"--- Safety check over {len(chunks)} chunks; verdicts: {get_safety_verdict_cache().stats()} ---", flush=True)
+    # Any failed chunk has already shown its error; a partial verdict is never used.
+    if any(result is None for result in results):
+        return None
+    return merge_safety_results(results)
+
+def _run_speculative_safety_and_analysis(config_loader: ConfigLoader, user_selections: UserSelections):
+    """
+    Sends the safety check and the main analysis at the same time. The analysis
+    result is held back in session state, as (True, result), and is only
+    released by the pipeline once the safety verdict allows it.
+    """
+    safety_result, analysis_result = _run_concurrently(
+        lambda: _run_safety_check(config_loader),
+        lambda: _run_analysis(config_loader, user_selections),
+    )
+    # A failed call has already shown its error; marking it as run stops the pipeline repeating it.
+    st.session_state.speculative_analysis_result = (True, analysis_result)
+    return safety_result
+
 def _run_analysis_pipeline(config_loader: ConfigLoader, user_selections: UserSelections):
     """
     Encapsulates the entire multi-stage analysis process.
-    Runs safety check, then main analysis if safe.
+    Runs safety check, then main analysis if safe. In speculative mode both
+    calls are sent together and the analysis is withheld until the check passes.
     """
     # Track the event here, after the UI has updated to show it's processing.
     # This makes the button click feel instantaneous.
@@ -76,28 +238,41 @@ def _run_analysis_pipeline(config_loader: ConfigLoader, user_selections: UserSel
     })
 
     # --- STAGE 1: SAFETY CHECK ---
-    # This is usually fast, so a simple, static message is fine.
-    with st.spinner("⚙️ Performing initial safety check..."):
-        if not st.session_state.safety_analysis_result:
-            safety_prompt_obj = config_loader.prompts["safety_check_v1"]
-            safety_prompt = assemble_safety_prompt(st.session_state.reflection_text, safety_prompt_obj)
-            safety_result = call_gemini_for_safety_check(safety_prompt, config_loader)
+    if not st.session_state.safety_analysis_result:
+        if config_loader.llm_config.app.speculative_analysis:
+            spinner_text = f"⚙️ Performing safety check and analysis together... {random.choice(LOADING_MESSAGES)}"
+            with st.spinner(spinner_text):
+                safety_result = _run_speculative_safety_and_analysis(config_loader, user_selections)
+        else:
+            # This is usually fast, so a simple, static message is fine.
+            with st.spinner("⚙️ Performing initial safety check..."):
+                safety_result = _run_safety_check(config_loader)
 
-            # If the API call failed, an error is already displayed. Halt the pipeline.
-            if safety_result is None:
-                st.session_state.processing = False
-                return
+        # If the API call failed, an error is already displayed. Halt the pipeline.
+        if safety_result is None:
+            st.session_state.speculative_analysis_result = None
+            st.session_state.processing = False
+            return
 
-            st.session_state.safety_analysis_result = safety_result
+        st.session_state.safety_analysis_result = apply_local_pii_screen(
+            safety_result, st.session_state.reflection_text, config_loader.llm_config.app.local_pii_screen
+        )
 
     # --- STAGE 2: EVALUATE SAFETY & DECIDE ACTION ---
     can_proceed = False
     if safety_result := st.session_state.safety_analysis_result:
         if not safety_result.is_safe_for_processing:
+            # Never release a speculative analysis for a reflection flagged for distress.
+            st.session_state.speculative_analysis_result = None
             track_event("safety_check_distress_detected")
         elif safety_result.pii_detections and not st.session_state.pii_warning_acknowledged:
+            # Any speculative analysis stays held back until the user acknowledges the
+            # warning; editing the reflection instead discards it via invalidate_results.
             flags = sorted([d.flag.value for d in safety_result.pii_detections])
             track_event("safety_check_pii_detected", {"flags": flags})
+            if st.session_state.speculative_analysis_result == (True, None):
+                # Its error is not shown again after the rerun, so acknowledging runs the analysis afresh.
+                st.session_state.speculative_analysis_result = None
         else:
             if safety_result.pii_detections and st.session_state.pii_warning_acknowledged:
                 flags = sorted([d.flag.value for d in safety_result.pii_detections])
@@ -106,54 +281,53 @@ def _run_analysis_pipeline(config_loader: ConfigLoader, user_selections: UserSel
     
     # --- STAGE 3: MAIN ANALYSIS (if safe) ---
     if can_proceed:
-        # This is the long part, so we use a fun, random message.
-        random_message = random.choice(LOADING_MESSAGES)
-        spinner_text = f"⚙️ {random_message} (this may take a moment)"
-        with st.spinner(spinner_text):
-            selected_frameworks_dict = {
-                code: user_selections.available_frameworks[code] 
-                for code in user_selections.all_required_codes if code in user_selections.available_frameworks
-            }
-            prompt_obj = config_loader.prompts["portfolio_analysis_v1"]
-
-            # Convert the string key from selections into the expected Enum
-            level_key_enum = AcademicLevelKey(user_selections.selected_level_key)
-
-            final_prompt = assemble_analysis_prompt(
-                user_selections.role_obj, user_selections.level_obj, level_key_enum,
-                st.session_state.reflection_text, selected_frameworks_dict, prompt_obj, 
-                user_selections.next_level_name, user_selections.next_level_description, 
-                config_loader.llm_config.app.debug_mode, config_loader.academic_levels
-            )
-            analysis_result = call_gemini_for_analysis(final_prompt, config_loader)
-
-            # If the API call failed, an error is already displayed. Halt the pipeline.
-            if analysis_result is None:
-                st.session_state.processing = False
-                return
-
-            st.session_state.analysis_result = analysis_result
-
-            mapped_competencies = defaultdict(list)
-            if analysis_result:
-                for c in analysis_result.assessed_competencies:
-                    mapped_competencies[c.framework_code].append(c.competency_id)
-                for code in mapped_competencies: mapped_competencies[code].sort()
-
-            track_event("analysis_completed", {
-                "role": user_selections.selected_role_display, "academic_level": user_selections.selected_level_name,
-                "frameworks": sorted(user_selections.all_required_codes), "success": bool(analysis_result),
-                "mapped_competency_count": sum(len(ids) for ids in mapped_competencies.values()),
-                "mapped_competencies": dict(mapped_competencies)
-            })
-
-            if analysis_result:
-                st.session_state.last_analysis_reflection = st.session_state.reflection_text
-                st.session_state.last_analysis_frameworks = set(user_selections.all_required_codes)
-                st.session_state.analysis_just_completed = True
-            else:
-                st.session_state.last_analysis_reflection, st.session_state.last_analysis_frameworks = None, None
-                st.session_state.analysis_just_completed = False
+        speculative_ran, analysis_result = st.session_state.speculative_analysis_result or (False, None)
+        st.session_state.speculative_analysis_result = None
+
+        if not speculative_ran:
+            # Streamed competencies are only shown here, after the safety check has passed.
+            on_competency = None
+            if config_loader.llm_config.app.stream_analysis:
+                on_competency = render_live_competencies(user_selections.available_frameworks)
+
+            # This is the long part, so we use a fun, random message.
+            random_message = random.choice(LOADING_MESSAGES)
+            spinner_text = f"⚙️ {random_message} (this may take a moment)"
+            with st.spinner(spinner_text):
+                analysis_result = _run_analysis(config_loader, user_selections, on_competency=on_competency)
+
+        # If the API call failed, an error is already displayed. Halt the pipeline.
+        if analysis_result is None:
+            st.session_state.processing = False
+            return
+
+        unsupported = attach_plausibility_scores(
+            analysis_result, user_selections.available_frameworks, st.session_state.reflection_text
+        )
+        if unsupported and config_loader.llm_config.app.debug_mode:
+            print(f"  ⚠️ [PLAUSIBILITY] No words in common with the reflection: {unsupported}", flush=True)
+        st.session_state.analysis_result = analysis_result
+
+        mapped_competencies = defaultdict(list)
+        if analysis_result:
+            for c in analysis_result.assessed_competencies:
+                mapped_competencies[c.framework_code].append(c.competency_id)
+            for code in mapped_competencies: mapped_competencies[code].sort()
+
+        track_event("analysis_completed", {
+            "role": user_selections.selected_role_display, "academic_level": user_selections.selected_level_name,
+            "frameworks": sorted(user_selections.all_required_codes), "success": bool(analysis_result),
+            "mapped_competency_count": sum(len(ids) for ids in mapped_competencies.values()),
+            "mapped_competencies": dict(mapped_competencies)
+        })
+
+        if analysis_result:
+            st.session_state.last_analysis_reflection = st.session_state.reflection_text
+            st.session_state.last_analysis_frameworks = set(user_selections.all_required_codes)
+            st.session_state.analysis_just_completed = True
+        else:
+            st.session_state.last_analysis_reflection, st.session_state.last_analysis_frameworks = None, None
+            st.session_state.analysis_just_completed = False
 
     st.session_state.processing = False
     st.rerun()
@@ -0,0 +1,366 @@
+# src/portfolio_mapper/batch.py
+
+# Copyright (c) Adrian Robinson 2025
+# This software is dual-licensed under the MIT License (for NHS use only)
+# and a Commercial License (for other use).
+# For commercial licensing inquiries, please contact adrian.j.robinson@gmail.com
+
+"""
+Headless batch analysis, for pushing a cohort's reflections through without
+the Streamlit UI. Each reflection gets the same safety check and analysis as
+in the app; results are appended to a JSONL file as each one completes.
+
+Input is either a directory of .txt reflections (the file name is the id) or
+a JSONL manifest with one {"id", "reflection_text" | "path", "role",
+"academic_level", "frameworks"} object per line. Re-running with the same
+output file skips every item that already has a final result, so an
+interrupted run resumes where it stopped. Run from the project root:
+
+python -m src.portfolio_mapper.batch sample_reflections/ --role pre_reg_nurse --output results.jsonl
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import tomllib
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Set
+
+from pydantic import ValidationError
+
+from .context_cache import ContextCacheManager, PromptContext
+from .data_loader import ConfigLoader
+from .gemini_client import (
+    create_call_guard, create_context_cache, create_llm_client, generate_analysis,
+    generate_safety_check, open_response_cache
+)
+from .logic import (
+    assemble_analysis_prompt_parts, assemble_safety_prompt, get_next_academic_level, merge_safety_results,
+    resolve_allowed_frameworks, resolve_required_framework_codes, split_into_safety_chunks
+)
+from .models.batch import BatchItem, BatchResult, BatchStatus
+from .models.config import AcademicLevelKey
+from .models.framework import FrameworkFile
+from .rate_limit import ApiCallGuard
+from .pii_screen import apply_local_pii_screen
+from .response_cache import ResponseCache
+from .response_repair import RepairStats
+from .similarity import attach_plausibility_scores, order_frameworks_by_similarity
+from .snapshot import load_library
+
+SECRETS_PATH = os.path.join('.streamlit', 'secrets.toml')
+
+def _resolve_api_key() -> Optional[str]:
+    """Reads GOOGLE_API_KEY from the environment, falling back to the Streamlit secrets file."""
+    if api_key := os.environ.get("GOOGLE_API_KEY"):
+        return api_key
+    if os.path.exists(SECRETS_PATH):
+        with open(SECRETS_PATH, 'rb') as f:
+            return tomllib.load(f).get("GOOGLE_API_KEY")
+    return None
+
+def iter_batch_items(input_path: str) -> Iterator[BatchItem]:
+    """
+    Yields the items of a directory of .txt files (sorted by name) or of a
+    JSONL manifest, lazily, so large inputs are never held in memory at once.
+    Manifest paths are resolved relative to the manifest's directory.
+    """
+    if os.path.isdir(input_path):
+        for file_name in sorted(os.listdir(input_path)):
+            if file_name.endswith('.txt'):
+                with open(os.path.join(input_path, file_name), 'r', encoding='utf-8') as f:
+                    yield BatchItem(id=os.path.splitext(file_name)[0], reflection_text=f.read())
+        return
+
+    base_dir = os.path.dirname(os.path.abspath(input_path))
+    with open(input_path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                if "reflection_text" not in entry and "path" in entry:
+                    with open(os.path.join(base_dir, entry.pop("path")), 'r', encoding='utf-8') as reflection_file:
+                        entry["reflection_text"] = reflection_file.read()
+                yield BatchItem.model_validate(entry)
+            except (json.JSONDecodeError, OSError, ValidationError) as e:
+                print(f"  ❌ [MANIFEST ERROR] {input_path} line {line_number}: {e}", flush=True)
+
+def load_finished_ids(output_path: str, allow_pii: bool = False) -> Set[str]:
+    """
+    Returns the ids that already have a final result in `output_path`. Failed
+    items are retried; a line cut short by an interruption is ignored. With
+    `allow_pii`, items held back for PII are not final either, so a re-run
+    with --allow-pii analyses them.
+    """
+    finished: Set[str] = set()
+    if not os.path.exists(output_path):
+        return finished
+    with open(output_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                result = BatchResult.model_validate_json(line)
+            except ValidationError:
+                continue
+            if result.status == BatchStatus.FAILED:
+                continue
+            if allow_pii and result.status == BatchStatus.PII_DETECTED:
+                continue
+            finished.add(result.id)
+    return finished
+
+class ResultWriter:
+    """Appends results to the JSONL output from any worker thread, one complete line at a time."""
+
+    def __init__(self, output_path: str):
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(output_path, 'a+', encoding='utf-8')
+        # Start on a fresh line if the previous run was interrupted mid-write.
+        if self._file.tell() > 0:
+            self._file.seek(self._file.tell() - 1)
+            if self._file.read(1) != "\n":
+                self._file.write("\n")
+
+    def write(self, result: BatchResult) -> None:
+        with self._lock:
+            self._file.write(result.model_dump_json() + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+class BatchRunner:
+    """Runs the safety check and analysis for single items, sharing the client and caches."""
+
+    def __init__(
+        self,
+        config_loader: ConfigLoader,
+        framework_library: Dict[str, FrameworkFile],
+        client,
+        default_role: Optional[str] = None,
+        default_level: Optional[AcademicLevelKey] = None,
+        default_frameworks: Optional[List[str]] = None,
+        allow_pii: bool = False,
+        response_cache: Optional[ResponseCache] = None,
+        context_cache: Optional[ContextCacheManager] = None,
+        call_guard: Optional[ApiCallGuard] = None,
+    ):
+        self.config_loader = config_loader
+        self.framework_library = framework_library
+        self.client = client
+        self.default_role = default_role
+        self.default_level = default_level
+        self.default_frameworks = default_frameworks
+        self.allow_pii = allow_pii
+        self.response_cache = response_cache
+        self.context_cache = context_cache
+        self.call_guard = call_guard
+        self.repair_stats = RepairStats()
+
+    def run_item(self, item: BatchItem) -> BatchResult:
+        """Processes one item. Never raises; errors are reported as a FAILED result."""
+        start = time.perf_counter()
+        result = BatchResult(id=item.id, status=BatchStatus.FAILED, completed_at="")
+        try:
+            self._run_item(item, result)
+        except Exception as e:
+            result.status = BatchStatus.FAILED
+            result.error = f"{type(e).__name__}: {e}"
+        result.elapsed_seconds = round(time.perf_counter() - start, 3)
+        result.completed_at = datetime.now(timezone.utc).isoformat()
+        return result
+
+    def _run_item(self, item: BatchItem, result: BatchResult) -> None:
+        config_loader = self.config_loader
+
+        role_key = item.role or self.default_role
+        if role_key not in config_loader.roles:
+            raise ValueError(f"Unknown or missing role '{role_key}'.")
+        role_obj = config_loader.roles[role_key]
+        level_key = item.academic_level or self.default_level or role_obj.default_academic_level
+        result.role, result.academic_level = role_key, level_key
+
+        available_frameworks = resolve_allowed_frameworks(role_obj, self.framework_library)
+        selected_codes = item.frameworks or self.default_frameworks or [
+            code for code, fw in available_frameworks.items() if fw.metadata.display_in_ui
+        ]
+        not_allowed = [code for code in selected_codes if code not in available_frameworks]
+        if not_allowed:
+            raise ValueError(f"Frameworks not available to role '{role_key}': {', '.join(not_allowed)}")
+        # Sorted, so every item with the same selection shares one cacheable prompt prefix.
+        selected_frameworks = {
+            code: available_frameworks[code]
+            for code in sorted(resolve_required_framework_codes(selected_codes, self.framework_library))
+            if code in available_frameworks
+        }
+        result.frameworks = list(selected_frameworks)
+
+        min_len = config_loader.llm_config.app.min_reflection_length
+        if len(item.reflection_text.strip()) < min_len:
+            raise ValueError(f"Reflection is shorter than the minimum of {min_len} characters.")
+
+        # Checked chunk by chunk if configured; the response cache then reuses
+        # the verdicts of chunks shared with earlier versions of a reflection.
+        min_chars = config_loader.llm_config.app.safety_chunk_min_chars
+        chunks = split_into_safety_chunks(item.reflection_text, min_chars) if min_chars else [item.reflection_text]
+        result.safety = merge_safety_results([
+            generate_safety_check(
+                self.client, assemble_safety_prompt(chunk, config_loader.prompts["safety_check_v1"]), config_loader,
+                response_cache=self.response_cache, call_guard=self.call_guard,
+            )
+            for chunk in chunks
+        ])
+        result.safety = apply_local_pii_screen(
+            result.safety, item.reflection_text, config_loader.llm_config.app.local_pii_screen
+        )
+        if not result.safety.is_safe_for_processing:
+            result.status = BatchStatus.DISTRESS_DETECTED
+            return
+        if result.safety.pii_detections and not self.allow_pii:
+            result.status = BatchStatus.PII_DETECTED
+            return
+
+        if config_loader.llm_config.app.order_frameworks_by_similarity:
+            selected_frameworks = order_frameworks_by_similarity(selected_frameworks, item.reflection_text)
+        level_obj = config_loader.academic_levels[level_key]
+        next_level_name, next_level_description = get_next_academic_level(level_key, config_loader.academic_levels)
+        static_prefix, dynamic_suffix = assemble_analysis_prompt_parts(
+            role_obj, level_obj, level_key, item.reflection_text, selected_frameworks,
+            config_loader.prompts["portfolio_analysis_v1"], next_level_name, next_level_description,
+            config_loader.llm_config.app.debug_mode, config_loader.academic_levels,
+            token_budget=config_loader.llm_config.app.prompt_token_budget,
+            shortlist_top_k=config_loader.llm_config.app.shortlist_top_k,
+        )
+        # A shortlisted prompt depends on the reflection, so there is no shared prefix to cache.
+        context = None
+        if config_loader.llm_config.app.shortlist_top_k is None:
+            context = PromptContext((role_obj.display_name, level_key.value, tuple(selected_frameworks)), static_prefix)
+        result.analysis = generate_analysis(
+            self.client, static_prefix + dynamic_suffix, config_loader,
+            context=context, response_cache=self.response_cache, context_cache=self.context_cache,
+            call_guard=self.call_guard, frameworks=selected_frameworks, repair_stats=self.repair_stats,
+        )
+        attach_plausibility_scores(result.analysis, selected_frameworks, item.reflection_text)
+        result.status = BatchStatus.COMPLETED
+
+def run_batch(
+    runner: BatchRunner,
+    items: Iterator[BatchItem],
+    writer: ResultWriter,
+    finished_ids: Set[str],
+    concurrency: int,
+) -> Dict[BatchStatus, int]:
+    """
+    Runs the items on a pool of `concurrency` threads. At most twice that many
+    items are read ahead, and each result is written as soon as it completes.
+    Returns the number of results per status.
+    """
+    counts = {status: 0 for status in BatchStatus}
+    seen_ids: Set[str] = set()
+    in_flight: Set[Future] = set()
+
+    def _collect(done: Set[Future]) -> None:
+        for future in done:
+            result = future.result()
+            writer.write(result)
+            counts[result.status] += 1
+            if result.status == BatchStatus.FAILED:
+                print(f"  ❌ [FAILED] {result.id}: {result.error}", flush=True)
+            elif result.status == BatchStatus.COMPLETED:
+                competencies = len(result.analysis.assessed_competencies)
+                print(f"  ✅ [COMPLETED] {result.id} ({competencies} competencies, {result.elapsed_seconds:.1f}s)", flush=True)
+                if result.analysis.response_truncated or result.analysis.competencies_dropped:
+                    print(
+                        f"  ⚠️ [INCOMPLETE] {result.id}: competencies were lost (truncated: {result.analysis.response_truncated}, "
+                        f"dropped: {result.analysis.competencies_dropped}).", flush=True
+                    )
+            else:
+                print(f"  ⚠️ [{result.status.value.upper()}] {result.id}: not analysed.", flush=True)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for item in items:
+            if item.id in seen_ids:
+                print(f"  ⚠️ [DUPLICATE ID] '{item.id}' appears more than once; only the first is run.", flush=True)
+                continue
+            seen_ids.add(item.id)
+            if item.id in finished_ids:
+                continue
+            if len(in_flight) >= concurrency * 2:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                _collect(done)
+            in_flight.add(executor.submit(runner.run_item, item))
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            _collect(done)
+
+    return counts
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.portfolio_mapper.batch",
+        description="Analyse a batch of reflections without the Streamlit UI."
+    )
+    parser.add_argument("input", help="A directory of .txt reflections, or a JSONL manifest.")
+    parser.add_argument("--output", default="batch_results.jsonl", help="JSONL results file; existing final results are skipped.")
+    parser.add_argument("--role", help="Role key from roles.yaml for items that do not set one.")
+    parser.add_argument("--level", choices=[k.value for k in AcademicLevelKey], help="Academic level for items that do not set one.")
+    parser.add_argument("--frameworks", help="Comma-separated framework codes for items that do not set them.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Number of reflections processed at once.")
+    parser.add_argument("--allow-pii", action="store_true", help="Analyse reflections even if the safety check detected PII.")
+    parser.add_argument("--frameworks-dir", default="frameworks/")
+    parser.add_argument("--config-dir", default="config/")
+    args = parser.parse_args(argv)
+
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if not os.path.exists(args.input):
+        parser.error(f"input '{args.input}' does not exist")
+
+    api_key = _resolve_api_key()
+    if not api_key:
+        print(f"`GOOGLE_API_KEY` not found. Set it in the environment or in `{SECRETS_PATH}`.", file=sys.stderr)
+        return 2
+
+    framework_library, config_loader = load_library(args.frameworks_dir, args.config_dir)
+    if args.role and args.role not in config_loader.roles:
+        parser.error(f"unknown role '{args.role}'; choose from: {', '.join(config_loader.roles)}")
+
+    llm_config = config_loader.llm_config
+    runner = BatchRunner(
+        config_loader, framework_library, create_llm_client(api_key, llm_config.gemini),
+        default_role=args.role,
+        default_level=AcademicLevelKey(args.level) if args.level else None,
+        default_frameworks=[code.strip() for code in args.frameworks.split(',') if code.strip()] if args.frameworks else None,
+        allow_pii=args.allow_pii,
+        response_cache=open_response_cache(llm_config.response_cache),
+        context_cache=create_context_cache(llm_config),
+        call_guard=create_call_guard(llm_config.rate_limit),
+    )
+
+    finished_ids = load_finished_ids(args.output, allow_pii=args.allow_pii)
+    if finished_ids:
+        print(f"--- Resuming: {len(finished_ids)} items already have results in '{args.output}' ---", flush=True)
+
+    print(f"--- Running batch from '{args.input}' with concurrency {args.concurrency} ---", flush=True)
+    start = time.perf_counter()
+    writer = ResultWriter(args.output)
+    try:
+        counts = run_batch(runner, iter_batch_items(args.input), writer, finished_ids, args.concurrency)
+    finally:
+        writer.close()
+        if runner.context_cache:
+            runner.context_cache.clear()
+
+    summary = ", ".join(f"{status.value}: {count}" for status, count in counts.items())
+    print(f"--- Batch finished in {time.perf_counter() - start:.1f}s ({summary}) ---", flush=True)
+    if runner.call_guard:
+        print(f"--- API calls: {runner.call_guard.stats()} ---", flush=True)
+    print(f"--- Response repair: {runner.repair_stats.stats()} ---", flush=True)
+    return 1 if counts[BatchStatus.FAILED] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
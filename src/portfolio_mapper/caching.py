@@ -0,0 +1,175 @@
+# src/portfolio_mapper/caching.py
+
+# Copyright (c) Adrian Robinson 2025
+# This software is dual-licensed under the MIT License (for NHS use only)
+# and a Commercial License (for other use).
+# For commercial licensing inquiries, please contact adrian.j.robinson@gmail.com
+
+"""
+This module provides small, thread-safe, in-process caching primitives that
+are shared across all sessions served by the same Streamlit server process.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+def content_hash(data: bytes) -> str:
+    """Returns a short, stable hex digest for the given content."""
+    return hashlib.sha256(data).hexdigest()[:16]
+
+class LRUCache(Generic[V]):
+    """
+    A bounded, thread-safe least-recently-used cache with hit/miss counters.
+
+    Entries beyond `max_entries` are evicted oldest-first. The counters are
+    cumulative for the lifetime of the process and can be read with `stats()`.
+    """
+    def __init__(self, name: str, max_entries: int = 128):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1.")
+        self.name = name
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, V]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[V]:
+        """Returns the cached value for `key`, or None, updating the counters."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: V) -> None:
+        """Stores `value` under `key`, evicting the least recently used entries if full."""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], V]) -> V:
+        """
+        Returns the cached value for `key`, computing and storing it on a miss.
+        The computation runs outside the lock, so two racing misses may both
+        compute; the result is identical, so the last write simply wins.
+        """
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def discard(self, key: Hashable) -> None:
+        """Removes a single entry if present."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Removes all entries. The cumulative counters are preserved."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns a snapshot of the cache counters, suitable for logging or scraping."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+class _InFlightCall(Generic[V]):
+    __slots__ = ("done", "result", "error", "abandoned", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[V] = None
+        self.error: Optional[Exception] = None
+        self.abandoned = False
+        self.waiters = 0
+
+class SingleFlight(Generic[V]):
+    """
+    Collapses concurrent calls with the same key into one execution. The
+    first caller for a key runs the function; callers arriving while it is
+    still running wait for it and receive the same result, or the same
+    exception. If the first caller is interrupted instead (a BaseException
+    that is not an Exception, e.g. Streamlit stopping its script run), the
+    waiting callers each run their own function rather than being
+    interrupted too. Nothing is kept once the call finishes, so this
+    deduplicates in-flight work only; it is not a cache.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _InFlightCall[V]] = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+        self.max_waiters = 0
+
+    def do(self, key: Hashable, fn: Callable[[], V]) -> Tuple[V, bool]:
+        """Returns (result, shared), where `shared` is True if another caller's execution was joined."""
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = _InFlightCall()
+                self.executions += 1
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+                self.max_waiters = max(self.max_waiters, call.waiters)
+
+        if is_leader:
+            try:
+                call.result = fn()
+            except Exception as e:
+                call.error = e
+                raise
+            except BaseException:
+                # Belongs to the leader's own thread or session, not to the followers.
+                call.abandoned = True
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+            return call.result, False
+
+        call.done.wait()
+        if call.abandoned:
+            return fn(), False
+        if call.error is not None:
+            raise call.error
+        return call.result, True
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns a snapshot of the coalescing counters, suitable for logging or scraping."""
+        with self._lock:
+            requests = self.executions + self.coalesced
+            return {
+                "name": self.name,
+                "in_flight": len(self._calls),
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "max_waiters": self.max_waiters,
+                "coalesced_rate": round(self.coalesced / requests, 4) if requests else 0.0,
+            }
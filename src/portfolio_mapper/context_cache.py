@@ -0,0 +1,265 @@
+# src/portfolio_mapper/context_cache.py
+
+# Copyright (c) Adrian Robinson 2025
+# This software is dual-licensed under the MIT License (for NHS use only)
+# and a Commercial License (for other use).
+# For commercial licensing inquiries, please contact adrian.j.robinson@gmail.com
+
+"""
+This module manages context-cache handles for the static prefix of the
+analysis prompt (instructions, academic scale, output schema and frameworks).
+
+The prefix only depends on the role, the academic level and the selected
+frameworks, so one handle is kept per (role, level, framework set). Only the
+changing suffix, i.e. the reflection, is then sent with each request. Handles
+are renewed shortly before their TTL runs out and recreated if the prefix
+changes. Two backends are provided: Gemini's CachedContent API, and a local
+stand-in that simply re-joins prefix and suffix, for development and testing.
+"""
+import datetime
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from .caching import content_hash
+from .token_budget import estimate_tokens
+
+# Requests for keys that share a lock wait for each other, which is harmless
+# at this size; a fixed pool keeps the locks bounded however many keys are seen.
+KEY_LOCK_POOL_SIZE = 64
+
+class PromptContext(NamedTuple):
+    """The cacheable part of a prompt and the key its handle is managed under."""
+    key: Tuple[Any, ...]
+    static_prefix: str
+
+@dataclass
+class ContextHandle:
+    name: str
+    prefix_hash: str
+    expires_at: float
+
+class ContextCacheBackend(ABC):
+    """Creates, renews and deletes cached prefixes, and builds clients that use them."""
+
+    @abstractmethod
+    def create(self, model_name: str, static_prefix: str, ttl_seconds: float) -> str:
+        """Caches `static_prefix` for `model_name` and returns the handle name."""
+
+    @abstractmethod
+    def renew(self, name: str, ttl_seconds: float) -> None:
+        """Extends the handle's lifetime to `ttl_seconds` from now."""
+
+    @abstractmethod
+    def delete(self, name: str) -> None:
+        """Releases the handle. Must not raise if it has already expired."""
+
+    @abstractmethod
+    def client_for(self, name: str, base_client: Any) -> Any:
+        """Returns a client whose generate_content() prepends the cached prefix."""
+
+class GeminiContextCacheBackend(ContextCacheBackend):
+    """Backed by google.generativeai's CachedContent API."""
+
+    def __init__(self, safety_settings: List[Dict[str, Any]]):
+        self.safety_settings = safety_settings
+        self._cached_contents: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def create(self, model_name: str, static_prefix: str, ttl_seconds: float) -> str:
+        from google.generativeai import caching
+        cached_content = caching.CachedContent.create(
+            model=model_name,
+            display_name="portfolio-mapper-prefix",
+            contents=[static_prefix],
+            ttl=datetime.timedelta(seconds=ttl_seconds),
+        )
+        with self._lock:
+            self._cached_contents[cached_content.name] = cached_content
+        return cached_content.name
+
+    def renew(self, name: str, ttl_seconds: float) -> None:
+        with self._lock:
+            cached_content = self._cached_contents[name]
+        cached_content.update(ttl=datetime.timedelta(seconds=ttl_seconds))
+
+    def delete(self, name: str) -> None:
+        with self._lock:
+            cached_content = self._cached_contents.pop(name, None)
+        if cached_content is None:
+            return
+        try:
+            cached_content.delete()
+        except Exception as e:
+            print(f"Context Cache Error: failed to delete '{name}'. Reason: {e}", flush=True)
+
+    def client_for(self, name: str, base_client: Any) -> Any:
+        import google.generativeai as genai
+        with self._lock:
+            cached_content = self._cached_contents[name]
+        return genai.GenerativeModel.from_cached_content(cached_content, safety_settings=self.safety_settings)
+
+class _PrefixedClient:
+    """Wraps a client so that each request is sent as prefix + contents."""
+
+    def __init__(self, base_client: Any, static_prefix: str):
+        self.base_client = base_client
+        self.static_prefix = static_prefix
+
+    def generate_content(self, contents: str, **kwargs):
+        return self.base_client.generate_content(self.static_prefix + contents, **kwargs)
+
+class LocalContextCacheBackend(ContextCacheBackend):
+    """
+    An in-memory stand-in with the same lifecycle as the Gemini backend. The
+    model sees exactly the same prompt, so it can be used without API-side
+    caching, and its counters make the handle lifecycle observable in tests.
+    """
+
+    def __init__(self):
+        self._prefixes: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self.created = 0
+        self.renewed = 0
+        self.deleted = 0
+
+    def create(self, model_name: str, static_prefix: str, ttl_seconds: float) -> str:
+        with self._lock:
+            self._next_id += 1
+            name = f"local/{model_name}/{self._next_id}"
+            self._prefixes[name] = static_prefix
+            self.created += 1
+        return name
+
+    def renew(self, name: str, ttl_seconds: float) -> None:
+        with self._lock:
+            if name not in self._prefixes:
+                raise KeyError(name)
+            self.renewed += 1
+
+    def delete(self, name: str) -> None:
+        with self._lock:
+            if self._prefixes.pop(name, None) is not None:
+                self.deleted += 1
+
+    def client_for(self, name: str, base_client: Any) -> Any:
+        with self._lock:
+            static_prefix = self._prefixes[name]
+        return _PrefixedClient(base_client, static_prefix)
+
+class ContextCacheManager:
+    """
+    Keeps at most `max_handles` handles, one per context key, evicting the
+    least recently used. A handle is renewed when it is used within
+    `renew_before_seconds` of expiring, and recreated if it has expired or
+    the prefix for its key has changed (e.g. an edited framework). Prefixes
+    estimated below `min_prefix_tokens` are not cached at all.
+    """
+
+    def __init__(
+        self,
+        backend: ContextCacheBackend,
+        model_name: str,
+        ttl_seconds: float,
+        renew_before_seconds: float,
+        max_handles: int,
+        min_prefix_tokens: int = 0,
+    ):
+        self.backend = backend
+        self.model_name = model_name
+        self.ttl_seconds = ttl_seconds
+        self.renew_before_seconds = renew_before_seconds
+        self.max_handles = max_handles
+        self.min_prefix_tokens = min_prefix_tokens
+        self._handles: "OrderedDict[Tuple[Any, ...], ContextHandle]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Creating a handle is a network call, so only requests for the same key (or one
+        # sharing its lock) wait for each other.
+        self._key_locks = [threading.Lock() for _ in range(KEY_LOCK_POOL_SIZE)]
+        self.hits = 0
+        self.misses = 0
+        self.renewals = 0
+        self.evictions = 0
+
+    def _key_lock(self, key: Tuple[Any, ...]) -> threading.Lock:
+        return self._key_locks[hash(key) % len(self._key_locks)]
+
+    def get_handle(self, context: PromptContext) -> Optional[str]:
+        """
+        Returns the name of a live handle for this context, creating or renewing
+        it as needed, or None if the prefix is too small to be worth caching.
+        """
+        prefix_hash = content_hash(context.static_prefix.encode('utf-8'))
+        with self._key_lock(context.key):
+            now = time.time()
+            with self._lock:
+                handle = self._handles.get(context.key)
+                if handle is not None:
+                    self._handles.move_to_end(context.key)
+
+            if handle is not None and handle.prefix_hash == prefix_hash and handle.expires_at > now:
+                if handle.expires_at - now < self.renew_before_seconds:
+                    self.backend.renew(handle.name, self.ttl_seconds)
+                    handle.expires_at = now + self.ttl_seconds
+                    with self._lock:
+                        self.renewals += 1
+                with self._lock:
+                    self.hits += 1
+                return handle.name
+
+            if handle is not None:
+                self.invalidate(context.key)
+            if self.min_prefix_tokens and estimate_tokens(context.static_prefix) < self.min_prefix_tokens:
+                return None
+            name = self.backend.create(self.model_name, context.static_prefix, self.ttl_seconds)
+            evicted = []
+            with self._lock:
+                self.misses += 1
+                self._handles[context.key] = ContextHandle(name, prefix_hash, now + self.ttl_seconds)
+                while len(self._handles) > self.max_handles:
+                    evicted.append(self._handles.popitem(last=False)[1])
+                    self.evictions += 1
+            for old_handle in evicted:
+                self.backend.delete(old_handle.name)
+            return name
+
+    def client_for(self, context: PromptContext, base_client: Any) -> Optional[Any]:
+        """
+        Returns a client that only needs the part of the prompt after the
+        static prefix, or None if this prefix is not cached.
+        """
+        name = self.get_handle(context)
+        return self.backend.client_for(name, base_client) if name is not None else None
+
+    def invalidate(self, key: Tuple[Any, ...]) -> None:
+        """Drops the handle for `key`, e.g. after the backend reports it as gone."""
+        with self._lock:
+            handle = self._handles.pop(key, None)
+        if handle is not None:
+            self.backend.delete(handle.name)
+
+    def clear(self) -> None:
+        with self._lock:
+            handles = list(self._handles.values())
+            self._handles.clear()
+        for handle in handles:
+            self.backend.delete(handle.name)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns a snapshot of the handle counters, suitable for logging or scraping."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": "context_cache",
+                "handles": len(self._handles),
+                "max_handles": self.max_handles,
+                "hits": self.hits,
+                "misses": self.misses,
+                "renewals": self.renewals,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -9,7 +9,9 @@
 
 import streamlit as st
 import pandas as pd
-import json
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+from sqlalchemy import text
 
 st.set_page_config(
     page_title="Admin Dashboard",
@@ -37,63 +39,273 @@ def check_password():
         st.error("Incorrect password.")
         st.stop()
 
-@st.cache_data(ttl=600) # Cache data for 10 minutes
-def load_analytics_data():
-    """Connects to Supabase and fetches all event data."""
+ROLLUP_NAME = "event_daily_counts"
+ROLLUP_TIMEZONE = "Europe/London"
+
+# Daily event counts, broken down by one dimension at a time: 'total' (value
+# ''), 'role', 'framework' and 'pii_flag'. An event with several frameworks or
+# flags counts once per framework or flag, so totals always use 'total'.
+ROLLUP_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS event_daily_counts (
+        day DATE NOT NULL,
+        event_name TEXT NOT NULL,
+        dimension TEXT NOT NULL,
+        value TEXT NOT NULL,
+        event_count BIGINT NOT NULL,
+        PRIMARY KEY (day, event_name, dimension, value)
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS rollup_state (
+        name TEXT PRIMARY KEY,
+        last_event_id BIGINT NOT NULL,
+        pending_event_id BIGINT,
+        pending_at TIMESTAMPTZ
+    );
+    """,
+]
+
+# Event ids are taken when a row is inserted, not when its transaction commits,
+# so a batch from another process can commit with ids below ones already
+# visible. A refresh therefore only rolls up to the largest id seen by an
+# earlier refresh at least this long ago (by the database clock); any insert
+# that had taken an id by then has committed since.
+ROLLUP_SAFETY_LAG_SECONDS = 60
+
+# Aggregates only the events between two high-water marks and adds them to the
+# existing counts. Everything happens in the database; no raw events are fetched.
+# `properties` is cast to jsonb, so a json or text column holding JSON works too.
+ROLLUP_DELTA_SQL = """
+    INSERT INTO event_daily_counts (day, event_name, dimension, value, event_count)
+    SELECT (e.created_at AT TIME ZONE :timezone)::date, e.event_name, d.dimension, d.value, COUNT(*)
+    FROM (
+        SELECT created_at, event_name, properties::jsonb AS properties
+        FROM events
+        WHERE id > :last_event_id AND id <= :new_last_event_id
+    ) e
+    CROSS JOIN LATERAL (
+        SELECT 'total' AS dimension, '' AS value
+        UNION ALL
+        SELECT 'role', e.properties->>'role' WHERE e.properties->>'role' IS NOT NULL
+        UNION ALL
+        SELECT 'framework', f.value FROM jsonb_array_elements_text(
+            CASE WHEN jsonb_typeof(e.properties->'frameworks') = 'array' THEN e.properties->'frameworks' ELSE '[]'::jsonb END
+        ) AS f(value)
+        UNION ALL
+        SELECT 'pii_flag', f.value FROM jsonb_array_elements_text(
+            CASE WHEN jsonb_typeof(e.properties->'flags') = 'array' THEN e.properties->'flags' ELSE '[]'::jsonb END
+        ) AS f(value)
+    ) d
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (day, event_name, dimension, value)
+    DO UPDATE SET event_count = event_daily_counts.event_count + EXCLUDED.event_count;
+"""
+
+def refresh_rollups(session) -> int:
+    """
+    Adds the events up to the pending high-water mark, once that mark is
+    ROLLUP_SAFETY_LAG_SECONDS old, to the rollup table and records the current
+    largest id as the next pending mark, in one transaction. The first refresh
+    has no earlier mark, so it adds every event recorded more than
+    ROLLUP_SAFETY_LAG_SECONDS ago straight away. The state row is
+    locked, so concurrent refreshes run one after the other and never count an
+    event twice. Returns the number of events added.
+    """
+    for statement in ROLLUP_SCHEMA:
+        session.execute(text(statement))
+    session.execute(
+        text("INSERT INTO rollup_state (name, last_event_id) VALUES (:name, 0) ON CONFLICT (name) DO NOTHING;"),
+        params=dict(name=ROLLUP_NAME)
+    )
+    session.commit()
+
+    last_event_id, pending_event_id, pending_ready = session.execute(
+        text(
+            "SELECT last_event_id, pending_event_id, pending_at <= now() - make_interval(secs => :lag) "
+            "FROM rollup_state WHERE name = :name FOR UPDATE;"
+        ),
+        params=dict(name=ROLLUP_NAME, lag=ROLLUP_SAFETY_LAG_SECONDS)
+    ).one()
+
+    if last_event_id == 0 and pending_event_id is None:
+        # Nothing rolled up yet: backfill the existing events now rather than a
+        # lag later. With no earlier mark, their timestamps stand in for one.
+        pending_event_id = session.execute(
+            text("SELECT MAX(id) FROM events WHERE created_at <= now() - make_interval(secs => :lag);"),
+            params=dict(lag=ROLLUP_SAFETY_LAG_SECONDS)
+        ).scalar_one()
+        pending_ready = True
+
+    new_events = 0
+    if pending_event_id is not None and pending_ready:
+        new_events = session.execute(
+            text("SELECT COUNT(*) FROM events WHERE id > :last_event_id AND id <= :new_last_event_id;"),
+            params=dict(last_event_id=last_event_id, new_last_event_id=pending_event_id)
+        ).scalar_one()
+        if new_events:
+            session.execute(
+                text(ROLLUP_DELTA_SQL),
+                params=dict(timezone=ROLLUP_TIMEZONE, last_event_id=last_event_id, new_last_event_id=pending_event_id)
+            )
+        last_event_id, pending_event_id = pending_event_id, None
+
+    # A mark still waiting out its lag is kept, so that frequent refreshes cannot keep postponing it.
+    if pending_event_id is None:
+        session.execute(
+            text(
+                "UPDATE rollup_state SET last_event_id = :last_event_id, "
+                "pending_event_id = (SELECT MAX(id) FROM events WHERE id > :last_event_id), "
+                "pending_at = now() WHERE name = :name;"
+            ),
+            params=dict(name=ROLLUP_NAME, last_event_id=last_event_id)
+        )
+    session.commit()
+    return new_events
+
+@st.cache_data(ttl=60) # Cheap to refresh now that only new events are aggregated
+def refresh_analytics():
+    """Brings the rollup table up to date. Returns False if the database could not be reached."""
     try:
         conn = st.connection("db", type="sql")
-        df = conn.query("SELECT * FROM events ORDER BY created_at DESC;", ttl=600)
-
-        # --- Process the DataFrame ---
-        # 1. Parse the JSON 'properties' column
-        def safe_json_loads(s):
-            try:
-                return json.loads(s) if isinstance(s, str) else s
-            except (json.JSONDecodeError, TypeError):
-                return {}
-
-        df['properties'] = df['properties'].apply(safe_json_loads)
-        
-        # 2. Expand the JSON properties into their own columns
-        properties_df = pd.json_normalize(df['properties'])
-        
-        # 3. Combine the original DataFrame with the new properties columns
-        df = pd.concat([df.drop(columns=['properties']), properties_df], axis=1)
-
-        # 4. Convert timestamp to a more readable timezone
-        df['created_at'] = pd.to_datetime(df['created_at']).dt.tz_convert('Europe/London')
-
-        return df
+        with conn.session as s:
+            new_events = refresh_rollups(s)
+        print(f"--- Dashboard: rolled up {new_events} new events ---", flush=True)
+        return True
     except Exception as e:
         st.error(f"Failed to load analytics data: {e}")
-        return pd.DataFrame()
+        return False
+
+# All metrics are aggregated in the database from the daily rollups, so only
+# the few rows each chart needs are transferred, whatever the table sizes.
+def query_first_day():
+    """Returns the first day with any recorded events, or None."""
+    conn = st.connection("db", type="sql")
+    return conn.query("SELECT MIN(day) AS first_day FROM event_daily_counts;", ttl=60)['first_day'].iloc[0]
+
+def query_event_totals(start, end):
+    """Returns the number of each event between `start` and `end` (inclusive)."""
+    conn = st.connection("db", type="sql")
+    df = conn.query(
+        """
+        SELECT event_name, SUM(event_count) AS event_count
+        FROM event_daily_counts
+        WHERE dimension = 'total' AND day BETWEEN :start AND :end
+        GROUP BY event_name;
+        """,
+        params=dict(start=start, end=end), ttl=60
+    )
+    return dict(zip(df['event_name'], df['event_count'].astype(int)))
+
+def query_daily_counts(event_name, start, end):
+    """Returns the number of `event_name` events per day, with zeroes for days without any."""
+    conn = st.connection("db", type="sql")
+    df = conn.query(
+        """
+        SELECT day, SUM(event_count) AS event_count
+        FROM event_daily_counts
+        WHERE event_name = :event_name AND dimension = 'total' AND day BETWEEN :start AND :end
+        GROUP BY day
+        ORDER BY day;
+        """,
+        params=dict(event_name=event_name, start=start, end=end), ttl=60
+    )
+    days = pd.date_range(start, end, freq='D')
+    return df.set_index(pd.to_datetime(df['day']))['event_count'].reindex(days, fill_value=0)
+
+def query_top_values(event_name, dimension, start, end, limit=20):
+    """Returns the most frequent values of `dimension` for `event_name`, most frequent first."""
+    conn = st.connection("db", type="sql")
+    df = conn.query(
+        """
+        SELECT value, SUM(event_count) AS event_count
+        FROM event_daily_counts
+        WHERE event_name = :event_name AND dimension = :dimension AND day BETWEEN :start AND :end
+        GROUP BY value
+        ORDER BY event_count DESC, value
+        LIMIT :limit;
+        """,
+        params=dict(event_name=event_name, dimension=dimension, start=start, end=end, limit=limit), ttl=60
+    )
+    return df.set_index('value')['event_count']
 
-def display_dashboard(df):
-    """Renders the dashboard using the provided DataFrame."""
+RAW_EVENTS_PAGE_SIZE = 100
+NO_CURSOR = 2**63 - 1  # Larger than any event id; the first page starts here.
+
+def query_events_page(start, end, before_id):
+    """
+    Returns up to RAW_EVENTS_PAGE_SIZE events with an id below `before_id`,
+    newest first. Keyset pagination keeps every page equally cheap, unlike
+    OFFSET, which scans all the rows it skips.
+    """
+    conn = st.connection("db", type="sql")
+    tz = ZoneInfo(ROLLUP_TIMEZONE)
+    return conn.query(
+        """
+        SELECT id, created_at, event_name, properties
+        FROM events
+        WHERE id < :before_id AND created_at >= :start AND created_at < :end
+        ORDER BY id DESC
+        LIMIT :limit;
+        """,
+        params=dict(
+            before_id=before_id,
+            start=datetime.combine(start, time.min, tzinfo=tz),
+            end=datetime.combine(end + timedelta(days=1), time.min, tzinfo=tz),
+            limit=RAW_EVENTS_PAGE_SIZE,
+        ),
+        ttl=60
+    )
+
+def display_raw_events(start, end):
+    """Renders one page of raw events with buttons to move to newer or older events."""
+    # A stack of the cursors for the pages before this one; reset when the dates change.
+    if st.session_state.get("raw_events_range") != (start, end):
+        st.session_state.raw_events_range = (start, end)
+        st.session_state.raw_events_cursors = []
+    cursors = st.session_state.raw_events_cursors
+
+    page = query_events_page(start, end, cursors[-1] if cursors else NO_CURSOR)
+    st.dataframe(page, use_container_width=True)
+
+    col1, col2, col3 = st.columns([1, 2, 1])
+    if col1.button("← Newer", disabled=not cursors, use_container_width=True):
+        cursors.pop()
+        st.rerun()
+    col2.caption(f"Page {len(cursors) + 1}, up to {RAW_EVENTS_PAGE_SIZE} events per page.")
+    if col3.button("Older →", disabled=len(page) < RAW_EVENTS_PAGE_SIZE, use_container_width=True):
+        cursors.append(int(page['id'].iloc[-1]))
+        st.rerun()
+
+def display_dashboard():
+    """Renders the dashboard from SQL aggregates over the daily rollups."""
     st.title("📊 Admin Dashboard")
     st.markdown("Live analytics and usage metrics for the Portfolio Mapper.")
 
-    if df.empty:
+    first_day = query_first_day()
+    if first_day is None or pd.isna(first_day):
         st.warning("No analytics data found.")
         return
 
+    today = datetime.now(ZoneInfo(ROLLUP_TIMEZONE)).date()
+    date_range = st.date_input("Date range", value=(first_day, today), min_value=first_day, max_value=today)
+    if len(date_range) != 2:
+        st.info("Select an end date.")
+        return
+    start, end = date_range
+
+    totals = query_event_totals(start, end)
+
     # --- Key Metrics ---
     st.header("Key Metrics")
-    analyses_started = df[df['event_name'] == 'analysis_started'].shape[0]
-    analyses_completed = df[df['event_name'] == 'analysis_completed'].shape[0]
-    reports_downloaded = df[df['event_name'] == 'report_downloaded'].shape[0]
-
     col1, col2, col3 = st.columns(3)
-    col1.metric("Analyses Started", f"{analyses_started:,}")
-    col2.metric("Analyses Completed", f"{analyses_completed:,}")
-    col3.metric("Reports Downloaded", f"{reports_downloaded:,}")
+    col1.metric("Analyses Started", f"{totals.get('analysis_started', 0):,}")
+    col2.metric("Analyses Completed", f"{totals.get('analysis_completed', 0):,}")
+    col3.metric("Reports Downloaded", f"{totals.get('report_downloaded', 0):,}")
 
     # --- Usage Over Time ---
     st.header("Usage Over Time")
-    usage_df = df[df['event_name'] == 'analysis_started'].copy()
-    usage_df.set_index('created_at', inplace=True)
-    daily_usage = usage_df.resample('D').size().rename("Analyses per Day")
-    st.line_chart(daily_usage)
+    st.line_chart(query_daily_counts('analysis_started', start, end).rename("Analyses per Day"))
 
     # --- Popularity Metrics ---
     st.header("Most Popular Selections")
@@ -101,34 +313,30 @@ def display_dashboard(df):
 
     with col1:
         st.subheader("Top Roles")
-        role_counts = df[df['event_name'] == 'analysis_started']['role'].value_counts()
-        st.bar_chart(role_counts)
+        st.bar_chart(query_top_values('analysis_started', 'role', start, end))
 
     with col2:
         st.subheader("Top Frameworks")
-        framework_df = df[df['event_name'] == 'analysis_started'][['frameworks']].copy()
-        framework_df = framework_df.dropna().explode('frameworks')
-        framework_counts = framework_df['frameworks'].value_counts()
-        st.bar_chart(framework_counts)
+        st.bar_chart(query_top_values('analysis_started', 'framework', start, end))
 
     # --- Safety Metrics ---
     st.header("Safety & PII Flags")
-    distress_detected = df[df['event_name'] == 'safety_check_distress_detected'].shape[0]
-    pii_detected = df[df['event_name'] == 'safety_check_pii_detected'].shape[0]
-    pii_acknowledged = df[df['event_name'] == 'pii_warning_acknowledged'].shape[0]
-
     col1, col2, col3 = st.columns(3)
-    col1.metric("User Distress Flags", f"{distress_detected:,}")
-    col2.metric("PII Warnings Shown", f"{pii_detected:,}")
-    col3.metric("PII Warnings Acknowledged", f"{pii_acknowledged:,}")
+    col1.metric("User Distress Flags", f"{totals.get('safety_check_distress_detected', 0):,}")
+    col2.metric("PII Warnings Shown", f"{totals.get('safety_check_pii_detected', 0):,}")
+    col3.metric("PII Warnings Acknowledged", f"{totals.get('pii_warning_acknowledged', 0):,}")
+
+    pii_flag_counts = query_top_values('safety_check_pii_detected', 'pii_flag', start, end)
+    if not pii_flag_counts.empty:
+        st.subheader("PII Warnings by Type")
+        st.bar_chart(pii_flag_counts)
 
     # --- Raw Data View ---
     with st.expander("View Raw Event Data"):
-        st.dataframe(df)
+        display_raw_events(start, end)
 
 
 if __name__ == "__main__":
     if check_password():
-        analytics_df = load_analytics_data()
-        display_dashboard(analytics_df)
-
+        if refresh_analytics():
+            display_dashboard()
@@ -13,12 +13,26 @@ configuration and framework data from the filesystem.
 # --- Python Imports ---
 
 import os
+import time
 import yaml
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pydantic import ValidationError, BaseModel
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+
+# Prefer the libyaml C parser when PyYAML was built with it; it is several
+# times faster than the pure-Python SafeLoader and accepts the same documents.
+try:
+    from yaml import CSafeLoader as YamlSafeLoader
+except ImportError:
+    from yaml import SafeLoader as YamlSafeLoader
 
 # --- Local Imports ---
 
+from .caching import content_hash
+from .framework_index import build_framework_index
+from .retrieval import build_retrieval_index
+from .similarity import build_similarity_matrix
+
 # Import our framework models using relative paths
 from .models.framework import FrameworkFile, FrameworkNode
 
@@ -34,14 +48,49 @@ from .models.config import (
     AcademicLevelKey,
 )
 
+def _load_framework_file(file_path: str, framework_code: str) -> Tuple[Optional[FrameworkFile], Optional[str], Dict[str, float]]:
+    """
+    Reads, parses and validates a single framework file. Runs on a worker, so
+    it never raises or prints; it returns (model, error_message, timings_ms)
+    and the caller reports the outcome in a deterministic order.
+    """
+    timings = {}
+    try:
+        start = time.perf_counter()
+        with open(file_path, 'rb') as f:
+            raw_bytes = f.read()
+        timings['read'] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        data = yaml.load(raw_bytes.decode('utf-8'), Loader=YamlSafeLoader)
+        timings['parse'] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        metadata = data.setdefault('metadata', {})
+        metadata['framework_code'] = framework_code
+        metadata['content_hash'] = content_hash(raw_bytes)
+        framework_model = FrameworkFile.model_validate(data)
+        timings['validate'] = (time.perf_counter() - start) * 1000
+        return framework_model, None, timings
+
+    except ValidationError as e:
+        return None, f"  ❌ [VALIDATION ERROR] in {file_path}:\n{e}\n", timings
+    except Exception as e:
+        return None, f"  ❌ [LOADING ERROR] in {file_path}: {e}\n", timings
+
 class FrameworkLoader:
     """
     Handles the discovery, loading, validation, and processing of all
     framework YAML files.
     """
-    def __init__(self, frameworks_dir: str):
+    def __init__(self, frameworks_dir: str, max_workers: Optional[int] = None, use_processes: bool = False):
         self.frameworks_dir = frameworks_dir
+        # Files are parsed and validated on a pool; max_workers=1 loads them serially.
+        self.max_workers = max_workers
+        self.use_processes = use_processes
         self.library: Dict[str, FrameworkFile] = {}
+        # Per-file timing breakdown in milliseconds: {framework_code: {'read': ..., 'parse': ..., 'validate': ...}}
+        self.file_timings: Dict[str, Dict[str, float]] = {}
         print("Initializing FrameworkLoader...")
 
     def load_all(self):
@@ -52,34 +101,49 @@ class FrameworkLoader:
         print(f"--- Starting framework discovery in '{self.frameworks_dir}' ---")
         self._discover_and_load_files()
         self._process_fully_qualified_ids()
+        self._build_indexes()
         self._check_dependencies()
         print(f"--- Framework loading complete. {len(self.library)} frameworks loaded. ---")
         return self.library
 
-    def _discover_and_load_files(self):
-        """
-        Scans the directory, validates YAML files against the Pydantic model,
-        and populates the initial library.
-        """
+    def _discover_files(self) -> List[str]:
+        """Returns all framework YAML paths, sorted so the load order is deterministic."""
+        file_paths = []
         for root, _, files in os.walk(self.frameworks_dir):
             for file in files:
                 if file.endswith(('.yaml', '.yml')):
-                    file_path = os.path.join(root, file)
-                    framework_code = self._generate_framework_code(file_path)
-
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            data = yaml.safe_load(f)
-                        
-                        data.setdefault('metadata', {})['framework_code'] = framework_code
-                        framework_model = FrameworkFile.model_validate(data)
-                        self.library[framework_code] = framework_model
-                        print(f"  ✅ [LOADED & VALIDATED] {framework_code}")
-
-                    except ValidationError as e:
-                        print(f"  ❌ [VALIDATION ERROR] in {file_path}:\n{e}\n")
-                    except Exception as e:
-                        print(f"  ❌ [LOADING ERROR] in {file_path}: {e}\n")
+                    file_paths.append(os.path.join(root, file))
+        return sorted(file_paths)
+
+    def _discover_and_load_files(self):
+        """
+        Scans the directory, validates YAML files against the Pydantic model
+        on a worker pool, and populates the initial library. Results are merged
+        and reported in sorted file order regardless of completion order.
+        """
+        file_paths = self._discover_files()
+        framework_codes = [self._generate_framework_code(path) for path in file_paths]
+
+        start = time.perf_counter()
+        if self.max_workers == 1 or len(file_paths) <= 1:
+            outcomes = list(map(_load_framework_file, file_paths, framework_codes))
+        else:
+            executor_class = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+            with executor_class(max_workers=self.max_workers) as executor:
+                outcomes = list(executor.map(_load_framework_file, file_paths, framework_codes))
+        wall_ms = (time.perf_counter() - start) * 1000
+
+        for framework_code, (framework_model, error_message, timings) in zip(framework_codes, outcomes):
+            if error_message:
+                print(error_message)
+                continue
+            self.library[framework_code] = framework_model
+            self.file_timings[framework_code] = timings
+            print(
+                f"  ✅ [LOADED & VALIDATED] {framework_code} "
+                f"(read {timings['read']:.1f} ms, parse {timings['parse']:.1f} ms, validate {timings['validate']:.1f} ms)"
+            )
+        print(f"  ⏱️ [TIMING] {len(file_paths)} files ingested in {wall_ms:.1f} ms using {YamlSafeLoader.__name__}")
 
     def _generate_framework_code(self, file_path: str) -> str:
         """Generates a unique code from a file path."""
@@ -108,6 +172,23 @@ class FrameworkLoader:
             if node.children:
                 self._recursive_id_processor(node.children, current_path)
     
+    def _build_indexes(self):
+        """
+        Attaches a flat node index to each framework for O(1) lookups and linear
+        scans, a BM25 index over its matchable units for shortlisting, and a
+        TF-IDF matrix over its nodes for similarity scores.
+        """
+        print("\n--- Building flat node indexes ---")
+        for code, framework in self.library.items():
+            framework._index = build_framework_index(framework)
+            framework._retrieval_index = build_retrieval_index(framework)
+            framework._similarity_matrix = build_similarity_matrix(framework)
+            print(
+                f"  ✅ [INDEXED] {len(framework._index)} nodes for {code} "
+                f"({len(framework._retrieval_index)} units, {len(framework._retrieval_index.postings)} terms, "
+                f"{len(framework._similarity_matrix.weights)} TF-IDF entries)"
+            )
+
     def _check_dependencies(self):
         """
         Checks that all declared dependencies for each framework exist in the library.
@@ -145,7 +226,7 @@ class ConfigLoader:
         try:
             llm_config_path = os.path.join(self.config_dir, 'llm_config.yaml')
             with open(llm_config_path, 'r', encoding='utf-8') as f:
-                data = yaml.safe_load(f)
+                data = yaml.load(f, Loader=YamlSafeLoader)
             self.llm_config = LlmConfig.model_validate(data)
             print(f"  ✅ [LOADED & VALIDATED] llm_config.yaml")
         except FileNotFoundError:
@@ -163,7 +244,7 @@ class ConfigLoader:
         file_path = os.path.join(self.config_dir, filename)
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
-                data = yaml.safe_load(f)
+                data = yaml.load(f, Loader=YamlSafeLoader)
             validated_data = model.model_validate(data)
             setattr(self, target_attr, getattr(validated_data, target_attr))
             print(f"  ✅ [LOADED & VALIDATED] {filename}")
@@ -0,0 +1,155 @@
+# src/portfolio_mapper/framework_index.py
+
+# Copyright (c) Adrian Robinson 2025
+# This software is dual-licensed under the MIT License (for NHS use only)
+# and a Commercial License (for other use).
+# For commercial licensing inquiries, please contact adrian.j.robinson@gmail.com
+
+"""
+This module builds a compact, flat index over a framework's nested node tree.
+
+Nodes are stored in pre-order as parallel arrays, so that a node's descendants
+occupy the contiguous range [i + 1, subtree_end[i]). This gives O(1) lookups
+by id or display_id and recursion-free linear scans for consumers such as
+pruning, leaf collection and mapping LLM competency ids back to nodes.
+"""
+from array import array
+from typing import Dict, Iterator, List, Optional
+
+from .models.framework import FrameworkFile, FrameworkNode
+
+class FrameworkIndex:
+    """
+    A flat, array-backed view of one framework. Build it with
+    `build_framework_index`, or use `get_framework_index` to reuse the index
+    attached to a framework at load time.
+    """
+    __slots__ = (
+        "framework_code", "nodes", "ids", "display_ids", "parents", "depths",
+        "is_leaf", "subtree_ends", "text_blob", "text_offsets",
+        "_by_id", "_by_display_id",
+    )
+
+    def __init__(self, framework_code: Optional[str]):
+        self.framework_code = framework_code
+        self.nodes: List[FrameworkNode] = []
+        self.ids: List[str] = []
+        self.display_ids: List[str] = []
+        self.parents = array('i')       # -1 for root nodes
+        self.depths = array('i')        # 0 for root nodes
+        self.is_leaf = bytearray()      # 1 if the node has no children
+        self.subtree_ends = array('i')  # exclusive end of the node's pre-order range
+        self.text_blob = ""             # all node texts concatenated
+        self.text_offsets = array('i')  # len(nodes) + 1 offsets into text_blob
+        self._by_id: Dict[str, int] = {}
+        self._by_display_id: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def text(self, i: int) -> str:
+        """Returns the text of node `i` without touching the Pydantic model."""
+        return self.text_blob[self.text_offsets[i]:self.text_offsets[i + 1]]
+
+    def index_of_id(self, node_id: str) -> Optional[int]:
+        """Returns the position of the node with this fully qualified id."""
+        return self._by_id.get(node_id)
+
+    def index_of_display_id(self, display_id: str) -> Optional[int]:
+        """
+        Returns the position of the node with this display_id. Where display
+        ids repeat within a framework, matchable leaf nodes take precedence.
+        """
+        return self._by_display_id.get(display_id)
+
+    def node_by_id(self, node_id: str) -> Optional[FrameworkNode]:
+        i = self._by_id.get(node_id)
+        return self.nodes[i] if i is not None else None
+
+    def node_by_display_id(self, display_id: str) -> Optional[FrameworkNode]:
+        i = self._by_display_id.get(display_id)
+        return self.nodes[i] if i is not None else None
+
+    def descendant_indices(self, i: int) -> range:
+        """All descendants of node `i`, in pre-order."""
+        return range(i + 1, self.subtree_ends[i])
+
+    def descendant_leaf_indices(self, i: int) -> List[int]:
+        """The leaf nodes below node `i`, in pre-order."""
+        is_leaf = self.is_leaf
+        return [j for j in range(i + 1, self.subtree_ends[i]) if is_leaf[j]]
+
+    def child_indices(self, i: int) -> Iterator[int]:
+        """The direct children of node `i`, skipping over each child's subtree."""
+        j, end = i + 1, self.subtree_ends[i]
+        while j < end:
+            yield j
+            j = self.subtree_ends[j]
+
+    def ancestor_indices(self, i: int) -> List[int]:
+        """The ancestors of node `i`, nearest first."""
+        ancestors = []
+        parent = self.parents[i]
+        while parent != -1:
+            ancestors.append(parent)
+            parent = self.parents[parent]
+        return ancestors
+
+    def leaf_indices(self) -> List[int]:
+        return [i for i, leaf in enumerate(self.is_leaf) if leaf]
+
+def build_framework_index(framework: FrameworkFile) -> FrameworkIndex:
+    """Flattens the framework's node tree into a FrameworkIndex using an explicit stack."""
+    index = FrameworkIndex(framework.metadata.framework_code)
+    texts: List[str] = []
+    offset = 0
+    # Stack entries are (node, parent_position, depth); reversed so siblings pop in order.
+    stack = [(node, -1, 0) for node in reversed(framework.structure)]
+    # Positions whose subtree is still open, innermost last, with their depth.
+    open_nodes: List[int] = []
+
+    while stack:
+        node, parent, depth = stack.pop()
+        position = len(index.nodes)
+
+        # Close any open subtrees that this node is not part of.
+        while open_nodes and index.depths[open_nodes[-1]] >= depth:
+            index.subtree_ends[open_nodes.pop()] = position
+
+        display_id = node.display_id if node.display_id else node.id
+        is_leaf = not node.children
+
+        index.nodes.append(node)
+        index.ids.append(node.id)
+        index.display_ids.append(display_id)
+        index.parents.append(parent)
+        index.depths.append(depth)
+        index.is_leaf.append(1 if is_leaf else 0)
+        index.subtree_ends.append(position + 1)
+        index.text_offsets.append(offset)
+        texts.append(node.text)
+        offset += len(node.text)
+
+        index._by_id.setdefault(node.id, position)
+        existing = index._by_display_id.get(display_id)
+        if existing is None or (is_leaf and not index.is_leaf[existing]):
+            index._by_display_id[display_id] = position
+
+        if node.children:
+            open_nodes.append(position)
+            stack.extend((child, position, depth + 1) for child in reversed(node.children))
+
+    for position in open_nodes:
+        index.subtree_ends[position] = len(index.nodes)
+    index.text_offsets.append(offset)
+    index.text_blob = "".join(texts)
+    return index
+
+def get_framework_index(framework: FrameworkFile) -> FrameworkIndex:
+    """
+    Returns the index built for this framework at load time, building and
+    attaching one on first use for frameworks constructed in code.
+    """
+    if framework._index is None:
+        framework._index = build_framework_index(framework)
+    return framework._index
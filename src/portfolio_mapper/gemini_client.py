@@ -0,0 +1,315 @@
+# src/portfolio_mapper/gemini_client.py
+
+# Copyright (c) Adrian Robinson 2025
+# This software is dual-licensed under the MIT License (for NHS use only)
+# and a Commercial License (for other use).
+# For commercial licensing inquiries, please contact adrian.j.robinson@gmail.com
+
+"""
+This module contains the Streamlit-free core of the Gemini integration:
+client and cache construction, the safety-check and analysis calls, and
+response validation. Errors are raised rather than displayed, so the same
+calls serve the Streamlit app (see llm_functions.py) and the batch CLI.
+"""
+from typing import Any, Callable, Dict, Optional, TYPE_CHECKING
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from pydantic import ValidationError
+
+from .context_cache import (
+    ContextCacheManager, GeminiContextCacheBackend, LocalContextCacheBackend, PromptContext
+)
+from .models.config import GeminiConfig, LlmConfig, RateLimitConfig, ResponseCacheConfig
+from .models.framework import FrameworkFile
+from .models.llm_response import AssessedCompetency, LLMAnalysisResult
+from .models.safety import SafetyAnalysis
+from .rate_limit import ApiCallGuard, RateLimiter
+from .response_cache import ResponseCache, redact_pii_detections, restore_pii_detections
+from .response_repair import RepairStats, parse_analysis_response, repair_competency
+from .stream_parser import CompetencyStreamParser
+from .token_budget import estimate_tokens
+
+# Use a forward reference for the type hint to avoid a circular import
+if TYPE_CHECKING:
+    from .data_loader import ConfigLoader
+
+class LLMResponseFormatError(Exception):
+    """Raised when the model's response does not validate; keeps the raw text for display."""
+
+    def __init__(self, validation_error: ValidationError, raw_text: Optional[str]):
+        super().__init__(str(validation_error))
+        self.validation_error = validation_error
+        self.raw_text = raw_text
+
+def create_llm_client(api_key: str, gemini_config: GeminiConfig) -> genai.GenerativeModel:
+    """Configures the SDK and builds the Gemini client from our settings."""
+    genai.configure(api_key=api_key)
+    # Convert Pydantic models to dictionaries for the SDK
+    safety_settings_dict = [s.model_dump() for s in gemini_config.safety_settings]
+    return genai.GenerativeModel(
+        model_name=gemini_config.model_name,
+        safety_settings=safety_settings_dict
+    )
+
+def open_response_cache(cache_config: ResponseCacheConfig) -> Optional[ResponseCache]:
+    """Opens the persistent response cache, or returns None if it is disabled or cannot be opened."""
+    if not cache_config.enabled:
+        return None
+    try:
+        return ResponseCache(
+            path=cache_config.path,
+            ttl_seconds=cache_config.ttl_hours * 3600,
+            max_entries=cache_config.max_entries,
+        )
+    except Exception as e:
+        print(f"Response Cache Error: Failed to open '{cache_config.path}'. Reason: {e}", flush=True)
+        return None
+
+def create_context_cache(llm_config: LlmConfig) -> Optional[ContextCacheManager]:
+    """Builds the manager of context-cache handles, or returns None if context caching is disabled."""
+    cache_config = llm_config.context_cache
+    if not cache_config.enabled:
+        return None
+    gemini_config = llm_config.gemini
+    if cache_config.backend == "local":
+        backend = LocalContextCacheBackend()
+    else:
+        backend = GeminiContextCacheBackend(safety_settings=[s.model_dump() for s in gemini_config.safety_settings])
+    return ContextCacheManager(
+        backend=backend,
+        model_name=gemini_config.model_name,
+        ttl_seconds=cache_config.ttl_minutes * 60,
+        renew_before_seconds=cache_config.renew_before_minutes * 60,
+        max_handles=cache_config.max_handles,
+        min_prefix_tokens=cache_config.min_prefix_tokens,
+    )
+
+def create_call_guard(rate_limit_config: RateLimitConfig) -> Optional[ApiCallGuard]:
+    """Builds the shared throttle/retry guard for API calls, or returns None if it is disabled."""
+    if not rate_limit_config.enabled:
+        return None
+    return ApiCallGuard(
+        rate_limiter=RateLimiter(rate_limit_config.requests_per_minute, rate_limit_config.tokens_per_minute),
+        max_attempts=rate_limit_config.max_attempts,
+        initial_backoff_seconds=rate_limit_config.initial_backoff_seconds,
+        max_backoff_seconds=rate_limit_config.max_backoff_seconds,
+        deadline_seconds=rate_limit_config.call_deadline_seconds,
+    )
+
+def _guarded(call_guard: Optional[ApiCallGuard], request: Callable[[Dict[str, Any]], Any], prompt: str, **kwargs) -> Any:
+    """
+    Runs `request(request_kwargs)` through the call guard, if there is one.
+    The guard's remaining time is passed to the SDK as the request timeout.
+    """
+    if not call_guard:
+        return request({})
+    return call_guard.call(
+        lambda timeout: request({"request_options": {"timeout": timeout}}),
+        estimate_tokens(prompt),
+        **kwargs
+    )
+
+def build_generation_config_dict(gemini_config: GeminiConfig) -> Dict[str, Any]:
+    """Prepares the generation config from our loaded settings, with JSON mode always enabled."""
+    gen_config_dict = gemini_config.generation_config.model_dump(exclude_none=True)
+    gen_config_dict["response_mime_type"] = "application/json"
+    return gen_config_dict
+
+def generate_safety_check(
+    client: genai.GenerativeModel,
+    prompt: str,
+    config_loader: "ConfigLoader",
+    response_cache: Optional[ResponseCache] = None,
+    call_guard: Optional[ApiCallGuard] = None,
+) -> SafetyAnalysis:
+    """
+    Runs the safety check, requesting a JSON response, and validates it.
+    Raises LLMResponseFormatError for an invalid response; API errors that
+    survive the call guard's retries propagate.
+    """
+    gen_config_dict = build_generation_config_dict(config_loader.llm_config.gemini)
+
+    if response_cache:
+        cache_key = ResponseCache.make_key(prompt, config_loader.llm_config.gemini.model_name, gen_config_dict, SafetyAnalysis)
+        if cached_result := response_cache.get(cache_key, SafetyAnalysis):
+            print("--- Safety Check served from response cache ---", flush=True)
+            return restore_pii_detections(cached_result, prompt)
+
+    generation_config = genai.types.GenerationConfig(**gen_config_dict)
+
+    print("--- Calling Gemini API for Safety Check (REAL) ---", flush=True)
+    if config_loader.llm_config.app.debug_mode:
+        # --- DEBUGGING: Dump raw JSON response to console ---
+        print("\n--- LLM SAFETY INPUT: PROMPT ---", flush=True)
+        print(prompt, flush=True)
+        print("-------------------------------------\n", flush=True)
+
+    # Pass both the prompt and the generation config to the client
+    response = _guarded(
+        call_guard,
+        lambda request_kwargs: client.generate_content(prompt, generation_config=generation_config, **request_kwargs),
+        prompt
+    )
+
+    if config_loader.llm_config.app.debug_mode:
+        if call_guard:
+            print(f"--- Gemini call guard: {call_guard.stats()} ---", flush=True)
+        # --- DEBUGGING: Dump raw JSON response to console ---
+        print("\n--- LLM SAFETY OUTPUT: RAW JSON RESPONSE ---", flush=True)
+        print(response.text, flush=True)
+        print("-------------------------------------\n", flush=True)
+
+    try:
+        safety_result = SafetyAnalysis.model_validate_json(response.text)
+    except ValidationError as e:
+        raise LLMResponseFormatError(e, response.text) from e
+    if response_cache:
+        # The PII itself is not written to disk, only where to find it in the prompt.
+        response_cache.put(cache_key, redact_pii_detections(safety_result, prompt))
+    return safety_result
+
+def stream_analysis_text(
+    client: Any,
+    prompt: str,
+    generation_config: genai.types.GenerationConfig,
+    on_competency: Callable[[AssessedCompetency], None],
+    frameworks: Optional[Dict[str, FrameworkFile]] = None,
+    **request_kwargs,
+) -> str:
+    """
+    Streams the analysis response, repairing each competency against
+    `frameworks` and handing it to `on_competency` as soon as its JSON object
+    closes. Returns the full text.
+    """
+    parser = CompetencyStreamParser()
+    for chunk in client.generate_content(prompt, generation_config=generation_config, stream=True, **request_kwargs):
+        try:
+            chunk_text = chunk.text
+        except ValueError:
+            continue  # A chunk without text parts, e.g. the final finish-reason chunk.
+        for competency_dict in parser.feed(chunk_text):
+            competency = repair_competency(competency_dict, frameworks)
+            if competency is None:
+                continue  # Dropped by the whole-response repair too.
+            on_competency(competency)
+    return parser.text
+
+def _context_cached_request(
+    client: genai.GenerativeModel,
+    prompt: str,
+    context: Optional[PromptContext],
+    context_cache: Optional[ContextCacheManager],
+    debug_mode: bool,
+) -> tuple[Any, str]:
+    """
+    Returns the client and prompt text to send. With context caching enabled,
+    the client carries the cached static prefix and only the rest is sent.
+    """
+    if not context or not context_cache or not prompt.startswith(context.static_prefix):
+        return client, prompt
+    try:
+        cached_client = context_cache.client_for(context, client)
+    except Exception as e:
+        # Caching is an optimisation only; the full prompt still works.
+        print(f"Context Cache Error: falling back to the full prompt. Reason: {e}", flush=True)
+        return client, prompt
+    if cached_client is None:
+        return client, prompt
+    if debug_mode:
+        print(f"--- Context cache: {context_cache.stats()} ---", flush=True)
+    return cached_client, prompt[len(context.static_prefix):]
+
+def generate_analysis(
+    client: genai.GenerativeModel,
+    prompt: str,
+    config_loader: "ConfigLoader",
+    on_competency: Optional[Callable[[AssessedCompetency], None]] = None,
+    context: Optional[PromptContext] = None,
+    response_cache: Optional[ResponseCache] = None,
+    context_cache: Optional[ContextCacheManager] = None,
+    call_guard: Optional[ApiCallGuard] = None,
+    frameworks: Optional[Dict[str, FrameworkFile]] = None,
+    repair_stats: Optional[RepairStats] = None,
+) -> LLMAnalysisResult:
+    """
+    Runs the main analysis, requesting a JSON response, and validates it. If
+    `on_competency` is given and streaming is enabled, each competency is
+    passed to it as soon as it arrives; the full result is still returned.
+    If `context` is given, its static prefix is served from `context_cache`.
+    A malformed response is repaired locally where possible, with ids checked
+    against `frameworks` (the ones in the prompt); see response_repair.
+    A repaired result that lost competencies is returned but not cached.
+    Raises LLMResponseFormatError for a response that cannot be repaired; API
+    errors that survive the call guard's retries propagate.
+    """
+    app_config = config_loader.llm_config.app
+    gen_config_dict = build_generation_config_dict(config_loader.llm_config.gemini)
+
+    if response_cache:
+        cache_key = ResponseCache.make_key(prompt, config_loader.llm_config.gemini.model_name, gen_config_dict, LLMAnalysisResult)
+        if cached_result := response_cache.get(cache_key, LLMAnalysisResult):
+            print("--- Analysis served from response cache ---", flush=True)
+            return cached_result
+
+    generation_config = genai.types.GenerationConfig(**gen_config_dict)
+
+    streaming = bool(on_competency and app_config.stream_analysis)
+    competencies_streamed = 0
+
+    def _on_streamed_competency(competency: AssessedCompetency) -> None:
+        nonlocal competencies_streamed
+        competencies_streamed += 1
+        on_competency(competency)
+
+    def _request(request_client: Any, request_prompt: str, request_kwargs: Dict[str, Any]) -> str:
+        if streaming:
+            return stream_analysis_text(request_client, request_prompt, generation_config, _on_streamed_competency, frameworks, **request_kwargs)
+        # Pass both the prompt and the generation config to the client
+        response = request_client.generate_content(request_prompt, generation_config=generation_config, **request_kwargs)
+        return response.text
+
+    def _generate(request_client: Any, request_prompt: str) -> str:
+        # A stream that has already shown competencies is not repeated, as they would appear twice.
+        return _guarded(
+            call_guard,
+            lambda request_kwargs: _request(request_client, request_prompt, request_kwargs),
+            prompt,
+            can_retry=lambda: competencies_streamed == 0
+        )
+
+    print("--- Calling Gemini API for Analysis (REAL) ---", flush=True)
+    request_client, request_prompt = _context_cached_request(client, prompt, context, context_cache, app_config.debug_mode)
+    try:
+        response_text = _generate(request_client, request_prompt)
+    except google_exceptions.NotFound:
+        if request_client is client:
+            raise
+        # The cached prefix expired on the server before our TTL said it would.
+        print("--- Context cache handle not found; retrying with the full prompt ---", flush=True)
+        context_cache.invalidate(context.key)
+        response_text = _generate(client, prompt)
+
+    if app_config.debug_mode:
+        if call_guard:
+            print(f"--- Gemini call guard: {call_guard.stats()} ---", flush=True)
+        # --- DEBUGGING: Dump raw JSON response to console ---
+        print("\n--- LLM OUTPUT: RAW JSON RESPONSE ---", flush=True)
+        print(response_text, flush=True)
+        print("-------------------------------------\n", flush=True)
+
+    try:
+        analysis_result = parse_analysis_response(response_text, frameworks, repair_stats)
+    except ValidationError as e:
+        raise LLMResponseFormatError(e, response_text) from e
+    if app_config.debug_mode and repair_stats:
+        print(f"--- Response repair: {repair_stats.stats()} ---", flush=True)
+    if analysis_result.response_truncated or analysis_result.competencies_dropped:
+        # Not cached, so the next request gets a fresh, hopefully complete, response.
+        print(
+            f"--- Analysis response lost competencies (truncated: {analysis_result.response_truncated}, "
+            f"dropped: {analysis_result.competencies_dropped}); not cached ---", flush=True
+        )
+    elif response_cache:
+        response_cache.put(cache_key, analysis_result)
+    return analysis_result
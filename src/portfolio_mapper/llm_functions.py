@@ -7,16 +7,28 @@
 
 import streamlit as st
 import google.generativeai as genai
-from typing import Optional, TYPE_CHECKING
-from .models.llm_response import LLMAnalysisResult
+from typing import Callable, Dict, Optional, Type, TYPE_CHECKING, TypeVar
+from pydantic import BaseModel
+from .caching import LRUCache, SingleFlight
+from .context_cache import ContextCacheManager, PromptContext
+from .gemini_client import (
+    LLMResponseFormatError, build_generation_config_dict, create_call_guard, create_context_cache,
+    create_llm_client, generate_analysis, generate_safety_check, open_response_cache
+)
+from .models.framework import FrameworkFile
+from .models.llm_response import AssessedCompetency, LLMAnalysisResult
 from .models.safety import SafetyAnalysis
-from pydantic import ValidationError
+from .rate_limit import ApiCallGuard, CallDeadlineExceeded
+from .response_cache import ResponseCache
+from .response_repair import RepairStats
 from google.api_core import exceptions as google_exceptions
 
 # Use a forward reference for the type hint to avoid a circular import
 if TYPE_CHECKING:
     from .data_loader import ConfigLoader
 
+M = TypeVar("M", bound=BaseModel)
+
 @st.cache_resource
 def get_llm_client(_config_loader: "ConfigLoader") -> Optional[genai.GenerativeModel]:
     """
@@ -29,61 +41,123 @@ def get_llm_client(_config_loader: "ConfigLoader") -> Optional[genai.GenerativeM
         st.error("`GOOGLE_API_KEY` not found. Please add it to `.streamlit/secrets.toml`.")
         return None
     try:
-        genai.configure(api_key=api_key)
-        
-        # Get config from the loader
-        gemini_config = _config_loader.llm_config.gemini
-        
-        # Convert Pydantic models to dictionaries for the SDK
-        safety_settings_dict = [s.model_dump() for s in gemini_config.safety_settings]
-
-        return genai.GenerativeModel(
-            model_name=gemini_config.model_name, 
-            safety_settings=safety_settings_dict
-        )
+        return create_llm_client(api_key, _config_loader.llm_config.gemini)
     except Exception as e:
         st.error("Failed to initialize the Google Gemini client.")
         st.exception(e)
         return None
 
+@st.cache_resource
+def get_response_cache(_config_loader: "ConfigLoader") -> Optional[ResponseCache]:
+    """
+    Opens and caches the persistent response cache, shared by all sessions.
+    Returns None if the cache is disabled or cannot be opened.
+    """
+    return open_response_cache(_config_loader.llm_config.response_cache)
+
+@st.cache_resource
+def get_context_cache(_config_loader: "ConfigLoader") -> Optional[ContextCacheManager]:
+    """
+    Creates and caches the manager of context-cache handles for static prompt
+    prefixes, shared by all sessions. Returns None if context caching is disabled.
+    """
+    return create_context_cache(_config_loader.llm_config)
+
+@st.cache_resource
+def get_call_guard(_config_loader: "ConfigLoader") -> Optional[ApiCallGuard]:
+    """
+    Creates and caches the rate limiter and retry policy shared by every
+    session, so that the quota is divided between them rather than exhausted
+    by all of them at once. Returns None if rate limiting is disabled.
+    """
+    return create_call_guard(_config_loader.llm_config.rate_limit)
+
+@st.cache_resource
+def get_in_flight_requests() -> SingleFlight:
+    """
+    Creates and caches the registry of in-flight Gemini requests, shared by all
+    sessions, so that identical concurrent requests make only one API call.
+    """
+    return SingleFlight("gemini_requests")
+
+@st.cache_resource
+def get_repair_stats() -> RepairStats:
+    """
+    Creates and caches the counters of local analysis-response repairs, shared
+    by all sessions, including how many failed responses were saved a retry.
+    """
+    return RepairStats()
+
+# Safety verdicts kept in memory, per chunk prompt. A verdict is small, so this covers many edits by many users.
+SAFETY_VERDICT_CACHE_SIZE = 4096
+
+@st.cache_resource
+def get_safety_verdict_cache() -> LRUCache[SafetyAnalysis]:
+    """
+    Creates and caches the in-memory store of validated safety verdicts, shared
+    by all sessions. When a reflection is checked chunk by chunk, only the
+    chunks that changed since any earlier check are sent to the API again.
+    """
+    return LRUCache("safety_verdicts", max_entries=SAFETY_VERDICT_CACHE_SIZE)
+
+def _request_key(prompt: str, config_loader: "ConfigLoader", response_type: Type[BaseModel]) -> str:
+    """Identifies a request by its prompt, model and generation config, as for the response cache."""
+    gemini_config = config_loader.llm_config.gemini
+    return ResponseCache.make_key(prompt, gemini_config.model_name, build_generation_config_dict(gemini_config), response_type)
+
+def _coalesced(prompt: str, config_loader: "ConfigLoader", response_type: Type[M], request: Callable[[], M]) -> M:
+    """
+    Runs `request`, or waits for an identical request already in flight and
+    shares its validated result. Requests are identical if they have the same
+    prompt, model and generation config, as for the response cache. Errors are
+    shared too, so each waiting session displays them.
+    """
+    in_flight_requests = get_in_flight_requests()
+    result, shared = in_flight_requests.do(_request_key(prompt, config_loader, response_type), request)
+    if shared:
+        print(f"--- Joined an identical in-flight {response_type.__name__} request ---", flush=True)
+        # Each session gets its own copy, so none can mutate another's result.
+        result = result.model_copy(deep=True)
+    if config_loader.llm_config.app.debug_mode:
+        print(f"--- In-flight requests: {in_flight_requests.stats()} ---", flush=True)
+    return result
+
+def _show_deadline_error(config_loader: "ConfigLoader", e: CallDeadlineExceeded) -> None:
+    st.error("The AI service is busy right now and the request timed out.", icon="⏳")
+    st.warning("Many people may be using the app at the moment. Please wait a minute and try again.")
+    if config_loader.llm_config.app.debug_mode:
+        print(f"\n--- GEMINI CALL DEADLINE EXCEEDED ---\n{e}\n{get_call_guard(config_loader).stats()}\n---------------------------\n", flush=True)
+
 def call_gemini_for_safety_check(prompt: str, config_loader: "ConfigLoader") -> Optional[SafetyAnalysis]:
-    """Calls the Gemini API for a safety check, requesting a JSON response, and parses it."""
+    """
+    Calls the Gemini API for a safety check, requesting a JSON response, and
+    parses it. Verdicts for prompts checked before are served from memory.
+    """
     client = get_llm_client(config_loader)
     if not client:
         return None
 
-    # Prepare the generation config from our loaded settings
-    gemini_config = config_loader.llm_config.gemini
-    gen_config_dict = gemini_config.generation_config.model_dump(exclude_none=True)
-    
-    # Ensure JSON mode is always enabled
-    gen_config_dict["response_mime_type"] = "application/json"
-    
-    generation_config = genai.types.GenerationConfig(**gen_config_dict)
-
-    print("--- Calling Gemini API for Safety Check (REAL) ---", flush=True)
-    try:
-        if config_loader.llm_config.app.debug_mode:
-            # --- DEBUGGING: Dump raw JSON response to console ---
-            print("\n--- LLM SAFETY INPUT: PROMPT ---", flush=True)
-            print(prompt, flush=True)
-            print("-------------------------------------\n", flush=True)
-
-        # Pass both the prompt and the generation config to the client
-        response = client.generate_content(prompt, generation_config=generation_config)
-        
-        if config_loader.llm_config.app.debug_mode:
-            # --- DEBUGGING: Dump raw JSON response to console ---
-            print("\n--- LLM SAFETY OUTPUT: RAW JSON RESPONSE ---", flush=True)
-            print(response.text, flush=True)
-            print("-------------------------------------\n", flush=True)
+    verdict_cache = get_safety_verdict_cache()
+    key = _request_key(prompt, config_loader, SafetyAnalysis)
+    if cached_verdict := verdict_cache.get(key):
+        return cached_verdict.model_copy(deep=True)
 
-        return SafetyAnalysis.model_validate_json(response.text)
-    except ValidationError as e:
+    try:
+        verdict = _coalesced(prompt, config_loader, SafetyAnalysis, lambda: generate_safety_check(
+            client, prompt, config_loader,
+            response_cache=get_response_cache(config_loader),
+            call_guard=get_call_guard(config_loader),
+        ))
+        verdict_cache.put(key, verdict.model_copy(deep=True))
+        return verdict
+    except CallDeadlineExceeded as e:
+        _show_deadline_error(config_loader, e)
+        return None
+    except LLMResponseFormatError as e:
         st.error("The AI's safety check response did not match the required format.")
-        st.exception(e)
+        st.exception(e.validation_error)
         st.write("Raw AI Response:")
-        st.code(response.text if 'response' in locals() else "No response from AI.", language="json")
+        st.code(e.raw_text if e.raw_text is not None else "No response from AI.", language="json")
         return None
     except google_exceptions.ResourceExhausted as e:
         st.error("API Quota Exceeded", icon="😥")
@@ -101,38 +175,45 @@ def call_gemini_for_safety_check(prompt: str, config_loader: "ConfigLoader") ->
         st.exception(e)
         return None
 
-def call_gemini_for_analysis(prompt: str, config_loader: "ConfigLoader") -> Optional[LLMAnalysisResult]:
-    """Calls the Gemini API, requesting a JSON response, and parses it."""
+def call_gemini_for_analysis(
+    prompt: str,
+    config_loader: "ConfigLoader",
+    on_competency: Optional[Callable[[AssessedCompetency], None]] = None,
+    context: Optional[PromptContext] = None,
+    frameworks: Optional[Dict[str, FrameworkFile]] = None,
+) -> Optional[LLMAnalysisResult]:
+    """
+    Calls the Gemini API, requesting a JSON response, and parses it. If
+    `on_competency` is given and streaming is enabled, each competency is
+    passed to it as soon as it arrives; the full result is still returned.
+    If `context` is given, its static prefix is served from the context cache.
+    If `frameworks` is given, returned ids are checked and corrected against it.
+    A session that joins an identical request already in flight receives
+    only the full result; competencies are streamed to the first session.
+    """
     client = get_llm_client(config_loader)
     if not client:
         return None
 
-    # Prepare the generation config from our loaded settings
-    gemini_config = config_loader.llm_config.gemini
-    gen_config_dict = gemini_config.generation_config.model_dump(exclude_none=True)
-    
-    # Ensure JSON mode is always enabled
-    gen_config_dict["response_mime_type"] = "application/json"
-    
-    generation_config = genai.types.GenerationConfig(**gen_config_dict)
-
-    print("--- Calling Gemini API for Analysis (REAL) ---", flush=True)
     try:
-        # Pass both the prompt and the generation config to the client
-        response = client.generate_content(prompt, generation_config=generation_config)
-        
-        if config_loader.llm_config.app.debug_mode:
-            # --- DEBUGGING: Dump raw JSON response to console ---
-            print("\n--- LLM OUTPUT: RAW JSON RESPONSE ---", flush=True)
-            print(response.text, flush=True)
-            print("-------------------------------------\n", flush=True)
-
-        return LLMAnalysisResult.model_validate_json(response.text)
-    except ValidationError as e:
+        return _coalesced(prompt, config_loader, LLMAnalysisResult, lambda: generate_analysis(
+            client, prompt, config_loader,
+            on_competency=on_competency,
+            context=context,
+            response_cache=get_response_cache(config_loader),
+            context_cache=get_context_cache(config_loader),
+            call_guard=get_call_guard(config_loader),
+            frameworks=frameworks,
+            repair_stats=get_repair_stats(),
+        ))
+    except CallDeadlineExceeded as e:
+        _show_deadline_error(config_loader, e)
+        return None
+    except LLMResponseFormatError as e:
         st.error("The AI's response did not match the required format.")
-        st.exception(e)
+        st.exception(e.validation_error)
         st.write("Raw AI Response:")
-        st.code(response.text if 'response' in locals() else "No response from AI.", language="json")
+        st.code(e.raw_text if e.raw_text is not None else "No response from AI.", language="json")
         return None
     except google_exceptions.ResourceExhausted as e:
         st.error("API Quota Exceeded", icon="😥")
@@ -148,4 +229,4 @@ def call_gemini_for_analysis(prompt: str, config_loader: "ConfigLoader") -> Opti
         if config_loader.llm_config.app.debug_mode:
             print(f"\n--- GEMINI API ERROR (Analysis) ---\n{type(e).__name__}: {e}\n---------------------------\n", flush=True)
         st.exception(e)
-        return None
\ No newline at end of file
+        return None
@@ -11,12 +11,27 @@ data transformations and prompt assembly, independent of the UI.
 """
 import fnmatch
 import json
-from typing import Dict, List, Any
+import re
+from typing import Dict, List, Any, Optional, Set, Tuple
 
+from .caching import LRUCache, content_hash
+from .framework_index import FrameworkIndex, get_framework_index
 from .models.framework import FrameworkFile, FrameworkNode
 from .models.config import Role, AcademicLevel, Prompt, AcademicLevelKey
 from .models.llm_response import LLMAnalysisResult
 from .models.safety import SafetyAnalysis
+from .retrieval import shortlist_node_ids
+from .token_budget import PromptDetail, estimate_tokens
+
+# Pruned framework fragments depend only on the framework content, the level
+# key and the prompt detail level, so they are cached process-wide and shared
+# by every session. 9 bundled frameworks x 6 levels at full detail fit
+# comfortably within the default bound.
+FRAGMENT_CACHE_MAX_ENTRIES = 128
+framework_fragment_cache: LRUCache[str] = LRUCache("framework_fragments", FRAGMENT_CACHE_MAX_ENTRIES)
+# Token estimates of those fragments, under the same keys, so that budgeting a
+# prompt only has to tokenise the parts that are not framework content.
+fragment_token_cache: LRUCache[int] = LRUCache("fragment_tokens", FRAGMENT_CACHE_MAX_ENTRIES)
 
 def resolve_allowed_frameworks(
     role_obj: Role, 
@@ -43,6 +58,40 @@ def resolve_allowed_frameworks(
         for code in sorted(list(allowed_codes))
     }
 
+def resolve_required_framework_codes(
+    selected_codes: List[str],
+    framework_library: Dict[str, FrameworkFile]
+) -> set[str]:
+    """
+    Expands the selected framework codes with their dependencies, transitively.
+    """
+    all_required_codes = set(selected_codes)
+    codes_to_check = list(selected_codes)
+    while codes_to_check:
+        code = codes_to_check.pop(0)
+        if framework := framework_library.get(code):
+            if framework.metadata.dependencies:
+                for dep_code in framework.metadata.dependencies:
+                    if dep_code not in all_required_codes:
+                        all_required_codes.add(dep_code)
+                        codes_to_check.append(dep_code)
+    return all_required_codes
+
+def get_next_academic_level(
+    level_key: AcademicLevelKey,
+    all_academic_levels: Dict[AcademicLevelKey, AcademicLevel]
+) -> tuple[str, str]:
+    """
+    Returns the name and description of the level above `level_key`, or
+    placeholders if it is already the highest level.
+    """
+    level_keys = list(all_academic_levels.keys())
+    selected_level_index = level_keys.index(level_key)
+    if selected_level_index + 1 < len(level_keys):
+        next_level_obj = all_academic_levels[level_keys[selected_level_index + 1]]
+        return next_level_obj.name, next_level_obj.description
+    return "N/A", "This is the highest academic level defined."
+
 def _get_all_leaf_nodes(nodes: List[FrameworkNode]) -> List[tuple[str, str]]:
     """Recursively traverses nodes to find all leaf nodes (nodes with no children)."""
     leaf_nodes = []
@@ -54,56 +103,189 @@ def _get_all_leaf_nodes(nodes: List[FrameworkNode]) -> List[tuple[str, str]]:
             leaf_nodes.extend(_get_all_leaf_nodes(node.children))
     return leaf_nodes
 
-def _recursive_prune_nodes(nodes: List[FrameworkNode], academic_level_key: str) -> List[FrameworkNode]:
+COLLAPSED_NODE_INTRO_NOTE = "This principle is demonstrated by evidence of the following points:"
+INTERMEDIATE_NODE_INSTRUCTION = "This is a category/domain, not a specific competency. Do not match this node directly. You must find a more specific match within its children."
+
+def _collapsed_node_instruction(display_id: Optional[str]) -> str:
+    """The instruction injected into nodes whose children are collapsed into notes."""
+    return f"This is a high-level principle. If you match this node, you MUST use its 'display_id' ('{display_id}') for the 'competency_id' in your response. In your 'justification_for_level', you should then reference the most relevant supporting competency IDs (e.g., 'ID: 1.1', 'ID: 6.2') to support your reasoning."
+
+def _descendant_leaf_statements(node: FrameworkNode, index: FrameworkIndex) -> List[tuple[str, str]]:
+    """Collects (display_id, text) for the leaves below `node` with a flat scan of the index."""
+    position = index.index_of_id(node.id)
+    if position is None or index.nodes[position] is not node:
+        # The node is not the one indexed under this id (e.g. duplicate ids); walk it directly.
+        return _get_all_leaf_nodes(node.children)
+    return [(index.display_ids[j], index.text(j)) for j in index.descendant_leaf_indices(position)]
+
+def _prune_node_to_dict(
+    node: FrameworkNode,
+    academic_level_key: str,
+    index: FrameworkIndex,
+    detail: PromptDetail = PromptDetail.FULL,
+    keep: Optional[Set[str]] = None,
+) -> Dict[str, Any]:
     """
-    Recursively processes framework nodes, pruning and tailoring them
-    based on the provided academic level.
+    Emits the LLM-facing dictionary for a single node in one pass, reading
+    the source node without copying or mutating it. At full detail, keys and
+    values match what model_dump(exclude_none=True) produced for the old
+    model-copy approach; lower detail levels leave out optional content.
+    If `keep` is given, only children whose ids are in it are emitted.
     """
-    pruned_nodes = []
-    for node in nodes:
-        node_copy = node.model_copy(deep=True)
-        
-        if node_copy.collapse_children and node_copy.children:
-            descendant_leaf_nodes = _get_all_leaf_nodes(node_copy.children)
-            if node_copy.source_notes is None:
-                node_copy.source_notes = []
-
-            if descendant_leaf_nodes:
-                # Add a clear introductory note.
-                node_copy.source_notes.append("This principle is demonstrated by evidence of the following points:")
-                
-                # Add each child statement as a separate, structured note.
-                sorted_leaf_nodes = sorted(descendant_leaf_nodes, key=lambda x: x[0])
-                for stmt_id, stmt_text in sorted_leaf_nodes:
-                    node_copy.source_notes.append(f"- {stmt_text} (ID: {stmt_id})")
-            
-            # Automatically set the instruction for collapsed nodes.
-            node_copy.llm_instructions = f"This is a high-level principle. If you match this node, you MUST use its 'display_id' ('{node_copy.display_id}') for the 'competency_id' in your response. In your 'justification_for_level', you should then reference the most relevant supporting competency IDs (e.g., 'ID: 1.1', 'ID: 6.2') to support your reasoning."
-            
-            node_copy.children = None
-            node_copy.collapse_children = False
-
-        if node_copy.children:
-            # If a node still has children at this point, it is an intermediate
-            # grouping node (e.g., a Domain or Competency). We must explicitly
-            # forbid the AI from matching it to force it to look deeper.
-            node_copy.llm_instructions = "This is a category/domain, not a specific competency. Do not match this node directly. You must find a more specific match within its children."
-
-            pruned_children = _recursive_prune_nodes(node_copy.children, academic_level_key)
-            node_copy.children = pruned_children if pruned_children else None
-
-        pruned_nodes.append(node_copy)
-            
-    return pruned_nodes
-
-def prune_framework_for_llm(framework: FrameworkFile, academic_level_key: AcademicLevelKey) -> Dict[str, Any]:
+    source_notes = None
+    if node.source_notes is not None and detail < PromptDetail.NO_NOTES:
+        source_notes = list(node.source_notes)
+    source_examples = None
+    if node.source_examples is not None and detail < PromptDetail.NO_EXAMPLES:
+        source_examples = list(node.source_examples)
+    llm_instructions = node.llm_instructions
+    children = node.children
+    collapse_children = node.collapse_children
+
+    if collapse_children and children:
+        descendant_leaf_nodes = []
+        if detail < PromptDetail.NO_COLLAPSED_DETAIL:
+            if source_notes is None:
+                source_notes = []
+            descendant_leaf_nodes = _descendant_leaf_statements(node, index)
+        if descendant_leaf_nodes:
+            # Add a clear introductory note, then each child statement as a separate, structured note.
+            source_notes.append(COLLAPSED_NODE_INTRO_NOTE)
+            for stmt_id, stmt_text in sorted(descendant_leaf_nodes, key=lambda x: x[0]):
+                source_notes.append(f"- {stmt_text} (ID: {stmt_id})")
+        llm_instructions = _collapsed_node_instruction(node.display_id)
+        children = None
+        collapse_children = False
+
+    pruned_children = None
+    if children:
+        # If a node still has children at this point, it is an intermediate
+        # grouping node (e.g., a Domain or Competency). We must explicitly
+        # forbid the AI from matching it to force it to look deeper.
+        llm_instructions = INTERMEDIATE_NODE_INSTRUCTION
+        pruned_children = [
+            _prune_node_to_dict(child, academic_level_key, index, detail, keep)
+            for child in children if keep is None or child.id in keep
+        ]
+    elif children is not None:
+        pruned_children = []  # An explicit empty list is preserved, as model_dump did.
+
+    node_dict = {"id": node.id, "node_type": node.node_type, "text": node.text}
+    for key, value in (
+        ("display_id", node.display_id),
+        ("source_notes", source_notes),
+        ("source_examples", source_examples),
+        ("llm_instructions", llm_instructions),
+        ("children", pruned_children),
+        ("collapse_children", collapse_children),
+    ):
+        if value is not None:
+            node_dict[key] = value
+    return node_dict
+
+def prune_framework_for_llm(
+    framework: FrameworkFile,
+    academic_level_key: AcademicLevelKey,
+    detail: PromptDetail = PromptDetail.FULL,
+    keep: Optional[Set[str]] = None,
+) -> Dict[str, Any]:
     """
     Creates a pruned and tailored dictionary representation of a framework
-    for inclusion in the LLM prompt.
+    for inclusion in the LLM prompt. The source framework is left untouched.
+    If `keep` is given (see retrieval.shortlist_node_ids), only the nodes
+    whose ids are in it are included.
+    """
+    framework_dict = {"metadata": framework.metadata.model_dump(exclude_none=True, exclude={'content_hash'})}
+    if framework.source_notes is not None and detail < PromptDetail.NO_NOTES:
+        framework_dict["source_notes"] = list(framework.source_notes)
+    index = get_framework_index(framework)
+    framework_dict["structure"] = [
+        _prune_node_to_dict(node, academic_level_key.value, index, detail, keep)
+        for node in framework.structure if keep is None or node.id in keep
+    ]
+    return framework_dict
+
+def count_optional_content(framework: FrameworkFile) -> Dict[PromptDetail, int]:
+    """
+    Counts the optional items that each reduced detail level removes from this
+    framework's prompt fragment: examples, notes and collapsed-child statements.
+    Nodes hidden below a collapsed node never reach the prompt and are skipped.
     """
-    pruned_fw = framework.model_copy(deep=True)
-    pruned_fw.structure = _recursive_prune_nodes(pruned_fw.structure, academic_level_key.value)
-    return pruned_fw.model_dump(exclude_none=True)
+    index = get_framework_index(framework)
+    counts = {
+        PromptDetail.NO_EXAMPLES: 0,
+        PromptDetail.NO_NOTES: len(framework.source_notes or []),
+        PromptDetail.NO_COLLAPSED_DETAIL: 0,
+    }
+    i = 0
+    while i < len(index):
+        node = index.nodes[i]
+        counts[PromptDetail.NO_EXAMPLES] += len(node.source_examples or [])
+        counts[PromptDetail.NO_NOTES] += len(node.source_notes or [])
+        if node.collapse_children and node.children:
+            counts[PromptDetail.NO_COLLAPSED_DETAIL] += len(_descendant_leaf_statements(node, index))
+            i = index.subtree_ends[i]
+        else:
+            i += 1
+    return counts
+
+def find_competency_node(framework: FrameworkFile, competency_id: str) -> Optional[FrameworkNode]:
+    """
+    Maps a competency id returned by the LLM back to its framework node.
+    The display_id is tried first, then the fully qualified id.
+    """
+    index = get_framework_index(framework)
+    return index.node_by_display_id(competency_id) or index.node_by_id(competency_id)
+
+def _framework_content_hash(framework: FrameworkFile) -> str:
+    """Returns the load-time content hash, or hashes the model if it was built in code."""
+    if framework.metadata.content_hash:
+        return framework.metadata.content_hash
+    return content_hash(framework.model_dump_json().encode('utf-8'))
+
+def _fragment_cache_key(framework: FrameworkFile, academic_level_key: AcademicLevelKey, detail: PromptDetail) -> tuple:
+    return (framework.metadata.framework_code, academic_level_key.value, int(detail), _framework_content_hash(framework))
+
+def _serialise_fragment(pruned: Dict[str, Any]) -> str:
+    # Indent at array-element depth so that joined fragments are identical
+    # to json.dumps(list_of_frameworks, indent=2).
+    return "  " + json.dumps(pruned, indent=2).replace("\n", "\n  ")
+
+def get_framework_fragment(
+    framework: FrameworkFile,
+    academic_level_key: AcademicLevelKey,
+    detail: PromptDetail = PromptDetail.FULL,
+) -> str:
+    """
+    Returns the pruned framework serialised as a JSON array element, from the
+    process-wide cache where possible. The content hash in the key means an
+    edited framework never reuses a stale fragment.
+    """
+    cache_key = _fragment_cache_key(framework, academic_level_key, detail)
+    return framework_fragment_cache.get_or_compute(
+        cache_key, lambda: _serialise_fragment(prune_framework_for_llm(framework, academic_level_key, detail))
+    )
+
+def get_framework_fragment_tokens(
+    framework: FrameworkFile,
+    academic_level_key: AcademicLevelKey,
+    detail: PromptDetail = PromptDetail.FULL,
+) -> int:
+    """Returns the estimated token count of the framework's prompt fragment, cached like the fragment itself."""
+    return fragment_token_cache.get_or_compute(
+        _fragment_cache_key(framework, academic_level_key, detail),
+        lambda: estimate_tokens(get_framework_fragment(framework, academic_level_key, detail))
+    )
+
+def join_framework_fragments(fragments: List[str]) -> str:
+    """Concatenates cached fragments into the frameworks JSON array for the prompt."""
+    if not fragments:
+        return "[]"
+    return "[\n" + ",\n".join(fragments) + "\n]"
+
+def get_fragment_cache_stats() -> Dict[str, Any]:
+    """Returns the hit/miss counters of the framework fragment cache."""
+    return framework_fragment_cache.stats()
 
 def assemble_safety_prompt(
     reflection_text: str,
@@ -120,7 +302,80 @@ def assemble_safety_prompt(
         output_schema=output_schema,
     )
 
-def assemble_analysis_prompt(
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+def split_into_safety_chunks(reflection_text: str, min_chars: int) -> List[str]:
+    """
+    Splits a reflection into chunks of whole paragraphs for separate safety
+    checks. A chunk ends after the first paragraph of at least `min_chars`
+    characters, so short paragraphs travel with the next long one (or, at
+    the end of the text, with the previous chunk). Because
+    each boundary depends only on the paragraph before it, editing one
+    paragraph only changes the chunk containing it (which may split in two,
+    or merge with the next), and every other chunk's verdict can be reused.
+    """
+    chunks: List[str] = []
+    pending: List[str] = []
+    for paragraph in _PARAGRAPH_BREAK.split(reflection_text.strip()):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        pending.append(paragraph)
+        if len(paragraph) >= min_chars:
+            chunks.append("\n\n".join(pending))
+            pending = []
+    if pending and chunks:
+        chunks[-1] = "\n\n".join([chunks[-1], *pending])
+    elif pending:
+        chunks.append("\n\n".join(pending))
+    return chunks or [reflection_text]
+
+def merge_safety_results(results: List[SafetyAnalysis]) -> SafetyAnalysis:
+    """
+    Combines the safety checks of a reflection's chunks into one result: it is
+    only safe if every chunk is, and flags and PII detections are collected in
+    order, each (flag, text) pair once.
+    """
+    if len(results) == 1:
+        return results[0]
+    safety_flags = []
+    pii_detections = []
+    seen_pii = set()
+    for result in results:
+        safety_flags.extend(flag for flag in result.safety_flags if flag not in safety_flags)
+        for detection in result.pii_detections:
+            if (detection.flag, detection.text) not in seen_pii:
+                seen_pii.add((detection.flag, detection.text))
+                pii_detections.append(detection)
+    return SafetyAnalysis(
+        is_safe_for_processing=all(result.is_safe_for_processing for result in results),
+        safety_flags=safety_flags,
+        pii_detections=pii_detections,
+    )
+
+def _log_trimmed_content(
+    detail: PromptDetail,
+    selected_frameworks: Dict[str, FrameworkFile],
+    tokens_before: int,
+    tokens_after: int,
+) -> None:
+    """Prints exactly which optional content one degradation step removed, per framework."""
+    per_framework = {
+        code: count_optional_content(fw)[detail]
+        for code, fw in selected_frameworks.items()
+    }
+    breakdown = ", ".join(f"{code}: {count}" for code, count in per_framework.items() if count) or "none present"
+    print(
+        f"  ✂️ [TRIMMED] Dropped {sum(per_framework.values())} {detail.dropped_content} ({breakdown}); "
+        f"~{tokens_before - tokens_after} tokens saved, ~{tokens_after} remaining.",
+        flush=True
+    )
+
+# Stands in for the reflection while the template is formatted, marking where
+# the static prefix of the analysis prompt ends.
+_REFLECTION_MARKER = "\x00user_reflection_text\x00"
+
+def assemble_analysis_prompt_parts(
     role_obj: Role,
     academic_level_obj: AcademicLevel,
     academic_level_key: AcademicLevelKey,
@@ -130,43 +385,187 @@ def assemble_analysis_prompt(
     next_level_name: str,
     next_level_description: str,
     debug_mode: bool,
-    all_academic_levels: Dict[AcademicLevelKey, AcademicLevel]
-) -> str:
+    all_academic_levels: Dict[AcademicLevelKey, AcademicLevel],
+    token_budget: Optional[int] = None,
+    shortlist_top_k: Optional[int] = None,
+) -> Tuple[str, str]:
     """
-    Assembles the final, massive prompt string to send to the LLM.
+    Assembles the final, massive prompt to send to the LLM, split into its
+    static prefix (everything before the reflection, which is the same for a
+    given role, level and framework selection) and the dynamic remainder.
+
+    If `token_budget` is set and the estimated prompt size exceeds it, optional
+    framework content is dropped step by step (examples, then notes, then
+    collapsed-child statements) until the prompt fits or nothing optional is left.
+
+    If `shortlist_top_k` is set, each framework is cut down to the units that
+    best match the reflection (see retrieval.py) before any trimming. Such
+    prompts depend on the reflection, so their framework fragments are built
+    per call rather than cached, and the static prefix is no longer shared.
     """
     print("--- Assembling Analysis Prompt ---", flush=True)
 
+    shortlists: Dict[str, Optional[Set[str]]] = {}
+    if shortlist_top_k is not None:
+        for code, fw in selected_frameworks.items():
+            shortlists[code] = shortlist_node_ids(fw, reflection_text, shortlist_top_k)
+            if shortlists[code] is None:
+                print(f"  ⚠️ [SHORTLIST] No terms in common with {code}; sending the full framework.", flush=True)
+            elif debug_mode:
+                print(f"  ✅ [SHORTLIST] Kept {len(shortlists[code])} nodes of {code}.", flush=True)
+
+    def _fragment(code: str, fw: FrameworkFile, level: PromptDetail) -> str:
+        keep = shortlists.get(code)
+        if keep is None:
+            return get_framework_fragment(fw, academic_level_key, level)
+        return _serialise_fragment(prune_framework_for_llm(fw, academic_level_key, level, keep))
+
+    def _fragment_tokens(code: str, fw: FrameworkFile, level: PromptDetail) -> int:
+        if shortlists.get(code) is None:
+            return get_framework_fragment_tokens(fw, academic_level_key, level)
+        return estimate_tokens(_fragment(code, fw, level))
+
     output_schema = json.dumps(LLMAnalysisResult.model_json_schema(), indent=2)
 
     academic_levels_json = json.dumps(
         {k.value: v.model_dump() for k, v in all_academic_levels.items()}, 
         indent=2
     )
-    
-    pruned_frameworks = [
-        prune_framework_for_llm(fw, academic_level_key)
-        for fw in selected_frameworks.values()
-    ]
-    frameworks_json_string = json.dumps(pruned_frameworks, indent=2)
+
+    def _format_prompt(frameworks_json_string: str) -> str:
+        """Formats the template with a marker in place of the reflection."""
+        return prompt_obj.template.format(
+            tone=prompt_obj.tone or "",
+            persona=prompt_obj.persona or "",
+            role_display_name=role_obj.display_name,
+            academic_level_name=academic_level_obj.name,
+            academic_level_description=academic_level_obj.description,
+            user_reflection_text=_REFLECTION_MARKER,
+            frameworks_json_string=frameworks_json_string,
+            output_schema=output_schema,
+            next_level_name=next_level_name,
+            next_level_description=next_level_description,
+            academic_levels_json=academic_levels_json
+        )
+
+    detail = PromptDetail.FULL
+    if token_budget is not None:
+        # The non-framework part of the prompt is tokenised once; fragment
+        # estimates come from the cache, with one token per array separator.
+        base_tokens = (
+            estimate_tokens(_format_prompt("[]").replace(_REFLECTION_MARKER, reflection_text))
+            + len(selected_frameworks)
+        )
+
+        def _estimate_at(level: PromptDetail) -> int:
+            return base_tokens + sum(
+                _fragment_tokens(code, fw, level) for code, fw in selected_frameworks.items()
+            )
+
+        estimated_tokens = _estimate_at(detail)
+        if estimated_tokens > token_budget:
+            print(f"--- Prompt is ~{estimated_tokens} tokens, over the budget of {token_budget}. Trimming optional content. ---", flush=True)
+        while estimated_tokens > token_budget and detail < PromptDetail.NO_COLLAPSED_DETAIL:
+            detail = PromptDetail(detail + 1)
+            trimmed_tokens = _estimate_at(detail)
+            _log_trimmed_content(detail, selected_frameworks, estimated_tokens, trimmed_tokens)
+            estimated_tokens = trimmed_tokens
+        if estimated_tokens > token_budget:
+            print(f"  ⚠️ [OVER BUDGET] Nothing optional is left to trim; sending ~{estimated_tokens} tokens.", flush=True)
+        elif debug_mode or detail > PromptDetail.FULL:
+            print(f"--- Prompt is ~{estimated_tokens} tokens, within the budget of {token_budget} ({detail.name}). ---", flush=True)
+
+    frameworks_json_string = join_framework_fragments([
+        _fragment(code, fw, detail) for code, fw in selected_frameworks.items()
+    ])
+    static_prefix, marker, remainder = _format_prompt(frameworks_json_string).partition(_REFLECTION_MARKER)
+    # A template without a reflection placeholder has no dynamic part.
+    dynamic_suffix = reflection_text + remainder.replace(_REFLECTION_MARKER, reflection_text) if marker else ""
 
     if debug_mode:
+        print(f"--- Framework fragment cache: {get_fragment_cache_stats()} ---", flush=True)
         print("\n--- LLM INPUT: FRAMEWORKS JSON ---", flush=True)
         print(frameworks_json_string, flush=True)
         print("\n--- LLM INPUT: OUTPUT SCHEMA JSON ---", flush=True)
         print(output_schema, flush=True)
         print("------------------------------------\n", flush=True)
 
-    return prompt_obj.template.format(
-        tone=prompt_obj.tone or "",
-        persona=prompt_obj.persona or "",
-        role_display_name=role_obj.display_name,
-        academic_level_name=academic_level_obj.name,
-        academic_level_description=academic_level_obj.description,
-        user_reflection_text=reflection_text,
-        frameworks_json_string=frameworks_json_string,
-        output_schema=output_schema,
-        next_level_name=next_level_name,
-        next_level_description=next_level_description,
-        academic_levels_json=academic_levels_json
+    return static_prefix, dynamic_suffix
+
+def assemble_analysis_prompt(
+    role_obj: Role,
+    academic_level_obj: AcademicLevel,
+    academic_level_key: AcademicLevelKey,
+    reflection_text: str,
+    selected_frameworks: Dict[str, FrameworkFile],
+    prompt_obj: Prompt,
+    next_level_name: str,
+    next_level_description: str,
+    debug_mode: bool,
+    all_academic_levels: Dict[AcademicLevelKey, AcademicLevel],
+    token_budget: Optional[int] = None,
+    shortlist_top_k: Optional[int] = None,
+) -> str:
+    """Assembles the analysis prompt as a single string. See assemble_analysis_prompt_parts."""
+    return "".join(assemble_analysis_prompt_parts(
+        role_obj, academic_level_obj, academic_level_key, reflection_text, selected_frameworks,
+        prompt_obj, next_level_name, next_level_description, debug_mode, all_academic_levels,
+        token_budget=token_budget, shortlist_top_k=shortlist_top_k,
+    ))
+
+def group_frameworks_for_fan_out(
+    selected_frameworks: Dict[str, FrameworkFile],
+    academic_level_key: AcademicLevelKey,
+    max_groups: int,
+) -> List[Dict[str, FrameworkFile]]:
+    """
+    Splits the selected frameworks into at most `max_groups` groups of similar
+    prompt size, so that concurrent analysis calls finish at similar times.
+    Sizes come from the cached prompt fragments. Largest frameworks are placed
+    first, each into the currently smallest group; groups keep the original
+    selection order and are returned largest first.
+    """
+    sizes = {
+        code: len(get_framework_fragment(fw, academic_level_key))
+        for code, fw in selected_frameworks.items()
+    }
+    group_count = max(1, min(max_groups, len(selected_frameworks)))
+    group_codes: List[List[str]] = [[] for _ in range(group_count)]
+    group_sizes = [0] * group_count
+
+    for code in sorted(sizes, key=lambda c: (-sizes[c], c)):
+        smallest = group_sizes.index(min(group_sizes))
+        group_codes[smallest].append(code)
+        group_sizes[smallest] += sizes[code]
+
+    selection_order = list(selected_frameworks)
+    groups = sorted(
+        (sorted(codes, key=selection_order.index) for codes in group_codes if codes),
+        key=lambda codes: -sum(sizes[c] for c in codes),
+    )
+    return [{code: selected_frameworks[code] for code in codes} for codes in groups]
+
+def merge_analysis_results(
+    partial_results: List[tuple[Dict[str, FrameworkFile], LLMAnalysisResult]],
+) -> LLMAnalysisResult:
+    """
+    Merges the results of a fanned-out analysis into a single result. The
+    competencies are concatenated; each group's summary is kept under a
+    heading naming the frameworks it covers, so no call's feedback is lost.
+    """
+    if len(partial_results) == 1:
+        return partial_results[0][1]
+
+    summaries = []
+    competencies = []
+    for frameworks, result in partial_results:
+        names = ", ".join(fw.metadata.abbreviation for fw in frameworks.values())
+        summaries.append(f"**{names}:** {result.overall_summary}")
+        competencies.extend(result.assessed_competencies)
+
+    return LLMAnalysisResult(
+        overall_summary="\n\n".join(summaries),
+        assessed_competencies=competencies,
+        response_truncated=any(result.response_truncated for _, result in partial_results),
+        competencies_dropped=sum(result.competencies_dropped for _, result in partial_results),
     )
@@ -0,0 +1,41 @@
+# src/portfolio_mapper/models/batch.py
+
+# Copyright (c) Adrian Robinson 2025
+# This software is dual-licensed under the MIT License (for NHS use only)
+# and a Commercial License (for other use).
+# For commercial licensing inquiries, please contact adrian.j.robinson@gmail.com
+
+from typing import List, Optional
+from pydantic import BaseModel, Field
+from enum import Enum
+
+from .config import AcademicLevelKey
+from .llm_response import LLMAnalysisResult
+from .safety import SafetyAnalysis
+
+class BatchItem(BaseModel):
+    """One reflection to analyse, from a directory of text files or a JSONL manifest line."""
+    id: str = Field(description="Unique within the batch; used to resume an interrupted run.")
+    reflection_text: str
+    role: Optional[str] = Field(None, description="A role key from roles.yaml. Falls back to --role.")
+    academic_level: Optional[AcademicLevelKey] = Field(None, description="Falls back to --level, then the role's default.")
+    frameworks: Optional[List[str]] = Field(None, description="Framework codes. Falls back to --frameworks, then all the role's frameworks.")
+
+class BatchStatus(str, Enum):
+    COMPLETED = "completed"
+    DISTRESS_DETECTED = "distress_detected"
+    PII_DETECTED = "pii_detected"
+    FAILED = "failed"
+
+class BatchResult(BaseModel):
+    """One line of the batch results file. Every status except FAILED is final and skipped on resume."""
+    id: str
+    status: BatchStatus
+    role: Optional[str] = None
+    academic_level: Optional[AcademicLevelKey] = None
+    frameworks: List[str] = Field(default_factory=list)
+    safety: Optional[SafetyAnalysis] = None
+    analysis: Optional[LLMAnalysisResult] = None
+    error: Optional[str] = None
+    elapsed_seconds: float = 0.0
+    completed_at: str
@@ -5,7 +5,7 @@
 # and a Commercial License (for other use).
 # For commercial licensing inquiries, please contact adrian.j.robinson@gmail.com
 
-from typing import List, Dict, Optional
+from typing import List, Dict, Literal, Optional
 from pydantic import BaseModel, Field
 from enum import Enum
 
@@ -51,6 +51,45 @@ class AppConfig(BaseModel):
     """Holds general application settings."""
     debug_mode: bool = Field(False, description="If true, print detailed debugging info to the console.")
     min_reflection_length: int = 150
+    stream_analysis: bool = Field(
+        False,
+        description="If true, stream the analysis response and show each matched competency as soon as it arrives."
+    )
+    analysis_fan_out: int = Field(
+        1, ge=1,
+        description="Maximum number of concurrent analysis calls. 1 sends all frameworks in one call; higher values "
+                    "split them into groups of similar prompt size that are analysed in parallel."
+    )
+    speculative_analysis: bool = Field(
+        False,
+        description="If true, send the safety check and the analysis at the same time. Latency drops to roughly the slower "
+                    "of the two calls, but an analysis is paid for even when the safety check then blocks it."
+    )
+    prompt_token_budget: Optional[int] = Field(
+        None, ge=1,
+        description="Estimated token budget for each analysis prompt. When exceeded, optional framework content is "
+                    "dropped step by step: examples, then notes, then collapsed-child statements. None disables trimming."
+    )
+    shortlist_top_k: Optional[int] = Field(
+        None, ge=1,
+        description="If set, each framework in the analysis prompt is cut down to this many units (leaves or collapsed "
+                    "nodes) that best match the reflection lexically, plus their ancestors. None sends whole frameworks."
+    )
+    order_frameworks_by_similarity: bool = Field(
+        False,
+        description="If true, the frameworks in the analysis prompt are ordered by their best TF-IDF node match with "
+                    "the reflection, best first, instead of in selection order."
+    )
+    safety_chunk_min_chars: Optional[int] = Field(
+        None, ge=1,
+        description="If set, the safety check runs per chunk of paragraphs (each ending with a paragraph of at least this "
+                    "many characters) and verdicts are cached per chunk. None checks the whole reflection in one call."
+    )
+    local_pii_screen: Literal["off", "merge", "local_categories"] = Field(
+        "merge",
+        description="Local pattern-based PII screening (see pii_screen.py). 'merge' adds its detections to the safety "
+                    "check's; 'local_categories' also drops the AI's phone and email detections."
+    )
 
 # --- LLM Configuration ---
 class GeminiSafetySetting(BaseModel):
@@ -69,7 +108,42 @@ class GeminiConfig(BaseModel):
     safety_settings: List[GeminiSafetySetting]
     generation_config: GeminiGenerationConfig = Field(default_factory=GeminiGenerationConfig)
 
+class ResponseCacheConfig(BaseModel):
+    """Controls the persistent, on-disk cache of validated LLM responses."""
+    enabled: bool = Field(False, description="If true, identical prompts are answered from the cache instead of calling the API.")
+    path: str = Field(".cache/llm_responses.sqlite3", description="Location of the SQLite cache file.")
+    ttl_hours: float = Field(24.0, gt=0, description="How long a cached response stays valid.")
+    max_entries: int = Field(1000, ge=1, description="Least recently used responses are evicted beyond this size.")
+
+class ContextCacheConfig(BaseModel):
+    """Controls caching of the static analysis prompt prefix on the model side."""
+    enabled: bool = Field(False, description="If true, the static prompt prefix is cached and only the reflection is sent per request.")
+    backend: Literal["gemini", "local"] = Field(
+        "gemini",
+        description="'gemini' uses the CachedContent API; 'local' is an in-memory stand-in that sends the full prompt."
+    )
+    ttl_minutes: float = Field(60.0, gt=0, description="Lifetime of a cached prefix, renewed while it is in use.")
+    renew_before_minutes: float = Field(10.0, ge=0, description="A handle used within this long of expiring has its TTL renewed.")
+    max_handles: int = Field(32, ge=1, description="Least recently used (role, level, framework set) handles are deleted beyond this.")
+    min_prefix_tokens: int = Field(
+        4096, ge=0,
+        description="Prefixes estimated below this size are sent uncached; the API rejects caches under its minimum."
+    )
+
+class RateLimitConfig(BaseModel):
+    """Controls process-wide throttling, retries and deadlines for Gemini calls."""
+    enabled: bool = Field(False, description="If true, calls are throttled to the limits below and retryable errors are retried.")
+    requests_per_minute: Optional[int] = Field(None, ge=1, description="The model's RPM quota. None leaves requests unthrottled.")
+    tokens_per_minute: Optional[int] = Field(None, ge=1, description="The model's input TPM quota. None leaves tokens unthrottled.")
+    max_attempts: int = Field(4, ge=1, description="Attempts per call, including the first, for retryable errors.")
+    initial_backoff_seconds: float = Field(2.0, gt=0, description="Upper bound of the first jittered backoff; doubles per retry.")
+    max_backoff_seconds: float = Field(30.0, gt=0, description="Cap on the upper bound of any single backoff.")
+    call_deadline_seconds: float = Field(180.0, gt=0, description="Total time a call may take, including throttling and retries.")
+
 class LlmConfig(BaseModel):
     """The root model for the entire LLM configuration file."""
     app: AppConfig = Field(default_factory=AppConfig)
-    gemini: GeminiConfig
\ No newline at end of file
+    gemini: GeminiConfig
+    response_cache: ResponseCacheConfig = Field(default_factory=ResponseCacheConfig)
+    context_cache: ContextCacheConfig = Field(default_factory=ContextCacheConfig)
+    rate_limit: RateLimitConfig = Field(default_factory=RateLimitConfig)
\ No newline at end of file
@@ -5,11 +5,12 @@
 # and a Commercial License (for other use).
 # For commercial licensing inquiries, please contact adrian.j.robinson@gmail.com
 
-from typing import List, Optional
-from pydantic import BaseModel, Field
+from typing import Any, List, Optional
+from pydantic import BaseModel, Field, PrivateAttr
 
 class FrameworkMetadata(BaseModel):
     framework_code: Optional[str] = Field(None, description="Auto-generated unique code from file path.")
+    content_hash: Optional[str] = Field(None, description="Auto-generated hash of the source file content, used for cache invalidation.")
     organisation: str
     title: str
     date: str
@@ -34,5 +35,11 @@ class FrameworkFile(BaseModel):
     metadata: FrameworkMetadata
     source_notes: Optional[List[str]] = None
     structure: List[FrameworkNode]
+    # Flat node index (see framework_index.py), attached by the loader after IDs are qualified.
+    _index: Optional[Any] = PrivateAttr(default=None)
+    # BM25 index over the matchable units (see retrieval.py), attached by the loader.
+    _retrieval_index: Optional[Any] = PrivateAttr(default=None)
+    # TF-IDF node-by-feature matrix (see similarity.py), attached by the loader.
+    _similarity_matrix: Optional[Any] = PrivateAttr(default=None)
 
 FrameworkNode.model_rebuild()
\ No newline at end of file
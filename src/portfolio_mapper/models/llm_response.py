@@ -7,6 +7,7 @@
 
 from typing import List, Optional
 from pydantic import BaseModel, Field
+from pydantic.json_schema import SkipJsonSchema
 
 class AssessedCompetency(BaseModel):
     """
@@ -29,6 +30,11 @@ class AssessedCompetency(BaseModel):
         None,
         description="Constructive feedback on how to reach the next academic level for this competency."
     )
+    # Set locally after the response is validated (see similarity.py); left out of the schema sent to the LLM.
+    plausibility_score: SkipJsonSchema[Optional[float]] = Field(
+        None,
+        description="Share of the framework's nodes that match the reflection less well than this one, from 0 to 1."
+    )
 
 class LLMAnalysisResult(BaseModel):
     """
@@ -40,3 +46,12 @@ class LLMAnalysisResult(BaseModel):
     assessed_competencies: List[AssessedCompetency] = Field(
         description="A list of all competencies found to be evidenced in the reflection."
     )
+    # Set locally when the response is repaired (see response_repair.py); left out of the schema sent to the LLM.
+    response_truncated: SkipJsonSchema[bool] = Field(
+        False,
+        description="Whether the response was cut off and closed locally, losing any competencies after the cut."
+    )
+    competencies_dropped: SkipJsonSchema[int] = Field(
+        0,
+        description="How many of the returned competencies were dropped because they could not be repaired."
+    )
@@ -0,0 +1,190 @@
+# src/portfolio_mapper/pii_screen.py
+
+# Copyright (c) Adrian Robinson 2025
+# This software is dual-licensed under the MIT License (for NHS use only)
+# and a Commercial License (for other use).
+# For commercial licensing inquiries, please contact adrian.j.robinson@gmail.com
+
+"""
+This module finds the PII categories that have a fixed shape locally, with
+compiled patterns and validators: NHS numbers (with their mod-11 check
+digit), UK phone numbers, email addresses and explicit dates (a 2-digit
+year only with slashes, e.g. 12/03/24, not 4.1.10). It runs in
+microseconds, so the app can show its findings as the reflection is edited,
+without calling the API.
+
+The safety check still runs for distress and for the categories a pattern
+cannot find (names, locations). Its PII detections are then combined with
+the local ones according to the `local_pii_screen` setting:
+
+- "merge": both sets are shown; the same text is only listed once.
+- "local_categories": the local engine alone decides phone numbers and
+  email addresses, and the AI's detections in those categories are dropped.
+  NHS numbers and dates are not among them: the AI also flags MRNs,
+  hospital numbers and relative dates ("last Tuesday"), which no pattern
+  here finds, so its detections in those categories are always kept.
+"""
+import re
+from bisect import bisect_left
+from datetime import date
+from typing import Callable, Iterable, List, Optional, Pattern, Tuple
+
+from .models.safety import PiiDetection, PiiFlag, SafetyAnalysis
+
+# The categories the local engine is responsible for in "local_categories" mode.
+LOCALLY_SCREENED_FLAGS = frozenset({PiiFlag.PHONE_NUMBER, PiiFlag.EMAIL_ADDRESS})
+
+_MONTHS = {
+    name: number
+    for number, names in enumerate([
+        ("january", "jan"), ("february", "feb"), ("march", "mar"), ("april", "apr"), ("may",), ("june", "jun"),
+        ("july", "jul"), ("august", "aug"), ("september", "sep", "sept"), ("october", "oct"),
+        ("november", "nov"), ("december", "dec"),
+    ], start=1)
+    for name in names
+}
+# Capitalised or upper case only, so that e.g. "3 may need" is not read as 3 May.
+_MONTH = "(?:" + "|".join(
+    form for name in sorted(_MONTHS, key=len, reverse=True) for form in (name.capitalize(), name.upper())
+) + ")"
+_ORDINAL = r"(?:st|nd|rd|th)?"
+
+# Where a pattern starts with a digit, the lookbehind follows it (e.g. "\d(?<![\w-]\d)"
+# rather than "(?<![\w-])\d"), which lets the regex engine skip straight to digits.
+NHS_NUMBER_PATTERN = re.compile(r"\d(?<![\w-]\d)\d{2}[ -]?\d{3}[ -]?\d{4}(?![\w-])")
+PHONE_PATTERN = re.compile(r"(?<![\w+])(?:\+44\s?(?:\(0\)\s?)?|\(?0)\d{2,4}\)?(?:[\s-]?\d){6,8}(?![\w-])")
+EMAIL_PATTERN = re.compile(r"(?<![\w.+-])[\w.+-]+@[a-z0-9-]+(?:\.[a-z0-9-]+)*\.[a-z]{2,}(?![\w-])", re.IGNORECASE)
+# A full stop may end the sentence after a date, but not continue a number ("4.1.10.2").
+NUMERIC_DATE_PATTERN = re.compile(r"(\d(?<![\w/.-]\d)\d?)([/.-])(\d{1,2})\2(\d{2}|\d{4})(?![\w/-]|\.\d)")
+ISO_DATE_PATTERN = re.compile(r"(\d(?<![\w-]\d)\d{3})-(\d{2})-(\d{2})(?![\w-])")
+DAY_MONTH_PATTERN = re.compile(
+    rf"(\d(?<!\w\d)\d?){_ORDINAL}\s+(?:of\s+)?({_MONTH})(?:,?\s+(\d{{4}}))?(?![\w-])"
+)
+MONTH_DAY_PATTERN = re.compile(
+    rf"\b({_MONTH})\s+(\d{{1,2}}){_ORDINAL}(?:,?\s+(\d{{4}}))?(?![\w-])"
+)
+
+def _digits(text: str) -> str:
+    return "".join(c for c in text if c.isdigit())
+
+def is_valid_nhs_number(text: str) -> bool:
+    """
+    Checks the mod-11 check digit of a 10-digit NHS number: the first nine
+    digits are weighted 10 down to 2, and 11 minus the sum modulo 11 (with 11
+    read as 0) must equal the last digit. A result of 10 is never valid.
+    """
+    digits = _digits(text)
+    if len(digits) != 10:
+        return False
+    check = 11 - sum(int(d) * w for d, w in zip(digits, range(10, 1, -1))) % 11
+    check = 0 if check == 11 else check
+    return check != 10 and check == int(digits[9])
+
+def _uk_phone_kind(text: str) -> Optional[str]:
+    """Returns 'mobile' or 'landline' for a plausible UK number, or None."""
+    digits = _digits(text)
+    if text.lstrip().startswith("+"):
+        if not digits.startswith("44"):
+            return None
+        digits = "0" + digits[2:]
+        if digits.startswith("00"):  # A written "(0)" after the country code.
+            digits = digits[1:]
+    if len(digits) != 11 or digits[0] != "0" or digits[1] not in "12378":
+        return None
+    return "mobile" if digits[1] == "7" else "landline"
+
+def _is_real_date(year: int, month: int, day: int) -> bool:
+    try:
+        date(year, month, day)
+        return True
+    except ValueError:
+        return False
+
+def _numeric_date_is_valid(match: re.Match) -> bool:
+    first, separator, second, year = int(match.group(1)), match.group(2), int(match.group(3)), match.group(4)
+    if len(year) == 2 and separator != "/":
+        # "4.1.10" and "1-2-24" are far more often section numbers or scores than dates.
+        return False
+    year = int(year) + (2000 if len(year) == 2 else 0)
+    # UK order first, but a US-style date is still a date.
+    return _is_real_date(year, second, first) or _is_real_date(year, first, second)
+
+def _iso_date_is_valid(match: re.Match) -> bool:
+    return _is_real_date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+
+def _day_month_is_valid(match: re.Match) -> bool:
+    month = _MONTHS[match.group(2).lower()]
+    return _is_real_date(int(match.group(3) or 2000), month, int(match.group(1)))
+
+def _month_day_is_valid(match: re.Match) -> bool:
+    month = _MONTHS[match.group(1).lower()]
+    return _is_real_date(int(match.group(3) or 2000), month, int(match.group(2)))
+
+_DIGIT = re.compile(r"\d")
+
+# Checked in order; a later rule never flags text overlapping an earlier match.
+# Each rule is (flag, needs, pattern, explain): the rule is skipped unless the
+# text contains `needs` ("@", or "0" for any digit), which makes most clean text cheap.
+_RULES: List[Tuple[PiiFlag, str, Pattern, Callable[[re.Match], Optional[str]]]] = [
+    (PiiFlag.EMAIL_ADDRESS, "@", EMAIL_PATTERN, lambda m: "This looks like an email address."),
+    (PiiFlag.NHS_OR_MRN_NUMBER, "0", NHS_NUMBER_PATTERN,
+     lambda m: "This is a valid NHS number (its check digit matches)." if is_valid_nhs_number(m.group()) else None),
+    (PiiFlag.PHONE_NUMBER, "0", PHONE_PATTERN,
+     lambda m: f"This looks like a UK {kind} phone number." if (kind := _uk_phone_kind(m.group())) else None),
+    (PiiFlag.SPECIFIC_DATE, "0", ISO_DATE_PATTERN,
+     lambda m: "This looks like a specific date." if _iso_date_is_valid(m) else None),
+    (PiiFlag.SPECIFIC_DATE, "0", NUMERIC_DATE_PATTERN,
+     lambda m: "This looks like a specific date." if _numeric_date_is_valid(m) else None),
+    (PiiFlag.SPECIFIC_DATE, "0", DAY_MONTH_PATTERN,
+     lambda m: "This looks like a specific date." if _day_month_is_valid(m) else None),
+    (PiiFlag.SPECIFIC_DATE, "0", MONTH_DAY_PATTERN,
+     lambda m: "This looks like a specific date." if _month_day_is_valid(m) else None),
+]
+
+def screen_pii(text: str) -> List[PiiDetection]:
+    """Returns the PII found by the local patterns, in order of appearance, each distinct text once."""
+    # Claimed spans, kept sorted and non-overlapping, with the detection found in each.
+    starts: List[int] = []
+    ends: List[int] = []
+    detections: List[PiiDetection] = []
+    present = {"@": "@" in text, "0": _DIGIT.search(text) is not None}
+    for flag, needs, pattern, explain in _RULES:
+        if not present[needs]:
+            continue
+        for match in pattern.finditer(text):
+            start, end = match.span()
+            i = bisect_left(starts, start)
+            if (i > 0 and ends[i - 1] > start) or (i < len(starts) and starts[i] < end):
+                continue
+            explanation = explain(match)
+            if explanation:
+                starts.insert(i, start)
+                ends.insert(i, end)
+                detections.insert(i, PiiDetection(flag=flag, text=match.group(), explanation=explanation))
+    return _deduplicate(detections)
+
+def _normalise(text: str) -> str:
+    return "".join(c for c in text.lower() if c.isalnum())
+
+def _deduplicate(detections: Iterable[PiiDetection]) -> List[PiiDetection]:
+    seen = set()
+    unique = []
+    for detection in detections:
+        key = _normalise(detection.text)
+        if key not in seen:
+            seen.add(key)
+            unique.append(detection)
+    return unique
+
+def apply_local_pii_screen(safety: SafetyAnalysis, text: str, mode: str) -> SafetyAnalysis:
+    """
+    Returns a copy of the safety result with the local detections combined
+    with the AI's according to `mode` ("off", "merge" or "local_categories").
+    Local detections come first; text flagged by both is listed once.
+    """
+    if mode == "off":
+        return safety
+    llm_detections = safety.pii_detections
+    if mode == "local_categories":
+        llm_detections = [d for d in llm_detections if d.flag not in LOCALLY_SCREENED_FLAGS]
+    return safety.model_copy(update={"pii_detections": _deduplicate([*screen_pii(text), *llm_detections])})
@@ -0,0 +1,331 @@
+# src/portfolio_mapper/portfolio_export.py
+
+# Copyright (c) Adrian Robinson 2025
+# This software is dual-licensed under the MIT License (for NHS use only)
+# and a Commercial License (for other use).
+# For commercial licensing inquiries, please contact adrian.j.robinson@gmail.com
+
+"""
+Exports many stored analyses as one portfolio: a combined PDF with a
+coverage summary and a section per framework, a CSV with one row per
+assessed competency, and a JSONL file with one line per analysis.
+
+Everything is written incrementally, so memory stays flat however many
+analyses there are. Analyses are read one at a time, the CSV and JSONL rows
+are written as they arrive, and competencies are spooled to a temporary file
+per framework until the PDF sections are written. The PDF itself goes
+straight to its output stream, and finished pages are parked on disk.
+The export functions take any writable streams, e.g. an HTTP response body;
+the command line writes files. Run from the project root:
+
+python -m src.portfolio_mapper.portfolio_export batch_results.jsonl --pdf portfolio.pdf --csv portfolio.csv
+"""
+import argparse
+import csv
+import json
+import sys
+import tempfile
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import BinaryIO, Dict, IO, Iterable, Iterator, List, Optional, Set, TextIO
+
+from pydantic import ValidationError
+
+from .framework_index import get_framework_index
+from .models.batch import BatchResult, BatchStatus
+from .models.framework import FrameworkFile
+from .models.llm_response import AssessedCompetency
+from .reporting import PDF, clean_text, write_competency
+from .snapshot import load_library
+
+CSV_COLUMNS = [
+    "Analysis ID", "Framework", "Competency ID", "Competency", "Match Strength",
+    "Achieved Level", "Justification", "Next Level Evidence",
+]
+
+def iter_completed_results(results_path: str) -> Iterator[BatchResult]:
+    """
+    Yields each completed analysis in a batch results file, one line at a
+    time. Failed and withheld items, unreadable lines and repeated ids are skipped.
+    """
+    seen_ids: Set[str] = set()
+    with open(results_path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                result = BatchResult.model_validate_json(line)
+            except ValidationError:
+                print(f"  ⚠️ [SKIPPED] Line {line_number} of '{results_path}' is not a valid result.", flush=True)
+                continue
+            if result.status != BatchStatus.COMPLETED or result.analysis is None or result.id in seen_ids:
+                continue
+            seen_ids.add(result.id)
+            yield result
+
+class _StreamBuffer:
+    """
+    Stands in for FPDF's in-memory string buffer. FPDF only appends to its
+    buffer and asks for its length (for object offsets), so this writes the
+    document straight to a binary stream and counts the bytes instead.
+    """
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+        self.size = 0
+
+    def __iadd__(self, text: str) -> "_StreamBuffer":
+        data = text.encode('latin-1')
+        self.stream.write(data)
+        self.size += len(data)
+        return self
+
+    def __len__(self) -> int:
+        return self.size
+
+class _SpilledPages(dict):
+    """FPDF's page store, with each finished page moved to a temporary file until the document is written."""
+
+    def __init__(self, spill_file: IO[bytes]):
+        super().__init__()
+        self._spill_file = spill_file
+        self._locations: Dict[int, tuple] = {}
+
+    def spill(self, page: int) -> None:
+        data = dict.__getitem__(self, page).encode('latin-1')
+        self._spill_file.seek(0, 2)
+        self._locations[page] = (self._spill_file.tell(), len(data))
+        self._spill_file.write(data)
+        dict.__setitem__(self, page, '')
+
+    def __getitem__(self, page: int) -> str:
+        if page in self._locations:
+            offset, length = self._locations[page]
+            self._spill_file.seek(offset)
+            return self._spill_file.read(length).decode('latin-1')
+        return dict.__getitem__(self, page)
+
+class StreamingPDF(PDF):
+    """A report PDF written to `stream` as it is finished, holding at most one page in memory."""
+
+    def __init__(self, stream: BinaryIO, spill_file: IO[bytes]):
+        super().__init__()
+        self.buffer = _StreamBuffer(stream)
+        self.pages = _SpilledPages(spill_file)
+
+    def _endpage(self):
+        super()._endpage()
+        self.pages.spill(self.page)
+
+@dataclass
+class FrameworkCoverage:
+    """Running totals for one framework across the exported analyses."""
+    framework_code: str
+    matches: int = 0
+    analyses: int = 0
+    competency_counts: Counter = field(default_factory=Counter)
+
+    def covered_leaves(self, framework: FrameworkFile) -> int:
+        """
+        The number of the framework's leaf competencies evidenced at least once.
+        A matched parent node stands for all the leaves below it.
+        """
+        index = get_framework_index(framework)
+        covered = set()
+        for competency_id in self.competency_counts:
+            i = index.index_of_display_id(competency_id)
+            if i is None:
+                continue
+            covered.update([i] if index.is_leaf[i] else index.descendant_leaf_indices(i))
+        return len(covered)
+
+@dataclass
+class PortfolioSummary:
+    analyses: int = 0
+    matches: int = 0
+    frameworks: Dict[str, FrameworkCoverage] = field(default_factory=dict)
+
+def _framework_title(framework_code: str, framework_library: Dict[str, FrameworkFile]) -> str:
+    if framework := framework_library.get(framework_code):
+        return f"{framework.metadata.abbreviation}: {framework.metadata.title}"
+    return framework_code
+
+def _csv_row(result_id: str, competency: AssessedCompetency, framework_library: Dict[str, FrameworkFile]) -> List:
+    framework = framework_library.get(competency.framework_code)
+    return [
+        result_id,
+        framework.metadata.abbreviation if framework else competency.framework_code,
+        competency.competency_id,
+        competency.competency_text,
+        competency.match_strength,
+        competency.achieved_level,
+        competency.justification_for_level,
+        competency.emerging_evidence_for_next_level or "",
+    ]
+
+def export_portfolio(
+    results: Iterable[BatchResult],
+    framework_library: Dict[str, FrameworkFile],
+    pdf_stream: Optional[BinaryIO] = None,
+    csv_stream: Optional[TextIO] = None,
+    jsonl_stream: Optional[TextIO] = None,
+) -> PortfolioSummary:
+    """
+    Writes the completed analyses in `results` to whichever of the PDF, CSV
+    and JSONL streams are given, and returns the coverage totals. `results`
+    is consumed once, so it can be a generator over a file of any size.
+    """
+    summary = PortfolioSummary()
+    csv_writer = csv.writer(csv_stream) if csv_stream else None
+    if csv_writer:
+        csv_writer.writerow(CSV_COLUMNS)
+
+    with tempfile.TemporaryDirectory(prefix="portfolio_export_") as spool_dir:
+        # One spool file per framework, plus one for the analysis summaries.
+        sections: Dict[str, TextIO] = {}
+        summaries = open(f"{spool_dir}/summaries.jsonl", "w+", encoding="utf-8") if pdf_stream else None
+        try:
+            for result in results:
+                analysis = result.analysis
+                summary.analyses += 1
+                if jsonl_stream:
+                    jsonl_stream.write(json.dumps({
+                        "id": result.id,
+                        "role": result.role,
+                        "academic_level": result.academic_level.value if result.academic_level else None,
+                        "frameworks": result.frameworks,
+                        "completed_at": result.completed_at,
+                        **analysis.model_dump(mode="json"),
+                    }) + "\n")
+                if summaries:
+                    summaries.write(json.dumps([result.id, analysis.overall_summary]) + "\n")
+
+                for framework_code in {c.framework_code for c in analysis.assessed_competencies}:
+                    coverage = summary.frameworks.setdefault(framework_code, FrameworkCoverage(framework_code))
+                    coverage.analyses += 1
+                for competency in analysis.assessed_competencies:
+                    summary.matches += 1
+                    coverage = summary.frameworks[competency.framework_code]
+                    coverage.matches += 1
+                    coverage.competency_counts[competency.competency_id] += 1
+                    if csv_writer:
+                        csv_writer.writerow(_csv_row(result.id, competency, framework_library))
+                    if pdf_stream:
+                        if competency.framework_code not in sections:
+                            sections[competency.framework_code] = open(
+                                f"{spool_dir}/section_{len(sections)}.jsonl", "w+", encoding="utf-8"
+                            )
+                        sections[competency.framework_code].write(
+                            json.dumps([result.id, competency.model_dump(mode="json")]) + "\n"
+                        )
+
+            if pdf_stream:
+                with open(f"{spool_dir}/pages.bin", "w+b") as spill_file:
+                    _write_portfolio_pdf(StreamingPDF(pdf_stream, spill_file), summary, sections, summaries, framework_library)
+        finally:
+            for spool in [*sections.values(), summaries]:
+                if spool:
+                    spool.close()
+    return summary
+
+def _write_coverage_summary(pdf: PDF, summary: PortfolioSummary, framework_library: Dict[str, FrameworkFile]) -> None:
+    pdf.set_font('Arial', 'B', 14)
+    pdf.cell(0, 10, 'Portfolio Summary', 0, 1)
+    pdf.set_font('Arial', '', 10)
+    pdf.multi_cell(0, 5, f"{summary.analyses} analyses with {summary.matches} competency matches across {len(summary.frameworks)} frameworks.")
+    pdf.ln(5)
+
+    pdf.set_font('Arial', 'B', 12)
+    pdf.cell(0, 10, 'Framework Coverage', 0, 1)
+    for framework_code in sorted(summary.frameworks):
+        coverage = summary.frameworks[framework_code]
+        pdf.set_font('Arial', 'B', 10)
+        pdf.multi_cell(0, 5, clean_text(_framework_title(framework_code, framework_library)))
+        pdf.set_font('Arial', '', 9)
+        line = f"{coverage.matches} matches in {coverage.analyses} analyses; {len(coverage.competency_counts)} distinct competencies evidenced"
+        if framework := framework_library.get(framework_code):
+            total = len(get_framework_index(framework).leaf_indices())
+            covered = coverage.covered_leaves(framework)
+            line += f", covering {covered} of {total} competencies ({covered / total:.0%})" if total else ""
+        pdf.multi_cell(0, 5, line + ".")
+        most_evidenced = ", ".join(f"{cid} ({n})" for cid, n in coverage.competency_counts.most_common(5))
+        pdf.multi_cell(0, 5, clean_text(f"Most evidenced: {most_evidenced}"))
+        pdf.ln(4)
+
+def _write_portfolio_pdf(
+    pdf: PDF,
+    summary: PortfolioSummary,
+    sections: Dict[str, TextIO],
+    summaries: TextIO,
+    framework_library: Dict[str, FrameworkFile],
+) -> None:
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+    _write_coverage_summary(pdf, summary, framework_library)
+
+    # --- One section per framework, read back from its spool file ---
+    for framework_code in sorted(sections):
+        spool = sections[framework_code]
+        spool.seek(0)
+        framework_title = clean_text(_framework_title(framework_code, framework_library))
+        pdf.add_page()
+        pdf.set_font('Arial', 'B', 12)
+        pdf.multi_cell(0, 6, framework_title, 0, 'L')
+        pdf.ln(2)
+        for line in spool:
+            result_id, competency_dict = json.loads(line)
+            # Heuristic check for page break before adding a new item, as in the single report.
+            if pdf.get_y() > (pdf.page_break_trigger - 50):
+                pdf.add_page()
+                pdf.set_font('Arial', 'B', 11)
+                pdf.multi_cell(0, 6, f"{framework_title} (continued)", 0, 'L')
+                pdf.ln(2)
+            pdf.set_font('Arial', 'I', 8)
+            pdf.cell(0, 5, clean_text(f"Analysis {result_id}"), 0, 1)
+            write_competency(pdf, AssessedCompetency.model_validate(competency_dict))
+
+    # --- The overall summary of each analysis ---
+    pdf.add_page()
+    pdf.set_font('Arial', 'B', 12)
+    pdf.cell(0, 10, 'Analysis Summaries', 0, 1)
+    summaries.seek(0)
+    for line in summaries:
+        result_id, overall_summary = json.loads(line)
+        pdf.set_font('Arial', 'B', 10)
+        pdf.multi_cell(0, 5, clean_text(f"Analysis {result_id}"))
+        pdf.set_font('Arial', '', 9)
+        pdf.multi_cell(0, 5, clean_text(overall_summary))
+        pdf.ln(4)
+    pdf.close()
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.portfolio_mapper.portfolio_export",
+        description="Export the completed analyses in a batch results file as one portfolio."
+    )
+    parser.add_argument("results", help="A JSONL results file written by the batch CLI.")
+    parser.add_argument("--pdf", help="Write the combined PDF report here.")
+    parser.add_argument("--csv", help="Write one CSV row per assessed competency here.")
+    parser.add_argument("--jsonl", help="Write one JSON line per analysis here.")
+    parser.add_argument("--frameworks-dir", default="frameworks/")
+    parser.add_argument("--config-dir", default="config/")
+    args = parser.parse_args(argv)
+
+    if not (args.pdf or args.csv or args.jsonl):
+        parser.error("choose at least one of --pdf, --csv and --jsonl")
+
+    framework_library, _ = load_library(args.frameworks_dir, args.config_dir)
+    pdf_file = open(args.pdf, "wb") if args.pdf else None
+    csv_file = open(args.csv, "w", encoding="utf-8", newline="") if args.csv else None
+    jsonl_file = open(args.jsonl, "w", encoding="utf-8") if args.jsonl else None
+    try:
+        summary = export_portfolio(iter_completed_results(args.results), framework_library, pdf_file, csv_file, jsonl_file)
+    finally:
+        for f in (pdf_file, csv_file, jsonl_file):
+            if f:
+                f.close()
+
+    print(f"--- Exported {summary.analyses} analyses with {summary.matches} competency matches ---", flush=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
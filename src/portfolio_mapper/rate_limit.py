@@ -0,0 +1,181 @@
+# src/portfolio_mapper/rate_limit.py
+
+# Copyright (c) Adrian Robinson 2025
+# This software is dual-licensed under the MIT License (for NHS use only)
+# and a Commercial License (for other use).
+# For commercial licensing inquiries, please contact adrian.j.robinson@gmail.com
+
+"""
+This module throttles and retries Gemini API calls for the whole process.
+
+A token bucket per quota (requests per minute and tokens per minute) spaces
+calls out before they hit the API's limits, so concurrent sessions queue up
+instead of all failing with ResourceExhausted at once. Calls that still fail
+with a retryable error are retried with jittered exponential backoff, all
+within a per-call deadline. A daily quota is the exception: no backoff
+within the deadline outlasts it, so that error is raised at once.
+"""
+import random
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from google.api_core import exceptions as google_exceptions
+
+T = TypeVar("T")
+
+# Errors that mean "try again later", as opposed to a bad request.
+RETRYABLE_EXCEPTIONS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+)
+
+# Matches the per-day quota ids in a 429's details, e.g. "GenerateRequestsPerDayPerProjectPerModel-FreeTier".
+_PER_DAY_QUOTA = re.compile(r"per[\s_-]?day", re.IGNORECASE)
+
+def is_daily_quota_error(error: Exception) -> bool:
+    """Returns True for a quota error (429) whose details or message name a per-day limit."""
+    if not isinstance(error, google_exceptions.TooManyRequests):
+        return False
+    details = getattr(error, "details", None) or []
+    return any(_PER_DAY_QUOTA.search(str(text)) for text in [*details, getattr(error, "message", error)])
+
+class CallDeadlineExceeded(TimeoutError):
+    """Raised when a call cannot complete, including throttling and retries, within its deadline."""
+
+class TokenBucket:
+    """
+    A bucket holding up to `capacity` units, refilled continuously at
+    `capacity` units per minute. Acquiring reserves units immediately and
+    returns how long the caller must wait for them, so waiting callers are
+    served in arrival order.
+    """
+    def __init__(self, capacity: float):
+        self.capacity = capacity
+        self.refill_per_second = capacity / 60.0
+        self._available = capacity
+        self._updated_at = time.monotonic()
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Takes `amount` units, possibly going into debt, and returns the wait until they are covered."""
+        self._available = min(self.capacity, self._available + (now - self._updated_at) * self.refill_per_second)
+        self._updated_at = now
+        self._available -= min(amount, self.capacity)
+        return max(0.0, -self._available / self.refill_per_second)
+
+    def wait_for(self, amount: float, now: float) -> float:
+        """Returns the wait `reserve` would impose, without taking anything."""
+        available = min(self.capacity, self._available + (now - self._updated_at) * self.refill_per_second)
+        shortfall = min(amount, self.capacity) - available
+        return max(0.0, shortfall / self.refill_per_second)
+
+class RateLimiter:
+    """Shared request and token buckets. A limit of None leaves that quota unthrottled."""
+
+    def __init__(self, requests_per_minute: Optional[int], tokens_per_minute: Optional[int]):
+        self._request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int, deadline: float) -> float:
+        """
+        Blocks until one request and `tokens` tokens are available and returns
+        the time waited. Raises CallDeadlineExceeded, without taking anything,
+        if the wait would run past `deadline` (a time.monotonic() value).
+        """
+        buckets = [(b, 1) for b in [self._request_bucket] if b] + [(b, tokens) for b in [self._token_bucket] if b]
+        with self._lock:
+            now = time.monotonic()
+            wait = max((bucket.wait_for(amount, now) for bucket, amount in buckets), default=0.0)
+            if now + wait > deadline:
+                raise CallDeadlineExceeded(f"Rate limit wait of {wait:.1f}s exceeds the call deadline.")
+            for bucket, amount in buckets:
+                bucket.reserve(amount, now)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+class ApiCallGuard:
+    """
+    Runs API calls through the shared rate limiter and retries retryable
+    errors, except daily-quota errors, with full-jitter exponential backoff,
+    all within `deadline_seconds` per call. Counters are kept for logging and
+    scraping via `stats()`.
+    """
+    def __init__(
+        self,
+        rate_limiter: Optional[RateLimiter],
+        max_attempts: int,
+        initial_backoff_seconds: float,
+        max_backoff_seconds: float,
+        deadline_seconds: float,
+    ):
+        self.rate_limiter = rate_limiter
+        self.max_attempts = max_attempts
+        self.initial_backoff_seconds = initial_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.deadline_seconds = deadline_seconds
+        self._lock = threading.Lock()
+        self._counters = {
+            "calls": 0,
+            "throttled_calls": 0,
+            "throttle_wait_seconds": 0.0,
+            "retries": 0,
+            "retries_exhausted": 0,
+            "daily_quota_errors": 0,
+            "deadlines_exceeded": 0,
+        }
+
+    def _count(self, name: str, amount: float = 1) -> None:
+        with self._lock:
+            self._counters[name] += amount
+
+    def call(self, request: Callable[[float], T], estimated_tokens: int, can_retry: Callable[[], bool] = lambda: True) -> T:
+        """
+        Calls `request(timeout)`, where `timeout` is the time left before the
+        deadline. `can_retry` is asked before each retry, e.g. so that a stream
+        that has already delivered results is not repeated.
+        """
+        self._count("calls")
+        deadline = time.monotonic() + self.deadline_seconds
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                if self.rate_limiter:
+                    waited = self.rate_limiter.acquire(estimated_tokens, deadline)
+                    if waited > 0:
+                        self._count("throttled_calls")
+                        self._count("throttle_wait_seconds", waited)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise CallDeadlineExceeded(f"No time left for attempt {attempt} within the {self.deadline_seconds:.0f}s deadline.")
+                return request(remaining)
+            except CallDeadlineExceeded:
+                self._count("deadlines_exceeded")
+                raise
+            except RETRYABLE_EXCEPTIONS as e:
+                if is_daily_quota_error(e):
+                    self._count("daily_quota_errors")
+                    raise
+                if attempt >= self.max_attempts or not can_retry():
+                    self._count("retries_exhausted")
+                    raise
+                backoff = random.uniform(0, min(self.max_backoff_seconds, self.initial_backoff_seconds * 2 ** (attempt - 1)))
+                if time.monotonic() + backoff >= deadline:
+                    self._count("deadlines_exceeded")
+                    raise CallDeadlineExceeded(f"Gave up after {attempt} attempts within the {self.deadline_seconds:.0f}s deadline.") from e
+                print(f"--- {type(e).__name__} on attempt {attempt}; retrying in {backoff:.1f}s ---", flush=True)
+                self._count("retries")
+                time.sleep(backoff)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns a snapshot of the throttle and retry counters, suitable for logging or scraping."""
+        with self._lock:
+            stats = dict(self._counters)
+        stats["throttle_wait_seconds"] = round(stats["throttle_wait_seconds"], 3)
+        return {"name": "gemini_calls", **stats}
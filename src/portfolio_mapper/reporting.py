@@ -9,12 +9,14 @@
 This module is responsible for generating downloadable reports,
 such as PDFs and CSVs, from the analysis results.
 """
+import json
 from collections import defaultdict
 from datetime import datetime
 from typing import Dict
 from fpdf import FPDF
 
-from .models.llm_response import LLMAnalysisResult
+from .caching import content_hash
+from .models.llm_response import AssessedCompetency, LLMAnalysisResult
 from .models.framework import FrameworkFile
 
 class PDF(FPDF):
@@ -30,6 +32,58 @@ class PDF(FPDF):
         timestamp = datetime.now().strftime("%d-%m-%Y at %H:%M")
         self.cell(0, 10, f'Page {self.page_no()} - generated on {timestamp}', 0, 0, 'C')
 
+def clean_text(text: str) -> str:
+    """Encodes text to latin-1, replacing unsupported characters."""
+    return text.encode('latin-1', 'replace').decode('latin-1')
+
+def write_competency(pdf: FPDF, competency: AssessedCompetency) -> None:
+    """Writes one assessed competency: its text, level, justification and next-level evidence."""
+    # Competency ID and Text
+    pdf.set_font('Arial', 'B', 10)
+    pdf.multi_cell(0, 5, clean_text(f"{competency.competency_id}: {competency.competency_text}"))
+
+    # Achieved Level
+    pdf.set_font('Arial', 'BI', 9) # Bold Italic
+    pdf.cell(30, 6, "Achieved Level: ")
+    pdf.set_font('Arial', '', 9)
+    pdf.multi_cell(0, 6, clean_text(competency.achieved_level))
+
+    # Justification
+    pdf.set_font('Arial', 'B', 9)
+    pdf.multi_cell(0, 5, "Justification:")
+    pdf.set_font('Arial', '', 9)
+    pdf.multi_cell(0, 5, clean_text(competency.justification_for_level))
+
+    # Next Level Evidence
+    if competency.emerging_evidence_for_next_level:
+        pdf.set_font('Arial', 'B', 9)
+        pdf.multi_cell(0, 5, "Next Level Evidence:")
+        pdf.set_font('Arial', '', 9)
+        pdf.multi_cell(0, 5, clean_text(competency.emerging_evidence_for_next_level))
+
+    pdf.ln(8) # Space between competency items
+
+def pdf_report_key(
+    analysis_result: LLMAnalysisResult,
+    available_frameworks: Dict[str, FrameworkFile],
+    reflection_text: str
+) -> str:
+    """
+    Returns a hash of everything the PDF report is built from: the result,
+    the reflection and the metadata of the frameworks it refers to.
+    """
+    framework_codes = sorted({c.framework_code for c in analysis_result.assessed_competencies})
+    framework_titles = {
+        code: [fw.metadata.abbreviation, fw.metadata.title]
+        for code in framework_codes if (fw := available_frameworks.get(code))
+    }
+    payload = json.dumps({
+        "result": analysis_result.model_dump(mode="json"),
+        "reflection": reflection_text,
+        "frameworks": framework_titles,
+    }, sort_keys=True)
+    return content_hash(payload.encode('utf-8'))
+
 def generate_pdf_report(
     analysis_result: LLMAnalysisResult,
     available_frameworks: Dict[str, FrameworkFile],
@@ -70,10 +124,6 @@ def generate_pdf_report(
         for competency in analysis_result.assessed_competencies:
             grouped_competencies[competency.framework_code].append(competency)
 
-        def clean_text(text: str) -> str:
-            """Encodes text to latin-1, replacing unsupported characters."""
-            return text.encode('latin-1', 'replace').decode('latin-1')
-
         for framework_code, competencies in grouped_competencies.items():
             # --- Framework Title ---
             if framework_obj := available_frameworks.get(framework_code):
@@ -96,29 +146,6 @@ def generate_pdf_report(
                         pdf.multi_cell(0, 6, f"{framework_title} (continued)", 0, 'L')
                         pdf.ln(2)
 
-                # Competency ID and Text
-                pdf.set_font('Arial', 'B', 10)
-                pdf.multi_cell(0, 5, clean_text(f"{competency.competency_id}: {competency.competency_text}"))
-
-                # Achieved Level
-                pdf.set_font('Arial', 'BI', 9) # Bold Italic
-                pdf.cell(30, 6, "Achieved Level: ")
-                pdf.set_font('Arial', '', 9)
-                pdf.multi_cell(0, 6, clean_text(competency.achieved_level))
-
-                # Justification
-                pdf.set_font('Arial', 'B', 9)
-                pdf.multi_cell(0, 5, "Justification:")
-                pdf.set_font('Arial', '', 9)
-                pdf.multi_cell(0, 5, clean_text(competency.justification_for_level))
-
-                # Next Level Evidence
-                if competency.emerging_evidence_for_next_level:
-                    pdf.set_font('Arial', 'B', 9)
-                    pdf.multi_cell(0, 5, "Next Level Evidence:")
-                    pdf.set_font('Arial', '', 9)
-                    pdf.multi_cell(0, 5, clean_text(competency.emerging_evidence_for_next_level))
-                
-                pdf.ln(8) # Space between competency items
+                write_competency(pdf, competency)
             
     return pdf.output(dest='S').encode('latin-1')
@@ -0,0 +1,187 @@
+# src/portfolio_mapper/response_cache.py
+
+# Copyright (c) Adrian Robinson 2025
+# This software is dual-licensed under the MIT License (for NHS use only)
+# and a Commercial License (for other use).
+# For commercial licensing inquiries, please contact adrian.j.robinson@gmail.com
+
+"""
+This module provides a persistent, on-disk cache of validated LLM responses.
+
+Entries are keyed by a hash of the whitespace-normalised prompt, the model
+name and the generation config. Only the validated response JSON is stored;
+the prompt is never written to disk.
+
+Safety verdicts quote the PII they found verbatim, so before one is stored
+each detection's text is replaced by its position in the normalised prompt,
+and rebuilt from the prompt on a hit (see redact_pii_detections). Analyses
+are stored as returned, including any quotes from the reflection in their
+justifications, for up to the TTL.
+"""
+import contextlib
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional, Type, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+from .models.safety import SafetyAnalysis
+
+M = TypeVar("M", bound=BaseModel)
+
+# Stored in place of a detection's text: its span in the normalised prompt, or nothing if it was not found there.
+_PII_SPAN = re.compile(r"\[pii (\d+):(\d+)\]")
+PII_NOT_STORED = "[not stored]"
+
+def normalise_prompt(prompt: str) -> str:
+    return " ".join(prompt.split())
+
+def redact_pii_detections(safety: SafetyAnalysis, prompt: str) -> SafetyAnalysis:
+    """Returns a copy of the verdict whose PII texts are replaced by their spans in `prompt`, for storage."""
+    normalised = normalise_prompt(prompt)
+    detections = []
+    for detection in safety.pii_detections:
+        start = normalised.find(normalise_prompt(detection.text))
+        redacted = f"[pii {start}:{start + len(normalise_prompt(detection.text))}]" if start >= 0 else PII_NOT_STORED
+        detections.append(detection.model_copy(update={"text": redacted}))
+    return safety.model_copy(update={"pii_detections": detections})
+
+def restore_pii_detections(safety: SafetyAnalysis, prompt: str) -> SafetyAnalysis:
+    """Reverses redact_pii_detections for a verdict served for the same (normalised) prompt."""
+    normalised = normalise_prompt(prompt)
+    detections = []
+    for detection in safety.pii_detections:
+        span = _PII_SPAN.fullmatch(detection.text)
+        text = normalised[int(span.group(1)):int(span.group(2))] if span else detection.text
+        detections.append(detection.model_copy(update={"text": text}))
+    return safety.model_copy(update={"pii_detections": detections})
+
+class ResponseCache:
+    """
+    A small SQLite-backed cache with a time-to-live and a size bound. Expired
+    entries are removed on lookup; the least recently used entries are
+    evicted once `max_entries` is exceeded.
+    """
+    def __init__(self, path: str, ttl_seconds: float, max_entries: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " response_type TEXT NOT NULL,"
+                " response_json TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " last_accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_last_accessed ON responses (last_accessed_at)")
+
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Opens a short-lived connection, committing on success. One per operation keeps the cache thread-safe."""
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(prompt: str, model_name: str, generation_config: Dict[str, Any], response_type: Type[BaseModel]) -> str:
+        """Builds the cache key. Whitespace differences in the prompt do not change the key."""
+        normalised_prompt = normalise_prompt(prompt)
+        payload = json.dumps({
+            "response_type": response_type.__name__,
+            "model_name": model_name,
+            "generation_config": generation_config,
+            "prompt": normalised_prompt,
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str, response_type: Type[M]) -> Optional[M]:
+        """Returns the cached, re-validated response, or None on a miss or expiry."""
+        now = time.time()
+        try:
+            with self._lock, self._connect() as conn:
+                row = conn.execute(
+                    "SELECT response_json, created_at FROM responses WHERE key = ? AND response_type = ?",
+                    (key, response_type.__name__)
+                ).fetchone()
+                if row is None or now - row[1] > self.ttl_seconds:
+                    if row is not None:
+                        conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self.misses += 1
+                    return None
+                conn.execute("UPDATE responses SET last_accessed_at = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            # A cache failure must never break an analysis; treat it as a miss.
+            print(f"Response Cache Error: lookup failed. Reason: {e}", flush=True)
+            return None
+
+        try:
+            result = response_type.model_validate_json(row[0])
+        except ValidationError:
+            # The model has changed shape since this entry was written.
+            self.discard(key)
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return result
+
+    def put(self, key: str, response: BaseModel) -> None:
+        """Stores a validated response and enforces the TTL and size bound."""
+        now = time.time()
+        try:
+            with self._lock, self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, response_type, response_json, created_at, last_accessed_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (key, type(response).__name__, response.model_dump_json(), now, now)
+                )
+                conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+                overflow = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+                if overflow > 0:
+                    conn.execute(
+                        "DELETE FROM responses WHERE key IN"
+                        " (SELECT key FROM responses ORDER BY last_accessed_at ASC LIMIT ?)",
+                        (overflow,)
+                    )
+                    self.evictions += overflow
+        except sqlite3.Error as e:
+            print(f"Response Cache Error: store failed. Reason: {e}", flush=True)
+
+    def discard(self, key: str) -> None:
+        try:
+            with self._lock, self._connect() as conn:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            print(f"Response Cache Error: discard failed. Reason: {e}", flush=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns a snapshot of the cache counters, suitable for logging or scraping."""
+        with self._lock, self._connect() as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "name": "llm_responses",
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,282 @@
+# src/portfolio_mapper/response_repair.py
+
+# Copyright (c) Adrian Robinson 2025
+# This software is dual-licensed under the MIT License (for NHS use only)
+# and a Commercial License (for other use).
+# For commercial licensing inquiries, please contact adrian.j.robinson@gmail.com
+
+"""
+This module turns analysis responses that fail strict validation into usable
+results where it safely can, instead of losing the whole analysis:
+
+- JSON recovery: text around the object (e.g. markdown fences) is ignored,
+  trailing commas are removed, and a truncated response is cut back to its
+  last complete competency and closed.
+- Per-item repair: each competency is validated on its own. Match strengths
+  are coerced to whole numbers and clamped to 1-5, and items that still do
+  not validate are dropped rather than failing the response.
+- ID correction: framework codes and competency ids are checked against the
+  selected frameworks. Fully qualified ids become display ids, a framework
+  given by abbreviation or in the wrong case is corrected, and items that do
+  not map to a node are dropped.
+
+The result's response_truncated and competencies_dropped fields say when
+competencies were lost, so callers can warn and avoid caching the result.
+The counters in RepairStats show how often each step applied, and how many
+responses would otherwise have failed but still kept at least one competency
+(the retries saved).
+"""
+import json
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from .logic import find_competency_node
+from .models.framework import FrameworkFile
+from .models.llm_response import AssessedCompetency, LLMAnalysisResult
+
+class RepairStats:
+    """Thread-safe counters for the repair stage, shared by all calls that use it."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = Counter({
+            "responses": 0,
+            "valid_as_sent": 0,
+            "retries_saved": 0,
+            "emptied": 0,
+            "unrecoverable": 0,
+            "json_recovered": 0,
+            "truncated": 0,
+            "competencies_dropped": 0,
+            "strengths_clamped": 0,
+            "ids_corrected": 0,
+            "framework_codes_corrected": 0,
+            "texts_filled": 0,
+        })
+
+    def record(self, counts: Counter) -> None:
+        with self._lock:
+            self._counters.update(counts)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns a snapshot of the repair counters, suitable for logging or scraping."""
+        with self._lock:
+            return {"name": "response_repair", **self._counters}
+
+# --- JSON recovery ---
+
+def _close_json(text: str) -> Tuple[str, bool]:
+    """
+    Removes trailing commas outside strings and, if the text ends before the
+    root object closes, cuts it back to the last completed nested object or
+    array and appends the missing closing brackets. Returns the new text and
+    whether it had to be closed.
+    """
+    out: List[str] = []
+    stack: List[str] = []
+    in_string = escaped = False
+    last_complete: Optional[Tuple[int, Tuple[str, ...]]] = None
+
+    for char in text:
+        if in_string:
+            out.append(char)
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char in '}]':
+            # Drop a comma (and the whitespace after it) left before the closing bracket.
+            end = len(out)
+            while end and out[end - 1].isspace():
+                end -= 1
+            if end and out[end - 1] == ',':
+                del out[end - 1:]
+            out.append(char)
+            if stack:
+                stack.pop()
+            if not stack:
+                return "".join(out), False
+            last_complete = (len(out), tuple(stack))
+            continue
+        out.append(char)
+        if char == '"':
+            in_string = True
+        elif char == '{':
+            stack.append('}')
+        elif char == '[':
+            stack.append(']')
+
+    if last_complete is None:
+        return "".join(out), False
+    cut, open_brackets = last_complete
+    return "".join(out[:cut]) + "".join(reversed(open_brackets)), True
+
+def recover_json(text: str, counts: Optional[Counter] = None) -> Optional[Any]:
+    """
+    Parses a JSON object from model output that is not strictly valid JSON.
+    Returns None if nothing can be recovered.
+    """
+    counts = counts if counts is not None else Counter()
+    start = text.find('{')
+    if start < 0:
+        return None
+    body = text[start:]
+    decoder = json.JSONDecoder()
+    try:
+        # raw_decode ignores anything after the object, such as a closing fence.
+        return decoder.raw_decode(body)[0]
+    except json.JSONDecodeError:
+        pass
+    closed, truncated = _close_json(body)
+    try:
+        data = decoder.raw_decode(closed)[0]
+    except json.JSONDecodeError:
+        return None
+    counts["truncated"] += truncated
+    return data
+
+# --- Per-item repair ---
+
+_ID_EDGE_JUNK = re.compile(r"^[\s(\[`'\"]+|[\s)\]`'\".,;:]+$")
+
+def _resolve_framework(
+    code: Any,
+    competency_id: str,
+    frameworks: Dict[str, FrameworkFile],
+    counts: Counter,
+) -> Optional[str]:
+    """Returns the selected framework's code for a possibly wrong `code`, or None."""
+    if isinstance(code, str):
+        if code in frameworks:
+            return code
+        wanted = code.strip().lower()
+        for candidate, framework in frameworks.items():
+            if wanted in (candidate.lower(), framework.metadata.abbreviation.lower()):
+                counts["framework_codes_corrected"] += 1
+                return candidate
+    # Otherwise, use the only selected framework that has a node with this id.
+    owners = [candidate for candidate, fw in frameworks.items() if find_competency_node(fw, competency_id)]
+    if len(owners) == 1:
+        counts["framework_codes_corrected"] += 1
+        return owners[0]
+    return None
+
+def _find_node(framework: FrameworkFile, competency_id: str):
+    node = find_competency_node(framework, competency_id)
+    if node is None:
+        cleaned = _ID_EDGE_JUNK.sub("", competency_id)
+        # The last part of a partly qualified id, e.g. "1:1.1" for "priorise_people:1:1.1".
+        node = find_competency_node(framework, cleaned) or find_competency_node(framework, cleaned.rsplit(":", 1)[-1])
+    return node
+
+def repair_competency(
+    item: Any,
+    frameworks: Optional[Dict[str, FrameworkFile]] = None,
+    counts: Optional[Counter] = None,
+) -> Optional[AssessedCompetency]:
+    """
+    Validates one competency from a response, fixing what can be fixed.
+    Without `frameworks`, ids are not checked. Returns None for an item that
+    cannot be used.
+    """
+    counts = counts if counts is not None else Counter()
+    if not isinstance(item, dict):
+        return None
+    item = dict(item)
+
+    try:
+        strength = round(float(item.get("match_strength")))
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if not 1 <= strength <= 5:
+        strength = min(5, max(1, strength))
+        counts["strengths_clamped"] += 1
+    item["match_strength"] = strength
+
+    if frameworks is not None:
+        competency_id = str(item.get("competency_id", ""))
+        framework_code = _resolve_framework(item.get("framework_code"), competency_id, frameworks, counts)
+        if framework_code is None:
+            return None
+        node = _find_node(frameworks[framework_code], competency_id)
+        if node is None:
+            return None
+        display_id = node.display_id or node.id
+        if competency_id != display_id:
+            counts["ids_corrected"] += 1
+        item["framework_code"], item["competency_id"] = framework_code, display_id
+        if not item.get("competency_text"):
+            item["competency_text"] = node.text
+            counts["texts_filled"] += 1
+
+    try:
+        return AssessedCompetency.model_validate(item)
+    except ValidationError:
+        return None
+
+def parse_analysis_response(
+    text: str,
+    frameworks: Optional[Dict[str, FrameworkFile]] = None,
+    stats: Optional[RepairStats] = None,
+) -> LLMAnalysisResult:
+    """
+    Validates an analysis response, repairing it where needed (see module
+    docstring). Raises the strict ValidationError if the response has no
+    usable summary and competency list. A result that lost competencies to
+    truncation or repair says so in response_truncated and competencies_dropped.
+    """
+    counts = Counter()
+    try:
+        strict_result = LLMAnalysisResult.model_validate_json(text)
+        strict_error = None
+        data = strict_result.model_dump()
+    except ValidationError as e:
+        strict_result, strict_error = None, e
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError:
+            data = recover_json(text, counts)
+            counts["json_recovered"] += data is not None
+
+    if (not isinstance(data, dict) or not isinstance(data.get("overall_summary"), str)
+            or not isinstance(data.get("assessed_competencies"), list)):
+        counts.update(responses=1, unrecoverable=1)
+        if stats:
+            stats.record(counts)
+        raise strict_error
+
+    if strict_result is not None and frameworks is None:
+        result = strict_result
+    else:
+        competencies = []
+        for item in data["assessed_competencies"]:
+            competency = repair_competency(item, frameworks, counts)
+            if competency is None:
+                counts["competencies_dropped"] += 1
+            else:
+                competencies.append(competency)
+        result = LLMAnalysisResult(
+            overall_summary=data["overall_summary"],
+            assessed_competencies=competencies,
+            response_truncated=counts["truncated"] > 0,
+            competencies_dropped=counts["competencies_dropped"],
+        )
+
+    if counts["competencies_dropped"] and not result.assessed_competencies:
+        # Nothing usable survived, so a retry is still needed.
+        counts["emptied"] += 1
+    elif strict_error is not None:
+        counts["retries_saved"] += 1
+    elif not counts:
+        counts["valid_as_sent"] += 1
+    counts["responses"] += 1
+    if stats:
+        stats.record(counts)
+    return result
@@ -0,0 +1,235 @@
+# src/portfolio_mapper/retrieval.py
+
+# Copyright (c) Adrian Robinson 2025
+# This software is dual-licensed under the MIT License (for NHS use only)
+# and a Commercial License (for other use).
+# For commercial licensing inquiries, please contact adrian.j.robinson@gmail.com
+
+"""
+This module shortlists the parts of a framework that a reflection is likely
+to evidence, using a BM25 index built when the framework is loaded.
+
+The index covers the framework's matchable units: leaf nodes, and collapsed
+nodes together with everything below them (which the prompt embeds as notes).
+Each unit's text, source notes and source examples are indexed. A shortlist
+is the top-K units for a reflection plus their ancestors, so the pruned
+framework keeps its shape. Recall against full-framework runs can be measured
+from a batch input and its results file, from the project root:
+
+python -m src.portfolio_mapper.retrieval sample_reflections/ batch_results.jsonl --top-k 5 10 20
+"""
+import argparse
+import math
+import re
+import sys
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .framework_index import FrameworkIndex, get_framework_index
+from .models.framework import FrameworkFile, FrameworkNode
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset("""
+    a about above after again all also am an and any are as at be been before being below between both but by can
+    could did do does doing down during each few for from further had has have having he her here hers him his how
+    i if in into is it its itself me more most my no nor not of off on once only or other our ours out over own same
+    she should so some such than that the their theirs them then there these they this those through to too under
+    until up very was we were what when where which while who whom why will with would you your yours
+""".split())
+# Longest first, so that e.g. "ations" is stripped before "s".
+_SUFFIXES = ("ations", "ation", "ments", "ment", "ness", "ings", "ing", "ies", "ied", "ed", "es", "ly", "s")
+
+def _stem(word: str) -> str:
+    """A deliberately light suffix stripper; enough to match 'communicating' with 'communication'."""
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)]
+    return word
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cases, splits into words, drops stopwords and single characters, and stems."""
+    return [_stem(word) for word in _WORD_PATTERN.findall(text.lower()) if len(word) > 1 and word not in _STOPWORDS]
+
+def node_text(node: FrameworkNode) -> str:
+    """The indexed text of a single node: its statement, source notes and source examples."""
+    return " ".join([node.text, *(node.source_notes or []), *(node.source_examples or [])])
+
+def iter_units(index: FrameworkIndex) -> Iterable[Tuple[int, range]]:
+    """
+    Yields (position, covered_positions) for each matchable unit in pre-order:
+    every leaf outside a collapsed subtree, and every collapsed node with its
+    whole subtree.
+    """
+    i = 0
+    while i < len(index):
+        node = index.nodes[i]
+        if node.collapse_children and node.children:
+            yield i, range(i, index.subtree_ends[i])
+            i = index.subtree_ends[i]
+        else:
+            if index.is_leaf[i]:
+                yield i, range(i, i + 1)
+            i += 1
+
+class RetrievalIndex:
+    """
+    A BM25 inverted index over one framework's matchable units. Postings are
+    parallel arrays of unit numbers and term frequencies.
+    """
+    __slots__ = ("unit_positions", "unit_lengths", "average_length", "postings", "idf")
+
+    def __init__(self):
+        self.unit_positions = array('i')  # FrameworkIndex position of each unit
+        self.unit_lengths = array('i')    # token count of each unit
+        self.average_length = 0.0
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.idf: Dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self.unit_positions)
+
+    def score(self, query_text: str) -> Dict[int, float]:
+        """Returns the BM25 score of every unit sharing a term with the query, keyed by unit number."""
+        scores: Dict[int, float] = {}
+        lengths, average_length = self.unit_lengths, self.average_length or 1.0
+        for term in set(tokenize(query_text)):
+            if term not in self.postings:
+                continue
+            idf = self.idf[term]
+            units, frequencies = self.postings[term]
+            for unit, tf in zip(units, frequencies):
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[unit] / average_length)
+                scores[unit] = scores.get(unit, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    def top_positions(self, query_text: str, top_k: int) -> List[int]:
+        """Returns the FrameworkIndex positions of the `top_k` best units, best first."""
+        scores = self.score(query_text)
+        best = sorted(scores, key=lambda unit: (-scores[unit], unit))[:top_k]
+        return [self.unit_positions[unit] for unit in best]
+
+def build_retrieval_index(framework: FrameworkFile) -> RetrievalIndex:
+    """Tokenises every matchable unit of the framework and builds its BM25 postings."""
+    index = get_framework_index(framework)
+    retrieval = RetrievalIndex()
+    term_units: Dict[str, Tuple[array, array]] = {}
+    for unit, (position, covered) in enumerate(iter_units(index)):
+        terms = Counter()
+        for j in covered:
+            terms.update(tokenize(node_text(index.nodes[j])))
+        retrieval.unit_positions.append(position)
+        retrieval.unit_lengths.append(sum(terms.values()))
+        for term, tf in terms.items():
+            units, frequencies = term_units.setdefault(term, (array('i'), array('i')))
+            units.append(unit)
+            frequencies.append(tf)
+
+    unit_count = len(retrieval)
+    retrieval.average_length = sum(retrieval.unit_lengths) / unit_count if unit_count else 0.0
+    retrieval.postings = term_units
+    retrieval.idf = {
+        term: math.log(1 + (unit_count - len(units) + 0.5) / (len(units) + 0.5))
+        for term, (units, _) in term_units.items()
+    }
+    return retrieval
+
+def get_retrieval_index(framework: FrameworkFile) -> RetrievalIndex:
+    """
+    Returns the retrieval index built for this framework at load time,
+    building and attaching one on first use for frameworks constructed in code.
+    """
+    if framework._retrieval_index is None:
+        framework._retrieval_index = build_retrieval_index(framework)
+    return framework._retrieval_index
+
+def shortlist_node_ids(framework: FrameworkFile, reflection_text: str, top_k: int) -> Optional[Set[str]]:
+    """
+    Returns the ids of the nodes to keep in the prompt: the `top_k` units that
+    best match the reflection, everything inside them, and their ancestors.
+    Returns None if no unit shares a term with the reflection.
+    """
+    index = get_framework_index(framework)
+    positions = get_retrieval_index(framework).top_positions(reflection_text, top_k)
+    if not positions:
+        return None
+    keep: Set[str] = set()
+    for i in positions:
+        keep.update(index.ids[j] for j in range(i, index.subtree_ends[i]))
+        keep.update(index.ids[j] for j in index.ancestor_indices(i))
+    return keep
+
+def shortlist_recall(
+    framework: FrameworkFile,
+    reflection_text: str,
+    competency_ids: Iterable[str],
+    top_k: int,
+) -> Tuple[int, int]:
+    """
+    Returns (kept, total): how many of the competencies a full-framework run
+    matched would still have been in the shortlisted prompt. Ids that do not
+    map to a node are left out of the total.
+    """
+    keep = shortlist_node_ids(framework, reflection_text, top_k)
+    index = get_framework_index(framework)
+    kept = total = 0
+    for competency_id in competency_ids:
+        i = index.index_of_display_id(competency_id)
+        if i is None:
+            i = index.index_of_id(competency_id)
+        if i is None:
+            continue
+        total += 1
+        # A framework without any shortlist is sent in full.
+        kept += keep is None or index.ids[i] in keep
+    return kept, total
+
+def main(argv: Optional[List[str]] = None) -> int:
+    # Imported here so that the app does not load the batch and export modules.
+    from .batch import iter_batch_items
+    from .portfolio_export import iter_completed_results
+    from .snapshot import load_library
+
+    parser = argparse.ArgumentParser(
+        prog="python -m src.portfolio_mapper.retrieval",
+        description="Measure how many competencies from full-framework runs a BM25 shortlist keeps."
+    )
+    parser.add_argument("input", help="The batch input: a directory of .txt reflections, or a JSONL manifest.")
+    parser.add_argument("results", help="The JSONL results of a batch run over that input with full frameworks.")
+    parser.add_argument("--top-k", type=int, nargs="+", default=[5, 10, 20], help="Shortlist sizes to measure.")
+    parser.add_argument("--frameworks-dir", default="frameworks/")
+    parser.add_argument("--config-dir", default="config/")
+    args = parser.parse_args(argv)
+
+    framework_library, _ = load_library(args.frameworks_dir, args.config_dir)
+    reflections = {item.id: item.reflection_text for item in iter_batch_items(args.input)}
+    units = sum(len(get_retrieval_index(fw)) for fw in framework_library.values())
+
+    kept = {k: 0 for k in args.top_k}
+    total = {k: 0 for k in args.top_k}
+    analyses = 0
+    for result in iter_completed_results(args.results):
+        if result.id not in reflections:
+            continue
+        analyses += 1
+        matched: Dict[str, List[str]] = {}
+        for competency in result.analysis.assessed_competencies:
+            matched.setdefault(competency.framework_code, []).append(competency.competency_id)
+        for framework_code, competency_ids in matched.items():
+            if framework := framework_library.get(framework_code):
+                for k in args.top_k:
+                    k_kept, k_total = shortlist_recall(framework, reflections[result.id], competency_ids, k)
+                    kept[k] += k_kept
+                    total[k] += k_total
+
+    print(f"--- Shortlist recall over {analyses} analyses ({units} indexed units in the library) ---")
+    for k in args.top_k:
+        recall = kept[k] / total[k] if total[k] else 0.0
+        print(f"  top-{k}: {kept[k]} of {total[k]} matched competencies kept ({recall:.1%})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+# src/portfolio_mapper/similarity.py
+
+# Copyright (c) Adrian Robinson 2025
+# This software is dual-licensed under the MIT License (for NHS use only)
+# and a Commercial License (for other use).
+# For commercial licensing inquiries, please contact adrian.j.robinson@gmail.com
+
+"""
+This module gives a cheap, local signal of how well a reflection matches each
+node of a framework: the cosine similarity of their TF-IDF vectors over
+hashed word unigrams and bigrams.
+
+Each framework gets a sparse node-by-feature matrix when it is loaded, held
+as flat NumPy arrays. Scoring a reflection against every node is one sparse
+matrix-vector product. The scores are used to order the frameworks in the
+analysis prompt and to attach a plausibility score to each competency the
+AI returns, so that matches with little support in the text stand out.
+"""
+import zlib
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from .framework_index import get_framework_index
+from .models.framework import FrameworkFile
+from .models.llm_response import LLMAnalysisResult
+from .retrieval import node_text, tokenize
+
+def _feature_hashes(text: str) -> Dict[int, int]:
+    """
+    Counts the unigrams and bigrams of the tokenised text, keyed by a stable
+    32-bit hash. crc32 is used rather than hash(), which is salted per process
+    and so would not survive the library snapshot.
+    """
+    tokens = tokenize(text)
+    counts: Dict[int, int] = {}
+    for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+        key = zlib.crc32(feature.encode("utf-8"))
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+def _sublinear_tf(counts: Iterable[int]) -> np.ndarray:
+    return 1.0 + np.log(np.fromiter(counts, dtype=np.float32))
+
+class SimilarityMatrix:
+    """
+    A framework's L2-normalised TF-IDF matrix in coordinate form: one entry
+    per (node, feature) pair, with rows in FrameworkIndex order. Columns are
+    the sorted, distinct feature hashes seen in the framework.
+    """
+    __slots__ = ("feature_hashes", "idf", "unseen_idf", "rows", "columns", "weights", "node_count")
+
+    def __init__(self, feature_hashes, idf, unseen_idf, rows, columns, weights, node_count):
+        self.feature_hashes: np.ndarray = feature_hashes  # uint32, sorted
+        self.idf: np.ndarray = idf                        # float32 per column
+        self.unseen_idf: float = unseen_idf               # idf of a feature no node contains
+        self.rows: np.ndarray = rows                      # int32 per entry
+        self.columns: np.ndarray = columns                # int32 per entry
+        self.weights: np.ndarray = weights                # float32 per entry
+        self.node_count: int = node_count
+
+    def __len__(self) -> int:
+        return self.node_count
+
+    def score(self, query: Dict[int, int]) -> np.ndarray:
+        """Returns the cosine similarity of the query features with every node, in FrameworkIndex order."""
+        if not query:
+            return np.zeros(self.node_count, dtype=np.float32)
+        hashes = np.fromiter(query, dtype=np.uint32, count=len(query))
+        tf = _sublinear_tf(query.values())
+        positions = np.minimum(np.searchsorted(self.feature_hashes, hashes), len(self.feature_hashes) - 1)
+        known = self.feature_hashes[positions] == hashes
+
+        # The query is normalised over all its features, including those no node contains.
+        idf = np.where(known, self.idf[positions], self.unseen_idf)
+        query_weights = tf * idf
+        norm = float(np.linalg.norm(query_weights)) or 1.0
+        dense_query = np.zeros(len(self.feature_hashes), dtype=np.float32)
+        dense_query[positions[known]] = query_weights[known] / norm
+
+        return np.bincount(
+            self.rows, weights=self.weights * dense_query[self.columns], minlength=self.node_count
+        ).astype(np.float32)
+
+def build_similarity_matrix(framework: FrameworkFile) -> SimilarityMatrix:
+    """
+    Vectorises every node of the framework. A collapsed node's row also
+    covers the points below it, which the prompt embeds in its notes.
+    """
+    index = get_framework_index(framework)
+    node_features: List[Dict[int, int]] = []
+    for i, node in enumerate(index.nodes):
+        covered = range(i, index.subtree_ends[i]) if node.collapse_children and node.children else (i,)
+        node_features.append(_feature_hashes(" ".join(node_text(index.nodes[j]) for j in covered)))
+
+    node_count = len(node_features)
+    entry_count = sum(len(features) for features in node_features)
+    rows = np.repeat(np.arange(node_count, dtype=np.int32), [len(features) for features in node_features])
+    hashes = np.fromiter((h for features in node_features for h in features), dtype=np.uint32, count=entry_count)
+    tf = _sublinear_tf(c for features in node_features for c in features.values())
+
+    feature_hashes, columns, document_frequency = np.unique(hashes, return_inverse=True, return_counts=True)
+    idf = (np.log((1.0 + node_count) / (1.0 + document_frequency)) + 1.0).astype(np.float32)
+    weights = tf * idf[columns]
+    row_norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=node_count))
+    weights = (weights / np.where(row_norms > 0, row_norms, 1.0)[rows]).astype(np.float32)
+
+    return SimilarityMatrix(
+        feature_hashes=feature_hashes.astype(np.uint32),
+        idf=idf,
+        unseen_idf=float(np.log(1.0 + node_count) + 1.0),
+        rows=rows,
+        columns=columns.astype(np.int32),
+        weights=weights,
+        node_count=node_count,
+    )
+
+def get_similarity_matrix(framework: FrameworkFile) -> SimilarityMatrix:
+    """
+    Returns the matrix built for this framework at load time, building and
+    attaching one on first use for frameworks constructed in code.
+    """
+    if framework._similarity_matrix is None:
+        framework._similarity_matrix = build_similarity_matrix(framework)
+    return framework._similarity_matrix
+
+def score_frameworks(frameworks: Dict[str, FrameworkFile], reflection_text: str) -> Dict[str, np.ndarray]:
+    """Scores the reflection against every node of each framework, tokenising it only once."""
+    query = _feature_hashes(reflection_text)
+    return {code: get_similarity_matrix(fw).score(query) for code, fw in frameworks.items()}
+
+def order_frameworks_by_similarity(
+    frameworks: Dict[str, FrameworkFile],
+    reflection_text: str,
+) -> Dict[str, FrameworkFile]:
+    """
+    Returns the frameworks with the best-matching ones first, ranked by their
+    best node score. Ties keep the selection order.
+    """
+    scores = score_frameworks(frameworks, reflection_text)
+    best = {code: float(node_scores.max(initial=0.0)) for code, node_scores in scores.items()}
+    return {code: frameworks[code] for code in sorted(frameworks, key=lambda code: -best[code])}
+
+def attach_plausibility_scores(
+    result: LLMAnalysisResult,
+    frameworks: Dict[str, FrameworkFile],
+    reflection_text: str,
+) -> List[Tuple[str, str]]:
+    """
+    Sets each competency's plausibility_score: the share of its framework's
+    nodes that match the reflection less well than it does, from 0 (no node
+    scores lower) to 1. Competencies that do not map to a node keep None.
+    Returns the (framework_code, competency_id) pairs with no word in common
+    with the reflection.
+    """
+    wanted = {c.framework_code for c in result.assessed_competencies if c.framework_code in frameworks}
+    scores = score_frameworks({code: frameworks[code] for code in wanted}, reflection_text)
+    unsupported = []
+    for competency in result.assessed_competencies:
+        if competency.framework_code not in scores:
+            continue
+        index = get_framework_index(frameworks[competency.framework_code])
+        i = index.index_of_display_id(competency.competency_id)
+        if i is None:
+            i = index.index_of_id(competency.competency_id)
+        if i is None:
+            continue
+        node_scores = scores[competency.framework_code]
+        competency.plausibility_score = round(float(np.mean(node_scores < node_scores[i])), 3)
+        if node_scores[i] == 0:
+            unsupported.append((competency.framework_code, competency.competency_id))
+    return unsupported
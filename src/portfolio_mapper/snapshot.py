@@ -0,0 +1,171 @@
+# src/portfolio_mapper/snapshot.py
+
+# Copyright (c) Adrian Robinson 2025
+# This software is dual-licensed under the MIT License (for NHS use only)
+# and a Commercial License (for other use).
+# For commercial licensing inquiries, please contact adrian.j.robinson@gmail.com
+
+"""
+This module compiles the validated, ID-qualified framework library and the
+loaded configuration into a versioned binary snapshot, so that a new server
+process can start from a single file read instead of re-parsing and
+re-validating every YAML file.
+
+The snapshot is keyed by a hash of every source YAML file, so any edit, new
+file or deleted file causes a transparent fallback to the YAML loaders (which
+then rewrite the snapshot). Compile ahead of deployment from the project root:
+
+python -m src.portfolio_mapper.snapshot
+"""
+import hashlib
+import json
+import os
+import pickle
+import sys
+import time
+from typing import Dict, Optional, Tuple
+
+import pydantic
+
+from . import data_loader, framework_index, retrieval, similarity
+from .caching import content_hash
+from .data_loader import ConfigLoader, FrameworkLoader
+from .models.config import AcademicLevelsConfig, LlmConfig, PromptsConfig, RolesConfig
+from .models.framework import FrameworkFile
+
+# Bump this whenever the layout of the snapshot payload itself changes. Changes
+# to how the loaders post-process data are covered by BUILDER_MODULES.
+SNAPSHOT_FORMAT_VERSION = 4
+# The modules that build the pickled data, including the private indexes the
+# loader attaches to each framework. Their source is part of the environment key.
+BUILDER_MODULES = (data_loader, framework_index, retrieval, similarity)
+DEFAULT_SNAPSHOT_PATH = os.path.join('.cache', 'library.snapshot')
+
+def _source_fingerprint(frameworks_dir: str, config_dir: str) -> Dict[str, str]:
+    """Hashes every YAML source file, keyed by its path relative to its root directory."""
+    fingerprint = {}
+    for prefix, base_dir in (("frameworks", frameworks_dir), ("config", config_dir)):
+        for root, _, files in os.walk(base_dir):
+            for file in files:
+                if file.endswith(('.yaml', '.yml')):
+                    file_path = os.path.join(root, file)
+                    relative_path = os.path.relpath(file_path, base_dir).replace(os.path.sep, '/')
+                    with open(file_path, 'rb') as f:
+                        fingerprint[f"{prefix}/{relative_path}"] = content_hash(f.read())
+    return dict(sorted(fingerprint.items()))
+
+def _environment_key() -> str:
+    """
+    Identifies the code the snapshot was pickled against. A change to any model
+    schema, to the source of BUILDER_MODULES, to pydantic or to the Python
+    version invalidates the snapshot.
+    """
+    schemas = [
+        model.model_json_schema()
+        for model in (FrameworkFile, RolesConfig, AcademicLevelsConfig, PromptsConfig, LlmConfig)
+    ]
+    builders = {}
+    for module in BUILDER_MODULES:
+        with open(module.__file__, 'rb') as f:
+            builders[module.__name__] = content_hash(f.read())
+    payload = json.dumps({
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "python": sys.version_info[:2],
+        "pydantic": pydantic.VERSION,
+        "schemas": schemas,
+        "builders": builders,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def compile_snapshot(
+    frameworks_dir: str,
+    config_dir: str,
+    snapshot_path: str = DEFAULT_SNAPSHOT_PATH,
+) -> Tuple[Dict[str, FrameworkFile], ConfigLoader]:
+    """
+    Loads everything from YAML and writes the result to `snapshot_path`.
+    The write is atomic, so a concurrently starting process never reads a
+    partial file. Returns the freshly loaded library and config loader.
+    """
+    fingerprint = _source_fingerprint(frameworks_dir, config_dir)
+
+    framework_library = FrameworkLoader(frameworks_dir=frameworks_dir).load_all()
+    config_loader = ConfigLoader(config_dir=config_dir)
+    config_loader.load_all()
+
+    payload = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "environment_key": _environment_key(),
+        "sources": fingerprint,
+        "framework_library": framework_library,
+        "config_loader": config_loader,
+    }
+    try:
+        os.makedirs(os.path.dirname(snapshot_path) or '.', exist_ok=True)
+        temp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, snapshot_path)
+        print(f"  ✅ [SNAPSHOT WRITTEN] {snapshot_path} ({len(fingerprint)} source files)")
+    except OSError as e:
+        # A read-only filesystem should not stop the app; we simply start from YAML next time too.
+        print(f"  ⚠️ [SNAPSHOT NOT WRITTEN] {snapshot_path}: {e}")
+
+    return framework_library, config_loader
+
+def load_snapshot(
+    frameworks_dir: str,
+    config_dir: str,
+    snapshot_path: str = DEFAULT_SNAPSHOT_PATH,
+) -> Optional[Tuple[Dict[str, FrameworkFile], ConfigLoader]]:
+    """
+    Returns the library and config loader from the snapshot, or None if the
+    snapshot is missing, from another format version, or stale.
+    """
+    if not os.path.exists(snapshot_path):
+        print(f"  ⚠️ [INFO] No snapshot found at '{snapshot_path}'.")
+        return None
+    try:
+        with open(snapshot_path, 'rb') as f:
+            payload = pickle.load(f)
+    except Exception as e:
+        print(f"  ⚠️ [SNAPSHOT UNREADABLE] {snapshot_path}: {e}")
+        return None
+
+    if payload.get("format_version") != SNAPSHOT_FORMAT_VERSION or payload.get("environment_key") != _environment_key():
+        print("  ⚠️ [SNAPSHOT OUTDATED] Snapshot was built by a different version of the code.")
+        return None
+
+    current_sources = _source_fingerprint(frameworks_dir, config_dir)
+    if payload.get("sources") != current_sources:
+        changed = sorted(
+            path for path in set(current_sources) | set(payload.get("sources", {}))
+            if current_sources.get(path) != payload.get("sources", {}).get(path)
+        )
+        print(f"  ⚠️ [SNAPSHOT STALE] Source files changed: {', '.join(changed)}")
+        return None
+
+    return payload["framework_library"], payload["config_loader"]
+
+def load_library(
+    frameworks_dir: str,
+    config_dir: str,
+    snapshot_path: str = DEFAULT_SNAPSHOT_PATH,
+) -> Tuple[Dict[str, FrameworkFile], ConfigLoader]:
+    """
+    Main entry point for startup: loads from the snapshot when it is current,
+    otherwise falls back to the YAML loaders and refreshes the snapshot.
+    """
+    print(f"--- Loading framework library snapshot from '{snapshot_path}' ---")
+    start = time.perf_counter()
+    if snapshot := load_snapshot(frameworks_dir, config_dir, snapshot_path):
+        framework_library, config_loader = snapshot
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        print(f"--- Snapshot loaded in {elapsed_ms:.1f} ms. {len(framework_library)} frameworks loaded. ---")
+        return framework_library, config_loader
+
+    print("--- Falling back to YAML loading ---")
+    return compile_snapshot(frameworks_dir, config_dir, snapshot_path)
+
+if __name__ == "__main__":
+    compile_snapshot(frameworks_dir='frameworks/', config_dir='config/')
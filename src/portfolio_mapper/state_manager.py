@@ -11,6 +11,11 @@ This module centralizes all session state management for the Streamlit app.
 import streamlit as st
 import uuid
 
+from .caching import LRUCache
+
+# Prepared PDF reports kept per session, so switching between recent results stays instant.
+PDF_REPORTS_PER_SESSION = 3
+
 def initialize_session_state():
     """Initializes all required keys in Streamlit's session state."""
     state_defaults = {
@@ -20,15 +25,24 @@ def initialize_session_state():
         "reflection_text": "",
         "anonymisation_confirmed": False,
         "safety_analysis_result": None,
+        # (True, result) for an analysis sent alongside the safety check, held until
+        # the check passes; the result is None if that call failed. None if not sent.
+        "speculative_analysis_result": None,
+        # Frameworks whose fanned-out analysis call failed, shown alongside partial results
+        "analysis_failed_frameworks": [],
         "pii_warning_acknowledged": False,
         "last_analysis_reflection": None,
         "last_analysis_frameworks": None,
         # Prevents stale on_change callbacks from wiping results
         "analysis_just_completed": False, 
+        # PDF report bytes by pdf_report_key, built only when the user asks for them
+        "pdf_reports": None,
     }
     for key, value in state_defaults.items():
         if key not in st.session_state:
             st.session_state[key] = value
+    if st.session_state.pdf_reports is None:
+        st.session_state.pdf_reports = LRUCache("pdf_reports", max_entries=PDF_REPORTS_PER_SESSION)
 
 def invalidate_results():
     """Callback to clear results when an input changes, forcing re-analysis."""
@@ -40,6 +54,8 @@ def invalidate_results():
 
     st.session_state.analysis_result = None
     st.session_state.safety_analysis_result = None
+    st.session_state.speculative_analysis_result = None
+    st.session_state.analysis_failed_frameworks = []
     st.session_state.pii_warning_acknowledged = False
     st.session_state.last_analysis_reflection = None
     st.session_state.last_analysis_frameworks = None
@@ -0,0 +1,84 @@
+# src/portfolio_mapper/stream_parser.py
+
+# Copyright (c) Adrian Robinson 2025
+# This software is dual-licensed under the MIT License (for NHS use only)
+# and a Commercial License (for other use).
+# For commercial licensing inquiries, please contact adrian.j.robinson@gmail.com
+
+"""
+This module contains an incremental JSON scanner for streamed analysis
+responses. It picks out each object of the top-level `assessed_competencies`
+array as soon as its closing brace arrives, so results can be shown while
+the rest of the response is still being generated.
+"""
+import json
+from typing import Any, Dict, List, Optional
+
+class CompetencyStreamParser:
+    """
+    Feed it response chunks in order; each call returns the competency objects
+    (as plain dicts) that were completed by that chunk. The scanner keeps its
+    position and nesting state between calls, so every character is examined
+    once. It only extracts objects; the full response is still validated as a
+    whole once the stream ends.
+    """
+    TARGET_KEY = "assessed_competencies"
+
+    def __init__(self):
+        self.text = ""
+        self._position = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+        self._last_root_string: Optional[str] = None
+        self._pending_root_key: Optional[str] = None
+        self._array_depth: Optional[int] = None
+        self._object_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Consumes the next chunk of the response and returns any newly completed competency objects."""
+        self.text += chunk
+        completed = []
+        text = self.text
+
+        for i in range(self._position, len(text)):
+            char = text[i]
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_root_string = text[self._string_start + 1:i]
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+            elif char == ':' and self._depth == 1:
+                self._pending_root_key = self._last_root_string
+            elif char == ',' and self._depth == 1:
+                self._pending_root_key = None
+            elif char in '{[':
+                if char == '[' and self._depth == 1 and self._pending_root_key == self.TARGET_KEY:
+                    self._array_depth = self._depth + 1
+                self._depth += 1
+                if char == '{' and self._array_depth is not None and self._depth == self._array_depth + 1:
+                    self._object_start = i
+            elif char in '}]':
+                if char == '}' and self._object_start is not None and self._depth == self._array_depth + 1:
+                    try:
+                        completed.append(json.loads(text[self._object_start:i + 1]))
+                    except json.JSONDecodeError:
+                        pass  # Left for the final, whole-response validation to report.
+                    self._object_start = None
+                elif char == ']' and self._array_depth is not None and self._depth == self._array_depth:
+                    self._array_depth = None
+                self._depth -= 1
+
+        self._position = len(text)
+        return completed
@@ -0,0 +1,53 @@
+# src/portfolio_mapper/token_budget.py
+
+# Copyright (c) Adrian Robinson 2025
+# This software is dual-licensed under the MIT License (for NHS use only)
+# and a Commercial License (for other use).
+# For commercial licensing inquiries, please contact adrian.j.robinson@gmail.com
+
+"""
+This module estimates prompt sizes in tokens and defines the detail levels
+that the analysis prompt can be degraded through when a token budget is set.
+
+The estimate is a local approximation of a subword tokenizer; it needs no
+network call and deliberately errs on the high side, so a prompt that fits
+the estimate also fits the real budget.
+"""
+import re
+from enum import IntEnum
+
+class PromptDetail(IntEnum):
+    """
+    How much optional framework content goes into the prompt. Each level
+    drops everything the previous level dropped, plus one more kind of content.
+    """
+    FULL = 0
+    NO_EXAMPLES = 1          # drop source_examples
+    NO_NOTES = 2             # also drop source_notes (node and framework level)
+    NO_COLLAPSED_DETAIL = 3  # also drop the child statements listed under collapsed nodes
+
+    @property
+    def dropped_content(self) -> str:
+        """A short description of what this level removes on top of the previous one."""
+        return {
+            PromptDetail.FULL: "nothing",
+            PromptDetail.NO_EXAMPLES: "source examples",
+            PromptDetail.NO_NOTES: "source notes",
+            PromptDetail.NO_COLLAPSED_DETAIL: "collapsed-child statements",
+        }[self]
+
+# Letter runs, single digits, single punctuation characters, and whitespace
+# runs (JSON indentation is typically merged into one token per line).
+_TOKEN_PIECE_PATTERN = re.compile(r"[^\W\d_]+|\d|\s+|[^\w\s]|_")
+# A letter run costs roughly one token per this many characters.
+_CHARS_PER_WORD_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    """Approximates the number of tokens a Gemini-style tokenizer would produce for `text`."""
+    tokens = 0
+    for piece in _TOKEN_PIECE_PATTERN.findall(text):
+        if piece[0].isalpha():
+            tokens += -(-len(piece) // _CHARS_PER_WORD_TOKEN)
+        else:
+            tokens += 1
+    return tokens
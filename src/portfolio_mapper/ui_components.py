@@ -11,7 +11,7 @@ separating the view logic from the main application flow.
 """
 from collections import defaultdict
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Callable, Dict, Optional
 
 import streamlit as st
 import pandas as pd
@@ -19,10 +19,12 @@ import pandas as pd
 from .analytics import track_event
 
 from .data_loader import ConfigLoader
-from .logic import resolve_allowed_frameworks
+from .logic import get_next_academic_level, resolve_allowed_frameworks, resolve_required_framework_codes
 from .models.framework import FrameworkFile
+from .models.llm_response import AssessedCompetency
 from .models.ui import UserSelections
-from .reporting import generate_pdf_report
+from .pii_screen import screen_pii
+from .reporting import generate_pdf_report, pdf_report_key
 
 def render_sidebar(config_loader: ConfigLoader, framework_library: Dict[str, FrameworkFile], invalidate_callback) -> Optional[UserSelections]:
     """Renders the sidebar UI and returns a UserSelections object if complete."""
@@ -55,12 +57,7 @@ def render_sidebar(config_loader: ConfigLoader, framework_library: Dict[str, Fra
     selected_level_key = level_keys[level_names.index(selected_level_name)]
     level_obj = config_loader.academic_levels[selected_level_key]
 
-    selected_level_index = level_keys.index(selected_level_key)
-    next_level_name, next_level_description = "N/A", "This is the highest academic level defined."
-    if selected_level_index + 1 < len(level_keys):
-        next_level_key = level_keys[selected_level_index + 1]
-        next_level_obj = config_loader.academic_levels[next_level_key]
-        next_level_name, next_level_description = next_level_obj.name, next_level_obj.description
+    next_level_name, next_level_description = get_next_academic_level(selected_level_key, config_loader.academic_levels)
 
     st.sidebar.header("2. Your Frameworks")
     available_frameworks = resolve_allowed_frameworks(role_obj, framework_library)
@@ -76,16 +73,7 @@ def render_sidebar(config_loader: ConfigLoader, framework_library: Dict[str, Fra
     )
     selected_framework_codes = [multiselect_options[name] for name in selected_display_names]
 
-    all_required_codes = set(selected_framework_codes)
-    codes_to_check = list(selected_framework_codes)
-    while codes_to_check:
-        code = codes_to_check.pop(0)
-        if framework := framework_library.get(code):
-            if framework.metadata.dependencies:
-                for dep_code in framework.metadata.dependencies:
-                    if dep_code not in all_required_codes:
-                        all_required_codes.add(dep_code)
-                        codes_to_check.append(dep_code)
+    all_required_codes = resolve_required_framework_codes(selected_framework_codes, framework_library)
 
     return UserSelections(
         role_obj=role_obj, level_obj=level_obj, selected_level_key=selected_level_key,
@@ -131,6 +119,12 @@ def _get_analysis_button_state(config_loader: ConfigLoader, user_selections: Use
     return False, "Click to begin the AI analysis of your reflection."
 
 
+def render_local_pii_feedback(reflection_text: str):
+    """Lists the PII found by the local screen, which runs on every edit without calling the API."""
+    if detections := screen_pii(reflection_text):
+        items = ", ".join(f"`{d.text}`" for d in detections)
+        st.caption(f"🔎 Possible personal information to remove or anonymise: {items}")
+
 def render_main_inputs(config_loader: ConfigLoader, user_selections: UserSelections, clear_state_callback, invalidate_callback):
     """Renders the main page content area for user input."""
     st.header("3. Your Reflection")
@@ -143,6 +137,8 @@ def render_main_inputs(config_loader: ConfigLoader, user_selections: UserSelecti
         height=300, placeholder=dynamic_placeholder, key="reflection_text",
         on_change=invalidate_callback
     )
+    if config_loader.llm_config.app.local_pii_screen != "off":
+        render_local_pii_feedback(st.session_state.reflection_text)
 
     col1, col2, col3 = st.columns([3, 3, 1])
     with col1:
@@ -161,6 +157,7 @@ def render_main_inputs(config_loader: ConfigLoader, user_selections: UserSelecti
             # Explicitly clear previous results to ensure a clean run
             st.session_state.analysis_result = None
             st.session_state.safety_analysis_result = None
+            st.session_state.speculative_analysis_result = None
             st.session_state.pii_warning_acknowledged = False
             st.rerun()
     
@@ -202,10 +199,51 @@ def render_safety_warnings():
                     st.session_state.processing = True
                     st.rerun()
 
+def _framework_heading(framework_code: str, framework_library: Dict[str, FrameworkFile]) -> str:
+    framework_obj = framework_library.get(framework_code)
+    return f"{framework_obj.metadata.abbreviation}: {framework_obj.metadata.title}" if framework_obj else f"Matches for: {framework_code}"
+
+def render_competency(competency: AssessedCompetency):
+    """Renders a single matched competency as an expander."""
+    with st.expander(f"**({competency.competency_id}) {competency.competency_text}**"):
+        st.markdown(f"**Match Strength:** {'⭐' * competency.match_strength} ({competency.match_strength}/5)  \n**Achieved Level:** `{competency.achieved_level}`")
+        st.info(f"**Justification:** {competency.justification_for_level}")
+        if competency.emerging_evidence_for_next_level:
+            st.warning(f"**Emerging Evidence for Next Level:** {competency.emerging_evidence_for_next_level}")
+
+def render_live_competencies(framework_library: Dict[str, FrameworkFile]) -> Callable[[AssessedCompetency], None]:
+    """
+    Reserves a 'live results' area and returns a callback that renders each
+    competency into it as it streams in. The full results replace this area
+    on the rerun that follows the analysis.
+    """
+    container = st.container()
+    last_framework_code = []
+
+    def _render(competency: AssessedCompetency):
+        with container:
+            if not last_framework_code:
+                st.header("💡 Matches Found So Far...")
+            if not last_framework_code or last_framework_code[-1] != competency.framework_code:
+                st.subheader(_framework_heading(competency.framework_code, framework_library))
+                last_framework_code.append(competency.framework_code)
+            render_competency(competency)
+
+    return _render
+
 def render_results(framework_library: Dict[str, FrameworkFile]):
     """Renders the final analysis results section."""
     analysis_result = st.session_state.analysis_result
     st.success("✅ Analysis Complete!")
+    if failed_frameworks := st.session_state.get("analysis_failed_frameworks"):
+        st.warning(f"The analysis could not be completed for: {', '.join(failed_frameworks)}. Results for the other frameworks are shown below.")
+    if analysis_result.response_truncated:
+        st.warning("The AI's response was cut off, so some matching competencies may be missing. Running the analysis again may find them.")
+    elif analysis_result.competencies_dropped:
+        st.warning(
+            f"{analysis_result.competencies_dropped} suggested competencies did not match the selected frameworks and were left out. "
+            "Running the analysis again may find them."
+        )
     st.header("🔑 Overall Summary")
     st.markdown(analysis_result.overall_summary)
 
@@ -222,14 +260,9 @@ def render_results(framework_library: Dict[str, FrameworkFile]):
             grouped_competencies[competency.framework_code].append(competency)
 
         for framework_code, competencies in grouped_competencies.items():
-            framework_obj = framework_library.get(framework_code)
-            st.subheader(f"{framework_obj.metadata.abbreviation}: {framework_obj.metadata.title}" if framework_obj else f"Matches for: {framework_code}")
+            st.subheader(_framework_heading(framework_code, framework_library))
             for competency in competencies: # Already sorted by strength
-                with st.expander(f"**({competency.competency_id}) {competency.competency_text}**"):
-                    st.markdown(f"**Match Strength:** {'⭐' * competency.match_strength} ({competency.match_strength}/5)  \n**Achieved Level:** `{competency.achieved_level}`")
-                    st.info(f"**Justification:** {competency.justification_for_level}")
-                    if competency.emerging_evidence_for_next_level:
-                        st.warning(f"**Emerging Evidence for Next Level:** {competency.emerging_evidence_for_next_level}")
+                render_competency(competency)
         
         st.subheader("📋 Tabular View & Download")
         df_data = [c.model_dump() for c in analysis_result.assessed_competencies]
@@ -257,8 +290,16 @@ def render_results(framework_library: Dict[str, FrameworkFile]):
         with col1:
             st.download_button("💾 Download as CSV", csv, f"portfolio_analysis_{timestamp}.csv", "text/csv", use_container_width=True, on_click=track_event, args=("report_downloaded", {"format": "csv"}))
         with col2:
-            pdf_bytes = generate_pdf_report(analysis_result=analysis_result, available_frameworks=framework_library, reflection_text=st.session_state.reflection_text)
-            st.download_button("📄 Download as PDF", pdf_bytes, f"portfolio_analysis_{timestamp}.pdf", "application/pdf", use_container_width=True, on_click=track_event, args=("report_downloaded", {"format": "pdf"}))
+            # The PDF is only built on request and then kept, so reruns don't rebuild it.
+            pdf_key = pdf_report_key(analysis_result, framework_library, st.session_state.reflection_text)
+            pdf_bytes = st.session_state.pdf_reports.get(pdf_key)
+            pdf_slot = st.empty()
+            if pdf_bytes is None and pdf_slot.button("📄 Prepare PDF", use_container_width=True):
+                with st.spinner("Preparing your PDF report..."):
+                    pdf_bytes = generate_pdf_report(analysis_result=analysis_result, available_frameworks=framework_library, reflection_text=st.session_state.reflection_text)
+                st.session_state.pdf_reports.put(pdf_key, pdf_bytes)
+            if pdf_bytes is not None:
+                pdf_slot.download_button("📄 Download as PDF", pdf_bytes, f"portfolio_analysis_{timestamp}.pdf", "application/pdf", use_container_width=True, on_click=track_event, args=("report_downloaded", {"format": "pdf"}))
     else:
         st.info("No specific competencies were matched based on your reflection.")
 
@@ -0,0 +1,88 @@
+# tests/test_caching.py
+
+# Copyright (c) Adrian Robinson 2025
+# This software is dual-licensed under the MIT License (for NHS use only)
+# and a Commercial License (for other use).
+# For commercial licensing inquiries, please contact adrian.j.robinson@gmail.com
+
+import threading
+import time
+
+import pytest
+
+from src.portfolio_mapper.caching import SingleFlight
+
+class _StopRun(BaseException):
+    """Stands in for Streamlit's StopException, which is not an Exception."""
+
+def _run_with_follower(leader_fn):
+    """
+    Runs `leader_fn` as the leader for a key and, while it is running, a
+    follower for the same key. Returns the follower's outcome, the leader's
+    error and the follower's call count.
+    """
+    flight = SingleFlight("test")
+    release = threading.Event()
+    follower_calls = []
+    outcome = {}
+
+    def _leader():
+        release.wait(5)
+        return leader_fn()
+
+    def _follower():
+        follower_calls.append(1)
+        return "follower's own result"
+
+    def _run_leader():
+        try:
+            flight.do("key", _leader)
+        except BaseException as e:
+            outcome["leader_error"] = e
+
+    def _run_follower():
+        try:
+            outcome["follower"] = flight.do("key", _follower)
+        except BaseException as e:
+            outcome["follower_error"] = e
+
+    leader = threading.Thread(target=_run_leader)
+    leader.start()
+    while not flight.stats()["in_flight"]:
+        time.sleep(0.001)
+    follower = threading.Thread(target=_run_follower)
+    follower.start()
+    while not flight.stats()["coalesced"]:
+        time.sleep(0.001)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    return outcome, len(follower_calls)
+
+def test_follower_shares_the_leader_result():
+    outcome, follower_calls = _run_with_follower(lambda: "leader's result")
+    assert outcome["follower"] == ("leader's result", True)
+    assert follower_calls == 0
+
+def test_follower_shares_the_leader_exception():
+    def _fail():
+        raise ValueError("bad response")
+    outcome, follower_calls = _run_with_follower(_fail)
+    assert isinstance(outcome["follower_error"], ValueError)
+    assert follower_calls == 0
+
+def test_follower_runs_its_own_call_when_the_leader_is_interrupted():
+    def _interrupted():
+        raise _StopRun()
+    outcome, follower_calls = _run_with_follower(_interrupted)
+    assert isinstance(outcome["leader_error"], _StopRun)
+    assert "follower_error" not in outcome
+    assert outcome["follower"] == ("follower's own result", False)
+    assert follower_calls == 1
+
+def test_nothing_is_kept_after_the_call():
+    flight = SingleFlight("test")
+    with pytest.raises(_StopRun):
+        flight.do("key", lambda: (_ for _ in ()).throw(_StopRun()))
+    assert flight.do("key", lambda: 1) == (1, False)
+    assert flight.stats()["in_flight"] == 0
@@ -0,0 +1,129 @@
+# tests/test_context_cache.py
+
+# Copyright (c) Adrian Robinson 2025
+# This software is dual-licensed under the MIT License (for NHS use only)
+# and a Commercial License (for other use).
+# For commercial licensing inquiries, please contact adrian.j.robinson@gmail.com
+
+import contextlib
+import io
+import json
+from types import SimpleNamespace
+
+import pytest
+from google.api_core import exceptions as google_exceptions
+
+from src.portfolio_mapper import context_cache
+from src.portfolio_mapper.context_cache import ContextCacheManager, LocalContextCacheBackend, PromptContext
+from src.portfolio_mapper.data_loader import ConfigLoader
+from src.portfolio_mapper.gemini_client import generate_analysis
+
+TTL = 3600
+RENEW_BEFORE = 600
+PREFIX = "Instructions, academic scale, schema and frameworks.\n\n"
+CONTEXT = PromptContext(("Pre-registration Nurse", "advanced", ("NMC-2024-Standards",)), PREFIX)
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replaces the module's clock with one the test moves forward by hand."""
+    now = SimpleNamespace(value=1_000_000.0)
+    monkeypatch.setattr(context_cache, "time", SimpleNamespace(time=lambda: now.value))
+    return now
+
+def _manager(backend=None, max_handles: int = 4) -> ContextCacheManager:
+    return ContextCacheManager(backend or LocalContextCacheBackend(), "model", TTL, RENEW_BEFORE, max_handles)
+
+def test_handle_is_reused_for_the_same_key(clock):
+    manager = _manager()
+    name = manager.get_handle(CONTEXT)
+    clock.value += 60
+    assert manager.get_handle(PromptContext(CONTEXT.key, PREFIX)) == name
+    assert manager.backend.created == 1
+    assert manager.stats()["hits"] == 1
+
+def test_other_keys_and_changed_prefixes_get_their_own_handle(clock):
+    manager = _manager()
+    name = manager.get_handle(CONTEXT)
+    other_level = PromptContext(("Pre-registration Nurse", "masters", ("NMC-2024-Standards",)), PREFIX)
+    assert manager.get_handle(other_level) != name
+    # An edited framework changes the prefix under the same key.
+    assert manager.get_handle(PromptContext(CONTEXT.key, PREFIX + "Edited.")) != name
+    assert manager.backend.created == 3
+    assert manager.backend.deleted == 1
+
+def test_handle_is_renewed_shortly_before_it_expires(clock):
+    manager = _manager()
+    name = manager.get_handle(CONTEXT)
+    clock.value += TTL - RENEW_BEFORE + 1
+    assert manager.get_handle(CONTEXT) == name
+    assert manager.backend.renewed == 1
+    # Renewed for a full TTL, so it is still live after the original expiry.
+    clock.value += RENEW_BEFORE
+    assert manager.get_handle(CONTEXT) == name
+    assert manager.backend.created == 1
+    assert manager.stats()["renewals"] == 1
+
+def test_new_handle_is_made_after_expiry(clock):
+    manager = _manager()
+    name = manager.get_handle(CONTEXT)
+    clock.value += TTL + 1
+    assert manager.get_handle(CONTEXT) != name
+    assert manager.backend.created == 2
+    assert manager.backend.deleted == 1
+
+def test_least_recently_used_handle_is_evicted(clock):
+    manager = _manager(max_handles=1)
+    manager.get_handle(CONTEXT)
+    manager.get_handle(PromptContext(("Other role",) + CONTEXT.key[1:], PREFIX))
+    assert manager.stats()["handles"] == 1
+    assert manager.stats()["evictions"] == 1
+    assert manager.backend.deleted == 1
+
+class _Response:
+    def __init__(self, text: str):
+        self.text = text
+
+class _FakeModel:
+    """Records the prompts it is sent and answers with an empty analysis."""
+
+    def __init__(self):
+        self.prompts = []
+
+    def generate_content(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return _Response(json.dumps({"overall_summary": "Summary.", "assessed_competencies": []}))
+
+class _ExpiredOnServer:
+    def generate_content(self, prompt, **kwargs):
+        raise google_exceptions.NotFound("CachedContent not found")
+
+class _ExpiredHandleBackend(LocalContextCacheBackend):
+    """A backend whose handles the server has already dropped."""
+
+    def client_for(self, name, base_client):
+        return _ExpiredOnServer()
+
+@pytest.fixture(scope="module")
+def config_loader():
+    with contextlib.redirect_stdout(io.StringIO()):
+        loader = ConfigLoader(config_dir='config/')
+        loader.load_all()
+    return loader
+
+def test_analysis_uses_the_cached_prefix(clock, config_loader):
+    manager, client = _manager(), _FakeModel()
+    with contextlib.redirect_stdout(io.StringIO()):
+        generate_analysis(client, PREFIX + "The reflection.", config_loader, context=CONTEXT, context_cache=manager)
+    # The local backend re-joins the prefix, so the model still sees the whole prompt.
+    assert client.prompts == [PREFIX + "The reflection."]
+    assert manager.backend.created == 1
+    assert manager.stats()["handles"] == 1
+
+def test_full_prompt_is_sent_when_the_backend_reports_not_found(clock, config_loader):
+    manager, client = _manager(_ExpiredHandleBackend()), _FakeModel()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = generate_analysis(client, PREFIX + "The reflection.", config_loader, context=CONTEXT, context_cache=manager)
+    assert result.overall_summary == "Summary."
+    assert client.prompts == [PREFIX + "The reflection."]
+    assert manager.stats()["handles"] == 0
+    assert manager.backend.deleted == 1
@@ -0,0 +1,100 @@
+# tests/test_pii_screen.py
+
+# Copyright (c) Adrian Robinson 2025
+# This software is dual-licensed under the MIT License (for NHS use only)
+# and a Commercial License (for other use).
+# For commercial licensing inquiries, please contact adrian.j.robinson@gmail.com
+
+import pytest
+
+from src.portfolio_mapper.models.safety import PiiDetection, PiiFlag, SafetyAnalysis
+from src.portfolio_mapper.pii_screen import _uk_phone_kind, apply_local_pii_screen, is_valid_nhs_number, screen_pii
+
+@pytest.mark.parametrize("text, expected", [
+    ("943 476 5919", True),
+    ("9434765919", True),
+    ("943-476-5919", True),
+    ("1000000060", True),    # 11 - 0 reads as a check digit of 0.
+    ("943 476 5918", False),  # Wrong check digit.
+    ("1000000010", False),   # A check digit of 10 is never valid.
+    ("943 476 591", False),
+    ("943 476 59190", False),
+])
+def test_is_valid_nhs_number(text, expected):
+    assert is_valid_nhs_number(text) is expected
+
+@pytest.mark.parametrize("text, expected", [
+    ("07700 900123", "mobile"),
+    ("07700900123", "mobile"),
+    ("+44 7700 900123", "mobile"),
+    ("+44 (0) 7700 900123", "mobile"),
+    ("+44 (0)20 7946 0018", "landline"),
+    ("020 7946 0018", "landline"),
+    ("(020) 7946 0018", "landline"),
+    ("0800 123 4567", "landline"),
+    ("+1 555 123 4567", None),   # Not a UK number.
+    ("07700 9001", None),        # Too short.
+    ("05 1234 567890", None),    # No UK numbers start 05.
+])
+def test_uk_phone_kind(text, expected):
+    assert _uk_phone_kind(text) == expected
+
+@pytest.mark.parametrize("text, expected", [
+    # Dates
+    ("Seen on 15th June 2023 in clinic.", [(PiiFlag.SPECIFIC_DATE, "15th June 2023")]),
+    ("We met on the 3rd of March.", [(PiiFlag.SPECIFIC_DATE, "3rd of March")]),
+    ("On June 15, 2023 I led the handover.", [(PiiFlag.SPECIFIC_DATE, "June 15, 2023")]),
+    ("DOB 12/03/1985.", [(PiiFlag.SPECIFIC_DATE, "12/03/1985")]),
+    ("Admitted 12/03/24.", [(PiiFlag.SPECIFIC_DATE, "12/03/24")]),
+    ("Admitted 12.03.2024.", [(PiiFlag.SPECIFIC_DATE, "12.03.2024")]),
+    ("Discharged 2023-06-15.", [(PiiFlag.SPECIFIC_DATE, "2023-06-15")]),
+    ("Reviewed 03/25/2024.", [(PiiFlag.SPECIFIC_DATE, "03/25/2024")]),  # US order.
+    # Identifiers and contact details
+    ("Her NHS number is 943 476 5919.", [(PiiFlag.NHS_OR_MRN_NUMBER, "943 476 5919")]),
+    ("Call 07700 900123 tomorrow.", [(PiiFlag.PHONE_NUMBER, "07700 900123")]),
+    ("Ring +44 (0)20 7946 0018.", [(PiiFlag.PHONE_NUMBER, "+44 (0)20 7946 0018")]),
+    ("Email jane.doe@nhs.net please.", [(PiiFlag.EMAIL_ADDRESS, "jane.doe@nhs.net")]),
+    # Only listed once, however often it appears.
+    ("07700 900123 and again 07700900123.", [(PiiFlag.PHONE_NUMBER, "07700 900123")]),
+])
+def test_screen_pii_finds(text, expected):
+    assert [(d.flag, d.text) for d in screen_pii(text)] == expected
+
+@pytest.mark.parametrize("text", [
+    "The 3 may need more support.",
+    "BP 120/80, HR 72.",
+    "See section 4.1.10 of the code.",
+    "See section 1.2.2023.4 of the guidance.",
+    "Pain score 1-2-24 over three days.",
+    "Version 1.2.3 of the policy.",
+    "Booked for 31/02/2023.",               # Not a real date.
+    "Reference 2023-13-45.",
+    "Her NHS number is 943 476 5918.",      # Fails the check digit.
+    "Call +1 555 123 4567.",
+    "Dose 0.5 mg twice daily for 10 days.",
+    "I reflected on what may happen next.",
+])
+def test_screen_pii_ignores(text):
+    assert screen_pii(text) == []
+
+def _safety(*detections: PiiDetection) -> SafetyAnalysis:
+    return SafetyAnalysis(is_safe_for_processing=True, pii_detections=list(detections))
+
+TEXT = "Mrs Jane Doe (MRN RX1234567), 07700 900123 or ext. 4021, was seen on 15th June 2023 and last Tuesday."
+AI_NAME = PiiDetection(flag=PiiFlag.FULL_NAME, text="Mrs Jane Doe", explanation="A patient's name.")
+AI_MRN = PiiDetection(flag=PiiFlag.NHS_OR_MRN_NUMBER, text="RX1234567", explanation="A medical record number.")
+AI_DATE = PiiDetection(flag=PiiFlag.SPECIFIC_DATE, text="last Tuesday", explanation="Dates the encounter.")
+AI_PHONE = PiiDetection(flag=PiiFlag.PHONE_NUMBER, text="07700900123", explanation="A phone number.")
+AI_EXTENSION = PiiDetection(flag=PiiFlag.PHONE_NUMBER, text="ext. 4021", explanation="A phone extension.")
+LOCAL = [(PiiFlag.PHONE_NUMBER, "07700 900123"), (PiiFlag.SPECIFIC_DATE, "15th June 2023")]
+AI_KEPT = [(PiiFlag.FULL_NAME, "Mrs Jane Doe"), (PiiFlag.NHS_OR_MRN_NUMBER, "RX1234567"), (PiiFlag.SPECIFIC_DATE, "last Tuesday")]
+
+@pytest.mark.parametrize("mode, expected", [
+    ("off", [*AI_KEPT, (PiiFlag.PHONE_NUMBER, "07700900123"), (PiiFlag.PHONE_NUMBER, "ext. 4021")]),
+    ("merge", [*LOCAL, *AI_KEPT, (PiiFlag.PHONE_NUMBER, "ext. 4021")]),
+    # The AI's phone detections give way to the local ones; its MRN and relative date do not.
+    ("local_categories", [*LOCAL, *AI_KEPT]),
+])
+def test_apply_local_pii_screen(mode, expected):
+    result = apply_local_pii_screen(_safety(AI_NAME, AI_MRN, AI_DATE, AI_PHONE, AI_EXTENSION), TEXT, mode)
+    assert [(d.flag, d.text) for d in result.pii_detections] == expected
@@ -0,0 +1,67 @@
+# tests/test_rate_limit.py
+
+# Copyright (c) Adrian Robinson 2025
+# This software is dual-licensed under the MIT License (for NHS use only)
+# and a Commercial License (for other use).
+# For commercial licensing inquiries, please contact adrian.j.robinson@gmail.com
+
+import pytest
+from google.api_core import exceptions as google_exceptions
+
+from src.portfolio_mapper.rate_limit import ApiCallGuard, is_daily_quota_error
+
+class _QuotaFailure:
+    """Stands in for the google.rpc.QuotaFailure detail attached to a 429."""
+
+    def __init__(self, quota_id: str):
+        self.quota_id = quota_id
+
+    def __str__(self) -> str:
+        return f'violations {{ quota_id: "{self.quota_id}" }}'
+
+DAILY = google_exceptions.ResourceExhausted(
+    "You exceeded your current quota.",
+    details=[_QuotaFailure("GenerateRequestsPerDayPerProjectPerModel-FreeTier")],
+)
+PER_MINUTE = google_exceptions.ResourceExhausted(
+    "You exceeded your current quota.",
+    details=[_QuotaFailure("GenerateRequestsPerMinutePerProjectPerModel-FreeTier")],
+)
+
+@pytest.mark.parametrize("error, expected", [
+    (DAILY, True),
+    (PER_MINUTE, False),
+    (google_exceptions.ResourceExhausted("Quota exceeded for requests per day."), True),
+    (google_exceptions.ResourceExhausted("Resource has been exhausted (e.g. check quota)."), False),
+    (google_exceptions.ServiceUnavailable("Requests per day are fine; the model is overloaded."), False),
+])
+def test_is_daily_quota_error(error, expected):
+    assert is_daily_quota_error(error) is expected
+
+def _failing_request(error: Exception):
+    calls = []
+
+    def request(timeout: float):
+        calls.append(timeout)
+        raise error
+    return request, calls
+
+def _guard() -> ApiCallGuard:
+    return ApiCallGuard(None, max_attempts=4, initial_backoff_seconds=0.001, max_backoff_seconds=0.001, deadline_seconds=10)
+
+def test_daily_quota_error_is_not_retried():
+    guard = _guard()
+    request, calls = _failing_request(DAILY)
+    with pytest.raises(google_exceptions.ResourceExhausted):
+        guard.call(request, estimated_tokens=1)
+    assert len(calls) == 1
+    assert guard.stats()["daily_quota_errors"] == 1
+    assert guard.stats()["retries"] == 0
+
+def test_per_minute_quota_error_is_retried_up_to_max_attempts():
+    guard = _guard()
+    request, calls = _failing_request(PER_MINUTE)
+    with pytest.raises(google_exceptions.ResourceExhausted):
+        guard.call(request, estimated_tokens=1)
+    assert len(calls) == 4
+    assert guard.stats()["retries_exhausted"] == 1
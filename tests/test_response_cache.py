@@ -0,0 +1,69 @@
+# tests/test_response_cache.py
+
+# Copyright (c) Adrian Robinson 2025
+# This software is dual-licensed under the MIT License (for NHS use only)
+# and a Commercial License (for other use).
+# For commercial licensing inquiries, please contact adrian.j.robinson@gmail.com
+
+import sqlite3
+
+from src.portfolio_mapper.models.safety import PiiDetection, PiiFlag, SafetyAnalysis
+from src.portfolio_mapper.response_cache import (
+    PII_NOT_STORED, ResponseCache, redact_pii_detections, restore_pii_detections
+)
+
+PROMPT = "Check this reflection:\n\nI called  Mrs Jane Doe on 07700 900123 about\nher NHS number 943 476 5919."
+
+def _verdict(*texts: str) -> SafetyAnalysis:
+    return SafetyAnalysis(
+        is_safe_for_processing=True,
+        pii_detections=[PiiDetection(flag=PiiFlag.OTHER, text=text, explanation="Identifies a patient.") for text in texts],
+    )
+
+def test_redacted_verdict_contains_no_pii_and_restores_exactly():
+    verdict = _verdict("Mrs Jane Doe", "07700 900123", "943 476 5919")
+    redacted = redact_pii_detections(verdict, PROMPT)
+    assert all(text not in redacted.model_dump_json() for text in ("Jane", "07700", "943 476"))
+    assert restore_pii_detections(redacted, PROMPT) == verdict
+
+def test_restore_uses_the_normalised_prompt():
+    # A hit can come from a prompt that differs only in whitespace.
+    redacted = redact_pii_detections(_verdict("I called Mrs Jane Doe"), PROMPT)
+    restored = restore_pii_detections(redacted, PROMPT.replace("  ", " "))
+    assert restored.pii_detections[0].text == "I called Mrs Jane Doe"
+
+def test_text_not_in_the_prompt_is_not_stored():
+    redacted = redact_pii_detections(_verdict("John Smith"), PROMPT)
+    assert redacted.pii_detections[0].text == PII_NOT_STORED
+    assert restore_pii_detections(redacted, PROMPT).pii_detections[0].text == PII_NOT_STORED
+
+def test_cached_file_holds_only_the_redacted_verdict(tmp_path):
+    path = tmp_path / "responses.sqlite3"
+    cache = ResponseCache(str(path), ttl_seconds=60, max_entries=10)
+    verdict = _verdict("943 476 5919")
+    cache.put("key", redact_pii_detections(verdict, PROMPT))
+
+    with sqlite3.connect(path) as conn:
+        stored = conn.execute("SELECT response_json FROM responses").fetchone()[0]
+    assert "943" not in stored
+    assert restore_pii_detections(cache.get("key", SafetyAnalysis), PROMPT) == verdict
+
+def test_failed_discard_of_an_outdated_entry_is_a_miss(tmp_path, monkeypatch):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite3"), ttl_seconds=60, max_entries=10)
+    cache.put("key", _verdict("943 476 5919"))
+    connect = cache._connect
+    connections = []
+
+    def _connect_then_lock():
+        # The lookup succeeds; the database is locked by the time the entry is discarded.
+        connections.append(1)
+        if len(connections) > 1:
+            raise sqlite3.OperationalError("database is locked")
+        return connect()
+    monkeypatch.setattr(cache, "_connect", _connect_then_lock)
+
+    # Stored as a SafetyAnalysis, so it no longer validates as a PiiDetection.
+    with sqlite3.connect(tmp_path / "responses.sqlite3") as conn:
+        conn.execute("UPDATE responses SET response_type = 'PiiDetection'")
+    assert cache.get("key", PiiDetection) is None
+    assert len(connections) == 2
@@ -0,0 +1,113 @@
+# tests/test_response_repair.py
+
+# Copyright (c) Adrian Robinson 2025
+# This software is dual-licensed under the MIT License (for NHS use only)
+# and a Commercial License (for other use).
+# For commercial licensing inquiries, please contact adrian.j.robinson@gmail.com
+
+import contextlib
+import io
+import json
+
+import pytest
+from pydantic import ValidationError
+
+from src.portfolio_mapper.data_loader import FrameworkLoader
+from src.portfolio_mapper.response_repair import RepairStats, parse_analysis_response, repair_competency
+
+CODE = "CfAP-2022-Learning_Disability"
+
+@pytest.fixture(scope="module")
+def frameworks():
+    with contextlib.redirect_stdout(io.StringIO()):
+        library = FrameworkLoader(frameworks_dir='frameworks/').load_all()
+    return {CODE: library[CODE]}
+
+def _item(**overrides) -> dict:
+    item = {
+        "framework_code": CODE,
+        "competency_id": "1.a",
+        "competency_text": "Demonstrate a critical understanding.",
+        "match_strength": 4,
+        "achieved_level": "Advanced",
+        "justification_for_level": "The reflection describes it.",
+        "emerging_evidence_for_next_level": None,
+    }
+    return {**item, **overrides}
+
+def _response(*items: dict) -> str:
+    return json.dumps({"overall_summary": "A good reflection.", "assessed_competencies": list(items)}, indent=2)
+
+def test_valid_response_is_unchanged(frameworks):
+    stats = RepairStats()
+    result = parse_analysis_response(_response(_item()), frameworks, stats)
+    assert [c.competency_id for c in result.assessed_competencies] == ["1.a"]
+    assert not result.response_truncated and result.competencies_dropped == 0
+    assert stats.stats()["valid_as_sent"] == 1
+
+def test_fenced_json_with_trailing_commas(frameworks):
+    # A comma after the last field of each item and after the last item.
+    text = _response(_item(), _item(competency_id="1.b")).replace("null\n", "null,\n").replace("}\n  ]", "},\n  ]")
+    text = "Here is the analysis:\n```json\n" + text + "\n```"
+    stats = RepairStats()
+    result = parse_analysis_response(text, frameworks, stats)
+    assert [c.competency_id for c in result.assessed_competencies] == ["1.a", "1.b"]
+    assert not result.response_truncated
+    assert stats.stats()["json_recovered"] == 1
+    assert stats.stats()["retries_saved"] == 1
+
+@pytest.mark.parametrize("cut_after", [
+    '"justification_for_level": "The refl',  # Inside a string.
+    '"match_strength": 4,',                  # Between the fields of an item.
+])
+def test_truncated_response_keeps_complete_competencies(frameworks, cut_after):
+    text = _response(_item(), _item(competency_id="1.b"))
+    text = text[:text.rindex(cut_after) + len(cut_after)]
+    stats = RepairStats()
+    result = parse_analysis_response(text, frameworks, stats)
+    assert [c.competency_id for c in result.assessed_competencies] == ["1.a"]
+    assert result.response_truncated
+    assert stats.stats()["truncated"] == 1
+    assert stats.stats()["retries_saved"] == 1
+
+@pytest.mark.parametrize("strength, expected", [(0, 1), (7, 5), ("4", 4), (3.6, 4)])
+def test_match_strength_is_coerced_and_clamped(frameworks, strength, expected):
+    assert repair_competency(_item(match_strength=strength), frameworks).match_strength == expected
+
+@pytest.mark.parametrize("overrides", [
+    {"competency_id": "A:1:1.a"},                                    # Fully qualified id.
+    {"competency_id": "(1.a)."},                                     # Stray punctuation.
+    {"framework_code": "CfAP Advanced: Learning Disability (2022)"}, # Abbreviation.
+    {"framework_code": CODE.lower()},                                # Wrong case.
+    {"framework_code": "CfAP"},                                      # Unknown, but only one framework has the id.
+])
+def test_ids_are_corrected(frameworks, overrides):
+    competency = repair_competency(_item(**overrides), frameworks)
+    assert (competency.framework_code, competency.competency_id) == (CODE, "1.a")
+
+def test_missing_competency_text_is_filled_from_the_framework(frameworks):
+    competency = repair_competency(_item(competency_text=""), frameworks)
+    assert competency.competency_text.startswith("Demonstrate a critical understanding of")
+
+@pytest.mark.parametrize("overrides", [
+    {"competency_id": "9.z"},
+    {"match_strength": "strong"},
+    {"achieved_level": None},
+])
+def test_unusable_items_are_dropped(frameworks, overrides):
+    result = parse_analysis_response(_response(_item(), _item(**overrides)), frameworks)
+    assert [c.competency_id for c in result.assessed_competencies] == ["1.a"]
+    assert result.competencies_dropped == 1
+
+def test_emptied_response_does_not_count_as_a_retry_saved(frameworks):
+    stats = RepairStats()
+    result = parse_analysis_response(_response(_item(competency_id="9.z")) + "\n```", frameworks, stats)
+    assert result.assessed_competencies == [] and result.competencies_dropped == 1
+    assert stats.stats()["emptied"] == 1
+    assert stats.stats()["retries_saved"] == 0
+
+def test_unrecoverable_response_raises_the_strict_error(frameworks):
+    stats = RepairStats()
+    with pytest.raises(ValidationError):
+        parse_analysis_response('{"assessed_competencies": []}', frameworks, stats)
+    assert stats.stats()["unrecoverable"] == 1
@@ -0,0 +1,29 @@
+# tests/test_snapshot.py
+
+# Copyright (c) Adrian Robinson 2025
+# This software is dual-licensed under the MIT License (for NHS use only)
+# and a Commercial License (for other use).
+# For commercial licensing inquiries, please contact adrian.j.robinson@gmail.com
+
+import contextlib
+import io
+from types import SimpleNamespace
+
+from src.portfolio_mapper import snapshot
+from src.portfolio_mapper.snapshot import compile_snapshot, load_snapshot
+
+def _quietly(func, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args)
+
+def test_snapshot_is_outdated_when_index_building_code_changes(tmp_path, monkeypatch):
+    builder = tmp_path / "retrieval.py"
+    builder.write_text("def build_retrieval_index(framework): ...\n")
+    monkeypatch.setattr(snapshot, "BUILDER_MODULES", (SimpleNamespace(__name__="retrieval", __file__=str(builder)),))
+    snapshot_path = str(tmp_path / "library.snapshot")
+
+    _quietly(compile_snapshot, "frameworks/", "config/", snapshot_path)
+    assert _quietly(load_snapshot, "frameworks/", "config/", snapshot_path) is not None
+
+    builder.write_text("def build_retrieval_index(framework, k1=1.5): ...\n")
+    assert _quietly(load_snapshot, "frameworks/", "config/", snapshot_path) is None